@@ -25,6 +25,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -105,6 +106,23 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = '/app/staticfiles'
 
+# Статику отдаёт WhiteNoise: сжатые (gzip/brotli) файлы с хэшем в имени,
+# кэшируются браузером навсегда
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Для разработки: писать в лог каждый save() без update_fields (UPDATE всех колонок)
+WARN_FULL_ROW_SAVES = os.environ.get('WARN_FULL_ROW_SAVES') == '1'
+
+# Граф дорог для расчёта расстояний (manage.py build_routing); пусто — по прямой
+ROAD_GRAPH_PATH = os.environ.get('ROAD_GRAPH')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
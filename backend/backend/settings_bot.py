@@ -0,0 +1,17 @@
+"""Профиль настроек для бота: только ORM.
+
+Бот не отдаёт HTTP, поэтому админка, jazzmin, сессии, сообщения,
+статика и шаблоны ему не нужны — без них ``django.setup()`` не
+импортирует весь стек админки. auth остаётся из-за ``Client.user``.
+"""
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.contenttypes',
+    'django.contrib.auth',
+    'client',
+]
+
+MIDDLEWARE = []
+
+TEMPLATES = []
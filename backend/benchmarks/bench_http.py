@@ -0,0 +1,98 @@
+"""Сравнение пропускной способности runserver и gunicorn+uvicorn.
+
+Запуск из каталога backend/ (нужна настроенная БД и collectstatic):
+
+    python benchmarks/bench_http.py                 # оба сервера по очереди
+    python benchmarks/bench_http.py --server asgi   # только продакшн-профиль
+
+Скрипт поднимает сервер на свободном порту, несколько секунд бьёт по
+страницам админки, API каталога и статике в N потоков и печатает req/s
+и p50/p99.
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+URLS = [
+    '/admin/login/',
+    '/api/catalog/categories/',
+    '/api/catalog/shops/',
+    '/static/admin/css/base.css',
+]
+
+SERVERS = {
+    'runserver': lambda port: [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}'],
+    'asgi': lambda port: ['gunicorn', '-c', 'gunicorn.conf.py', 'backend.asgi:application'],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on :{port} did not start")
+
+
+def hammer(port, path, duration):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    latencies = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        conn.request('GET', path)
+        conn.getresponse().read()
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+    return latencies
+
+
+def bench(name, port, concurrency, duration):
+    env = {**os.environ, 'PORT': str(port), 'ACCESS_LOG': ''}
+    proc = subprocess.Popen(
+        SERVERS[name](port), cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(port)
+        time.sleep(1)
+        for path in URLS:
+            with ThreadPoolExecutor(concurrency) as pool:
+                results = list(pool.map(lambda _: hammer(port, path, duration), range(concurrency)))
+            latencies = sorted(l for chunk in results for l in chunk)
+            p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+            print(
+                f"{name:10s} {path:32s} {len(latencies) / duration:8.1f} req/s  "
+                f"p50 {statistics.median(latencies) * 1000:6.1f} ms  p99 {p99 * 1000:6.1f} ms"
+            )
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--server', choices=[*SERVERS, 'both'], default='both')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+    for name in SERVERS if args.server == 'both' else [args.server]:
+        bench(name, free_port(), args.concurrency, args.duration)
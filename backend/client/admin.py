@@ -1,9 +1,24 @@
-from django.contrib import admin
+import csv
+from datetime import timedelta
+
+from django import forms
+from django.contrib import admin, messages
+from django.db.models import Sum
+from django.http import Http404, StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from .catalog_io import FORMATS, export_catalog, import_catalog, read_rows, text_stream
 from .models import (
     Client, Shop, Product, Service, Order, OrderItem,
-    PricingRule, TimeSurcharge, CourierOrder
+    PricingRule, TimeSurcharge, CourierBatch, CourierOrder, CourierOrderEvent,
+    ShopSalesRollup, CourierDeliveryRollup
 )
 from client.models import Category
+from .admin_utils import (
+    FastChangeListMixin, OwnerFilter, ClientFilter, CourierFilter, ShopNameFilter,
+    owned_shop_ids
+)
 
 # ─── Inlines for Products and Services in Shop ─────────────────────────────────
 
@@ -23,11 +38,18 @@ class ServiceInline(admin.TabularInline):
     fields = ("name", "price")
     show_change_link = True
 
+class CatalogImportForm(forms.Form):
+    file = forms.FileField(label="Файл (CSV или JSON Lines)")
+    format = forms.ChoiceField(label="Формат", choices=[(f, f.upper()) for f in FORMATS])
+    dry_run = forms.BooleanField(label="Только показать изменения", required=False, initial=True)
+
 @admin.register(Shop)
-class ShopAdmin(admin.ModelAdmin):
+class ShopAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display    = ("name", "owner", "address", "created_at", 'category', 'point_a_lat', 'point_a_lng')
+    list_select_related = ("owner", "category")
     search_fields   = ("name", "owner__name")
-    list_filter     = ("owner", "category", )
+    list_filter     = (OwnerFilter, "category", )
+    raw_id_fields   = ("owner",)
     readonly_fields = ("created_at",)
     inlines         = [ProductInline, ServiceInline]
     fieldsets = (
@@ -44,12 +66,64 @@ class ShopAdmin(admin.ModelAdmin):
         qs = super().get_queryset(request)
         if request.user.is_superuser:
             return qs
-        return qs.filter(owner__phone=str(request.user.last_name))
+        return qs.filter(id__in=owned_shop_ids(request))
+
+    def get_urls(self):
+        return [
+            path("<int:shop_id>/catalog/export/", self.admin_site.admin_view(self.export_view),
+                 name="client_shop_catalog_export"),
+            path("<int:shop_id>/catalog/import/", self.admin_site.admin_view(self.import_view),
+                 name="client_shop_catalog_import"),
+        ] + super().get_urls()
+
+    def _get_shop(self, request, shop_id):
+        shop = self.get_queryset(request).filter(id=shop_id).first()
+        if not shop or not self.has_change_permission(request, shop):
+            raise Http404
+        return shop
+
+    def export_view(self, request, shop_id):
+        shop = self._get_shop(request, shop_id)
+        fmt = request.GET.get("format", "csv")
+        if fmt not in FORMATS:
+            raise Http404
+        ext, content_type = ("csv", "text/csv") if fmt == "csv" else ("jsonl", "application/x-ndjson")
+        response = StreamingHttpResponse(export_catalog(shop.id, fmt), content_type=f"{content_type}; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="shop_{shop.id}_catalog.{ext}"'
+        return response
+
+    def import_view(self, request, shop_id):
+        shop = self._get_shop(request, shop_id)
+        form = CatalogImportForm(request.POST or None, request.FILES or None)
+        result = None
+        if request.method == "POST" and form.is_valid():
+            rows = read_rows(text_stream(form.cleaned_data["file"].file), form.cleaned_data["format"])
+            dry_run = form.cleaned_data["dry_run"]
+            try:
+                result = import_catalog(shop.id, rows, dry_run=dry_run)
+            except (UnicodeDecodeError, csv.Error) as e:
+                # Импорт идёт в одной транзакции — уже записанное откатилось
+                form.add_error("file", f"Не удалось прочитать файл (нужен UTF-8): {e}")
+            if result and not dry_run:
+                messages.success(
+                    request,
+                    f"Импорт завершён: создано {result.created}, обновлено {result.updated}, "
+                    f"ошибок {len(result.errors)}",
+                )
+        context = {
+            **self.admin_site.each_context(request),
+            "title": f"Импорт каталога: {shop.name}",
+            "opts": self.model._meta,
+            "original": shop,
+            "form": form,
+            "result": result,
+        }
+        return TemplateResponse(request, "admin/client/catalog_import.html", context)
 
 # ─── Admin for Client ──────────────────────────────────────────────────────────
 
 @admin.register(Client)
-class ClientAdmin(admin.ModelAdmin):
+class ClientAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display    = (
         "name", "username", "phone", "tg_code", "is_banned",
         "next_ability", "next_ability_beauty", "next_ability_automoto",
@@ -59,11 +133,12 @@ class ClientAdmin(admin.ModelAdmin):
     search_fields   = ("name", "username", "phone", "tg_code",)
     list_filter     = ("is_banned",)
     list_editable   = ("is_banned",)
+    raw_id_fields   = ("user",)
     readonly_fields = ("created_at", "updated_at",)
     fieldsets = (
         (None, {
             "fields": (
-                "name", "username", "phone", "tg_code", "is_banned",
+                "name", "username", "phone", "tg_code", "user", "is_banned",
                 "next_ability", "next_ability_beauty", "next_ability_automoto",
                 "next_ability_techno", "next_ability_housing", "next_ability_job",
             ),
@@ -77,10 +152,12 @@ class ClientAdmin(admin.ModelAdmin):
 # ─── Admin for Product ─────────────────────────────────────────────────────────
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display    = ("name", "shop", "price", "created_at")
+    list_select_related = ("shop",)
     search_fields   = ("name", "shop__name")
-    list_filter     = ("shop",)
+    list_filter     = (ShopNameFilter,)
+    autocomplete_fields = ("shop",)
     readonly_fields = ("created_at",)
     fieldsets = (
         (None, {"fields": ("shop", "name", "price", "description"),}),
@@ -90,15 +167,17 @@ class ProductAdmin(admin.ModelAdmin):
         qs = super().get_queryset(request)
         if request.user.is_superuser:
             return qs
-        return qs.filter(shop__owner__phone=str(request.user.last_name))
+        return qs.filter(shop_id__in=owned_shop_ids(request))
 
 # ─── Admin for Service ─────────────────────────────────────────────────────────
 
 @admin.register(Service)
-class ServiceAdmin(admin.ModelAdmin):
+class ServiceAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display    = ("name", "shop", "price", "created_at")
+    list_select_related = ("shop",)
     search_fields   = ("name", "shop__name")
-    list_filter     = ("shop",)
+    list_filter     = (ShopNameFilter,)
+    autocomplete_fields = ("shop",)
     readonly_fields = ("created_at",)
     fieldsets = (
         (None, {"fields": ("shop", "name", "price", "description"),}),
@@ -108,7 +187,7 @@ class ServiceAdmin(admin.ModelAdmin):
         qs = super().get_queryset(request)
         if request.user.is_superuser:
             return qs
-        return qs.filter(shop__owner__phone=str(request.user.last_name))
+        return qs.filter(shop_id__in=owned_shop_ids(request))
 
 # ─── Inline for OrderItem ───────────────────────────────────────────────────────
 
@@ -116,13 +195,17 @@ class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
     fields = ("product", "service", "quantity")
+    raw_id_fields = ("product", "service")
     show_change_link = False
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display    = ("id", "shop", "client", "total_price", "created_at")
+    list_select_related = ("shop", "client")
     search_fields   = ("shop__name", "client__name")
-    list_filter     = ("shop", "client")
+    list_filter     = (ShopNameFilter, ClientFilter)
+    raw_id_fields   = ("client",)
+    autocomplete_fields = ("shop",)
     readonly_fields = ("total_price", "created_at")
     fieldsets = (
         (None, {"fields": ("shop", "client"),}),
@@ -133,7 +216,7 @@ class OrderAdmin(admin.ModelAdmin):
         qs = super().get_queryset(request)
         if request.user.is_superuser:
             return qs
-        return qs.filter(shop__owner__phone=str(request.user.last_name))
+        return qs.filter(shop_id__in=owned_shop_ids(request))
 
 # ─── Admin for CourierOrder and Pricing ────────────────────────────────────────
 
@@ -148,13 +231,125 @@ class TimeSurchargeAdmin(admin.ModelAdmin):
     list_display = ("name", "start_time", "end_time", "multiplier")
     ordering = ("start_time",)
 
+class CourierOrderEventInline(admin.TabularInline):
+    model = CourierOrderEvent
+    extra = 0
+    fields = ("status", "version", "created_at")
+    readonly_fields = ("status", "version", "created_at")
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(CourierOrder)
-class CourierOrderAdmin(admin.ModelAdmin):
+class CourierOrderAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ("id", "client", "courier", "distance_km", "price", "created_at", 'status')
-    list_filter = ("courier",)
+    list_select_related = ("client", "courier")
+    list_filter = ("status", CourierFilter)
+    raw_id_fields = ("client", "courier", "batch")
     search_fields = ("client__name", "courier__name")
     readonly_fields = ("distance_km", "price", "created_at", "updated_at")
     fieldsets = (
-        (None, {"fields": ("client", "courier", "point_a_lat", "point_a_lng", "point_b_lat", "point_b_lng", "comment",  'status'),}),
+        (None, {"fields": ("client", "courier", "point_a_lat", "point_a_lng", "point_b_lat", "point_b_lng", "comment",  'status', 'batch'),}),
         ("Результаты расчётов", {"fields": ("distance_km", "price", "created_at", "updated_at"), "classes": ("collapse",),}),
     )
+    inlines = [CourierOrderEventInline]
+
+class CourierBatchOrderInline(admin.TabularInline):
+    model = CourierOrder
+    fields = ("client", "status", "distance_km", "price")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    show_change_link = True
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(CourierBatch)
+class CourierBatchAdmin(admin.ModelAdmin):
+    list_display = ("id", "courier", "distance_km", "price", "created_at")
+    list_select_related = ("courier",)
+    raw_id_fields = ("courier",)
+    readonly_fields = ("stops", "distance_km", "price", "created_at")
+    inlines = [CourierBatchOrderInline]
+
+# ─── Аналитика (только предагрегированные таблицы) ─────────────────────────────
+
+class ReadOnlyRollupAdmin(admin.ModelAdmin):
+    list_filter = ("period",)
+    date_hierarchy = "bucket"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ShopSalesRollup)
+class ShopSalesRollupAdmin(ReadOnlyRollupAdmin):
+    list_display = ("bucket", "period", "shop", "orders_count", "revenue", "items_sold")
+    change_list_template = "admin/client/shopsalesrollup/change_list.html"
+    dashboard_days = 30
+    max_dashboard_days = 365
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request).select_related("shop")
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(shop_id__in=owned_shop_ids(request))
+
+    def get_urls(self):
+        return [
+            path("dashboard/", self.admin_site.admin_view(self.dashboard_view),
+                 name="client_analytics_dashboard"),
+        ] + super().get_urls()
+
+    def dashboard_view(self, request):
+        try:
+            days = int(request.GET.get("days", self.dashboard_days))
+        except ValueError:
+            days = self.dashboard_days
+        days = max(1, min(days, self.max_dashboard_days))
+        since = timezone.now() - timedelta(days=days)
+        shops = (
+            self.get_queryset(request)
+            .filter(period="day", bucket__gte=since)
+            .values("shop__name")
+            .annotate(orders=Sum("orders_count"), revenue=Sum("revenue"), items=Sum("items_sold"))
+            .order_by("-revenue")
+        )
+        couriers = []
+        if request.user.is_superuser:
+            couriers = list(
+                CourierDeliveryRollup.objects
+                .filter(period="day", bucket__gte=since)
+                .values("courier__name")
+                .annotate(
+                    deliveries=Sum("deliveries"), distance=Sum("distance_km"), revenue=Sum("revenue"),
+                    wait=Sum("wait_seconds"), to_a=Sum("to_a_seconds"), to_b=Sum("to_b_seconds"),
+                )
+                .order_by("-deliveries")
+            )
+            for row in couriers:
+                n = row["deliveries"] or 1
+                row["avg_minutes"] = {
+                    stage: round(row[stage] / n / 60, 1) for stage in ("wait", "to_a", "to_b")
+                }
+        context = {
+            **self.admin_site.each_context(request),
+            "title": f"Аналитика за {days} дн.",
+            "opts": self.model._meta,
+            "days": days,
+            "shops": shops,
+            "couriers": couriers,
+        }
+        return TemplateResponse(request, "admin/client/analytics_dashboard.html", context)
+
+@admin.register(CourierDeliveryRollup)
+class CourierDeliveryRollupAdmin(ReadOnlyRollupAdmin):
+    list_display = (
+        "bucket", "period", "courier", "deliveries", "distance_km", "revenue",
+        "wait_seconds", "to_a_seconds", "to_b_seconds",
+    )
+    list_select_related = ("courier",)
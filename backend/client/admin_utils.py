@@ -0,0 +1,136 @@
+"""Вспомогательные классы для быстрых changelist-страниц админки."""
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Ниже этого числа строк точный COUNT(*) дешёвый — считаем честно
+ESTIMATE_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Для нефильтрованного списка берёт число строк из ``pg_class.reltuples``
+    вместо ``COUNT(*)`` по всей таблице."""
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        query = getattr(qs, 'query', None)
+        if query is not None and not query.where:
+            connection = connections[qs.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                        [qs.model._meta.db_table],
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] > ESTIMATE_THRESHOLD:
+                    return row[0]
+        return super().count
+
+
+class FastChangeListMixin:
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр-поле ввода вместо списка всех значений в боковой панели."""
+    template = 'admin/client/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        # Непустой список нужен, чтобы Django вообще показал фильтр
+        return ((),)
+
+    def get_facet_queryset(self, changelist):
+        # Считать нечего — вариантов нет, есть только поле ввода (и ?_facets=1
+        # не должен падать на пустом варианте из lookups)
+        return {}
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = [
+            (key, value)
+            for key, values in changelist.get_filters_params().items()
+            if key != self.parameter_name
+            for value in (values if isinstance(values, list) else [values])
+        ]
+        yield all_choice
+
+
+class ClientInputFilter(InputFilter):
+    """Фильтр по Telegram ID или номеру телефона клиента; ``field`` — путь к FK."""
+    field = None
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        lookup = 'tg_code' if value.isdigit() and not value.startswith('0') else 'phone'
+        return queryset.filter(**{f"{self.field}__{lookup}": value})
+
+
+class OwnerFilter(ClientInputFilter):
+    title = 'владельцу (TG ID / телефон)'
+    parameter_name = 'owner'
+    field = 'owner'
+
+
+class ClientFilter(ClientInputFilter):
+    title = 'клиенту (TG ID / телефон)'
+    parameter_name = 'client'
+    field = 'client'
+
+
+class CourierFilter(ClientInputFilter):
+    title = 'курьеру (TG ID / телефон)'
+    parameter_name = 'courier'
+    field = 'courier'
+
+
+class ShopNameFilter(InputFilter):
+    title = 'магазину (название)'
+    parameter_name = 'shop'
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        return queryset.filter(shop__name__icontains=value)
+
+
+OWNED_SHOPS_SESSION_KEY = 'owned_shop_ids'
+
+
+def owned_shop_ids(request):
+    """Id магазинов, которыми владеет пользователь админки.
+
+    Кэшируется в сессии до смены версии каталога или привязанного к
+    пользователю клиента. Пользователь без привязки к клиенту один раз
+    связывается по номеру в ``last_name``.
+    """
+    from .models import CatalogVersion, Client, Shop
+
+    user = request.user
+    version = CatalogVersion.current()
+    client_id = Client.objects.filter(user_id=user.pk).values_list('id', flat=True).first()
+    cached = request.session.get(OWNED_SHOPS_SESSION_KEY)
+    if (
+        cached and cached['user'] == user.pk and cached['version'] == version
+        and cached.get('client') == client_id
+    ):
+        return cached['ids']
+
+    if user.last_name and client_id is None:
+        client = Client.objects.filter(phone=str(user.last_name), user__isnull=True).order_by('id').first()
+        if client:
+            client.user = user
+            client.save(update_fields=['user', 'updated_at'])
+            client_id = client.id
+
+    ids = list(Shop.objects.filter(owner__user_id=user.pk).values_list('id', flat=True))
+    request.session[OWNED_SHOPS_SESSION_KEY] = {
+        'user': user.pk, 'version': version, 'client': client_id, 'ids': ids,
+    }
+    return ids
@@ -5,3 +5,13 @@ class ClientConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'client'
     verbose_name = 'Клиенты в тг'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.models.signals import pre_save
+
+        from . import signals  # noqa: F401
+        from .dirty import warn_full_row_save
+
+        if settings.WARN_FULL_ROW_SAVES:
+            pre_save.connect(warn_full_row_save, dispatch_uid='warn_full_row_save')
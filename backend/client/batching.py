@@ -0,0 +1,207 @@
+"""Объединение курьерских заказов в одну поездку.
+
+Новые заказы не публикуются сразу, а копятся ``window`` секунд
+(``awaiting_dispatch``). ``plan_batches`` раскладывает накопленное
+по пакетам вставкой: каждый заказ по очереди пробуется во все позиции
+(забор раньше доставки) уже собранных пакетов с забором поблизости, и
+берётся самая дешёвая вставка, если она короче отдельной поездки и ни
+один заказ пакета не едет дольше допустимого объезда. Иначе заказ
+открывает новый пакет.
+
+Пакет уходит курьерам, когда в нём ``MAX_BATCH_SIZE`` заказов или самый
+старый прождал окно. Цена пакета — сумма цен заказов: клиенты платят
+подтверждённую цену, курьер получает всё одной работой.
+
+Маршруты (A* по графу дорог) считаются без блокировок по снимку
+``pending_legs``, затем ``claim_bundles`` забирает созревшие пакеты
+коротким ``select_for_update(skip_locked=True)``, поэтому несколько
+воркеров бота не опубликуют один заказ дважды. Если отправить пакет в
+группу не удалось, ``release_batch`` возвращает его заказы в очередь к
+следующему тику.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import state_machine
+from .geo import haversine_km
+from .models import CourierBatch, CourierOrder
+from .routing import road_distance_km
+
+# Заборы пакета не дальше этого от первого, км
+PICKUP_RADIUS_KM = 1.0
+MAX_BATCH_SIZE = 3
+# Допустимый объезд: доля прямого пути, но не меньше MIN_DETOUR_KM
+MAX_DETOUR = 0.5
+MIN_DETOUR_KM = 1.0
+
+PICKUP, DROP = 'a', 'b'
+
+
+class Leg(NamedTuple):
+    id: int
+    a: tuple
+    b: tuple
+    created_at: datetime
+
+
+@dataclass
+class Bundle:
+    stops: list  # [(PICKUP | DROP, Leg)] в порядке объезда
+    cost: float
+
+    @property
+    def legs(self):
+        return [leg for kind, leg in self.stops if kind == PICKUP]
+
+
+def _point(stop):
+    kind, leg = stop
+    return leg.a if kind == PICKUP else leg.b
+
+
+def _evaluate(stops, dist, direct):
+    """Длина маршрута или ``None``, если чей-то объезд больше допустимого."""
+    offsets = [0.0]
+    for prev, stop in zip(stops, stops[1:]):
+        offsets.append(offsets[-1] + dist(_point(prev), _point(stop)))
+    picked = {}
+    for i, (kind, leg) in enumerate(stops):
+        if kind == PICKUP:
+            picked[leg.id] = offsets[i]
+            continue
+        ride = offsets[i] - picked[leg.id]
+        if ride - direct[leg.id] > max(direct[leg.id] * MAX_DETOUR, MIN_DETOUR_KM):
+            return None
+    return offsets[-1]
+
+
+def _best_insertion(bundle, leg, dist, direct):
+    """(длина маршрута, маршрут) лучшей вставки или ``None``."""
+    best = None
+    stops = bundle.stops
+    for i in range(len(stops) + 1):
+        for j in range(i, len(stops) + 1):
+            candidate = stops[:i] + [(PICKUP, leg)] + stops[i:j] + [(DROP, leg)] + stops[j:]
+            cost = _evaluate(candidate, dist, direct)
+            if cost is not None and (best is None or cost < best[0]):
+                best = (cost, candidate)
+    return best
+
+
+def plan_batches(legs, dist=None):
+    """Раскладывает заказы по пакетам; ``legs`` — в порядке создания."""
+    cache = {}
+
+    def measure(p, q):
+        if (p, q) not in cache:
+            cache[p, q] = (dist or road_distance_km)(*p, *q)
+        return cache[p, q]
+
+    direct = {leg.id: measure(leg.a, leg.b) for leg in legs}
+    bundles = []
+    for leg in legs:
+        best = None
+        for bundle in bundles:
+            if len(bundle.legs) >= MAX_BATCH_SIZE:
+                continue
+            if haversine_km(*bundle.legs[0].a, *leg.a) > PICKUP_RADIUS_KM:
+                continue
+            inserted = _best_insertion(bundle, leg, measure, direct)
+            if inserted is None:
+                continue
+            added = inserted[0] - bundle.cost
+            # Объединять, только если это короче отдельной поездки
+            if added < direct[leg.id] and (best is None or added < best[0]):
+                best = (added, bundle, inserted)
+        if best is None:
+            bundles.append(Bundle([(PICKUP, leg), (DROP, leg)], direct[leg.id]))
+        else:
+            _, bundle, (cost, stops) = best
+            bundle.stops, bundle.cost = stops, cost
+    return bundles
+
+
+def pending_legs():
+    """Заказы, ждущие отправки, в порядке создания — без блокировок."""
+    return [
+        Leg(order_id, (a_lat, a_lng), (b_lat, b_lng), created_at)
+        for order_id, a_lat, a_lng, b_lat, b_lng, created_at in (
+            CourierOrder.objects
+            .filter(awaiting_dispatch=True, status='new')
+            .order_by('created_at', 'id')
+            .values_list('id', 'point_a_lat', 'point_a_lng', 'point_b_lat', 'point_b_lng', 'created_at')
+        )
+    ]
+
+
+def claim_bundles(bundles, window: float, now=None):
+    """Забирает созревшие пакеты из ``plan_batches``: список (``CourierBatch`` или ``None``, заказы).
+
+    ``None`` — одиночный заказ, его публикуют как раньше. Пакет, часть
+    заказов которого уже забрал другой воркер или которые больше не ждут
+    отправки, пропускается — остаток соберётся на следующем тике.
+    """
+    now = now or timezone.now()
+    deadline = now - timedelta(seconds=window)
+    due = [
+        bundle for bundle in bundles
+        if len(bundle.legs) >= MAX_BATCH_SIZE or min(leg.created_at for leg in bundle.legs) <= deadline
+    ]
+    result = []
+    if not due:
+        return result
+    with transaction.atomic():
+        locked = {
+            order.id: order
+            for order in CourierOrder.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('client')
+            .filter(id__in=[leg.id for bundle in due for leg in bundle.legs],
+                    awaiting_dispatch=True, status='new')
+        }
+        for bundle in due:
+            bundled = [locked.get(leg.id) for leg in bundle.legs]
+            if None in bundled:
+                continue
+            batch = None
+            if len(bundled) > 1:
+                batch = CourierBatch.objects.create(
+                    stops=[[kind, leg.id] for kind, leg in bundle.stops],
+                    distance_km=round(bundle.cost, 2),
+                    price=sum(order.price or 0 for order in bundled),
+                )
+            CourierOrder.objects.filter(id__in=[o.id for o in bundled]).update(
+                awaiting_dispatch=False, batch=batch, updated_at=now
+            )
+            result.append((batch, bundled))
+    return result
+
+
+def release_batch(batch, orders):
+    """Возвращает неопубликованный пакет в очередь: заказы снова ждут отправки."""
+    with transaction.atomic():
+        CourierOrder.objects.filter(id__in=[o.id for o in orders], status='new').update(
+            awaiting_dispatch=True, batch=None, updated_at=timezone.now()
+        )
+        if batch is not None:
+            CourierBatch.objects.filter(id=batch.id).delete()
+
+
+def take_batch(batch_id, courier):
+    """Назначает курьеру все заказы пакета или ни одного."""
+    with transaction.atomic():
+        ids = list(CourierOrder.objects.filter(batch_id=batch_id).values_list('id', flat=True))
+        if not ids:
+            raise ValueError("Batch not found")
+        for order_id in ids:
+            # Откат всего пакета, если хоть один заказ уже взят
+            if not state_machine.transition(order_id, 'assigned', from_status='new', courier=courier):
+                raise ValueError("Batch already taken")
+        CourierBatch.objects.filter(id=batch_id).update(courier=courier)
+    orders = CourierOrder.objects.select_related('client').in_bulk(ids)
+    batch = CourierBatch.objects.get(id=batch_id)
+    return batch, [orders[order_id] for kind, order_id in batch.stops if kind == PICKUP]
@@ -0,0 +1,225 @@
+"""Потоковый импорт и экспорт каталога магазина (товары и услуги).
+
+Форматы: CSV с заголовком и JSON Lines (один объект на строку) с полями
+``kind`` (product/service), ``id`` (необязательно), ``name``, ``price``,
+``description``. Строка без ``id`` сопоставляется с существующей позицией
+по названию; если позиция встречается в файле несколько раз, побеждает
+последняя строка. Запись идёт пачками через ``bulk_create(update_conflicts=True)``
+по первичному ключу, поэтому файл любого размера не держится в памяти.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+from .models import CatalogVersion, Product, Service
+
+KINDS = {'product': Product, 'service': Service}
+FIELDS = ('kind', 'id', 'name', 'price', 'description')
+FORMATS = ('csv', 'json')
+BATCH_SIZE = 2000
+# Сколько строк диффа показывать в пробном запуске
+DIFF_LIMIT = 200
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: list = field(default_factory=list)
+    diff: list = field(default_factory=list)
+
+    def add_diff(self, line):
+        if len(self.diff) < DIFF_LIMIT:
+            self.diff.append(line)
+
+
+def read_rows(stream, fmt):
+    """Построчно читает текстовый поток, отдаёт (номер строки, dict)."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'json':
+        for line_num, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_num, json.loads(line)
+            except ValueError:
+                yield line_num, None
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+
+def _text(row, name, default=''):
+    value = row.get(name)
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        raise ValueError(f"поле {name} должно быть строкой")
+    return value.strip()
+
+
+def _clean(row):
+    if not isinstance(row, dict):
+        raise ValueError("строка не является JSON-объектом")
+    kind = (_text(row, 'kind') or 'product').lower()
+    if kind not in KINDS:
+        raise ValueError(f"неизвестный kind «{kind}»")
+    name = _text(row, 'name')
+    if not name or len(name) > 200:
+        raise ValueError("название пустое или длиннее 200 символов")
+    try:
+        price = int(str(row.get('price', '')).replace(' ', ''))
+    except ValueError:
+        raise ValueError(f"некорректная цена «{row.get('price')}»")
+    if price < 0:
+        raise ValueError("цена меньше нуля")
+    raw_id = str(row.get('id') or '').strip()
+    try:
+        item_id = int(raw_id) if raw_id else None
+    except ValueError:
+        raise ValueError(f"некорректный id «{raw_id}»")
+    description = _text(row, 'description') or None
+    return kind, item_id, name, price, description
+
+
+def _existing(shop_id):
+    """Индекс текущего каталога магазина: только id/название/цена/описание."""
+    by_id, by_name = {}, {}
+    for kind, model in KINDS.items():
+        for item_id, name, price, description in (
+            model.objects.filter(shop_id=shop_id)
+            .values_list('id', 'name', 'price', 'description').iterator()
+        ):
+            by_id[(kind, item_id)] = (name, price, description)
+            by_name.setdefault((kind, name), item_id)
+    return by_id, by_name
+
+
+def _flush(batches):
+    """Пишет очередь; возвращает (kind, obj) только что созданных позиций."""
+    created = []
+    for kind, queued in batches.items():
+        if queued:
+            objs = list(queued.values())
+            fresh = [obj for obj in objs if obj.pk is None]
+            KINDS[kind].objects.bulk_create(
+                objs, batch_size=BATCH_SIZE, update_conflicts=True,
+                unique_fields=['id'], update_fields=['name', 'price', 'description'],
+            )
+            created.extend((kind, obj) for obj in fresh)
+            queued.clear()
+    return created
+
+
+def import_catalog(shop_id, rows, dry_run=False, batch_size=BATCH_SIZE) -> ImportResult:
+    """Импортирует позиции ``rows`` (из ``read_rows``) в магазин ``shop_id``.
+
+    При ``dry_run`` ничего не пишет и только собирает дифф. Ошибки
+    валидации не прерывают импорт — строка пропускается и попадает в
+    ``errors``.
+    """
+    result = ImportResult()
+    by_id, by_name = _existing(shop_id)
+    # Позиции, созданные этим импортом и ещё не получившие id: (kind, name) -> поля
+    new = {}
+    # Очередь на запись: kind -> {id или название новой позиции: объект}.
+    # Повтор позиции заменяет объект в очереди — побеждает последняя строка,
+    # и Postgres не получает одну запись дважды в одном ON CONFLICT.
+    batches = {kind: {} for kind in KINDS}
+    pending = 0
+
+    def flush():
+        for kind, obj in _flush(batches):
+            if obj.pk is not None:
+                by_id[(kind, obj.pk)] = new.pop((kind, obj.name))
+                by_name[(kind, obj.name)] = obj.pk
+
+    with transaction.atomic():
+        for line_num, row in rows:
+            try:
+                kind, item_id, name, price, description = _clean(row)
+            except ValueError as e:
+                result.errors.append((line_num, str(e)))
+                continue
+            if item_id is None:
+                item_id = by_name.get((kind, name))
+            elif (kind, item_id) not in by_id:
+                result.errors.append((line_num, f"{kind} #{item_id} не найден в этом магазине"))
+                continue
+
+            if item_id is None:
+                key, current = name, new.get((kind, name))
+            else:
+                key, current = item_id, by_id[(kind, item_id)]
+            values = (name, price, description)
+            if current == values:
+                result.unchanged += 1
+                continue
+            if current is None:
+                result.created += 1
+                result.add_diff(f"+ {kind}: {name} — {price} KGS")
+            else:
+                result.updated += 1
+                label = f" #{item_id}" if item_id else ""
+                result.add_diff(f"~ {kind}{label}: {current[0]} — {current[1]} KGS → {name} — {price} KGS")
+            if item_id is None:
+                new[(kind, name)] = values
+            else:
+                by_id[(kind, item_id)] = values
+
+            if dry_run:
+                continue
+            if key not in batches[kind]:
+                pending += 1
+            batches[kind][key] = KINDS[kind](
+                id=item_id, shop_id=shop_id, name=name, price=price, description=description
+            )
+            if pending >= batch_size:
+                flush()
+                pending = 0
+
+        if not dry_run:
+            flush()
+            if result.created or result.updated:
+                # bulk_create не шлёт post_save — сбрасываем кэши каталога вручную
+                CatalogVersion.bump()
+    return result
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def export_catalog(shop_id, fmt='csv'):
+    """Генератор строк файла каталога; читает БД курсором по ``BATCH_SIZE``."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    writer = csv.writer(_Echo())
+    if fmt == 'csv':
+        yield writer.writerow(FIELDS)
+    for kind, model in KINDS.items():
+        rows = (
+            model.objects.filter(shop_id=shop_id).order_by('id')
+            .values_list('id', 'name', 'price', 'description').iterator(chunk_size=BATCH_SIZE)
+        )
+        for item_id, name, price, description in rows:
+            if fmt == 'csv':
+                yield writer.writerow((kind, item_id, name, price, description or ''))
+            else:
+                yield json.dumps(
+                    dict(zip(FIELDS, (kind, item_id, name, price, description or ''))),
+                    ensure_ascii=False,
+                ) + '\n'
+
+
+def text_stream(binary):
+    """Оборачивает загруженный файл в текстовый поток без чтения целиком."""
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
@@ -0,0 +1,89 @@
+"""Сохранение только изменённых полей и детектор полных UPDATE.
+
+``DirtyFieldsMixin`` запоминает значения, загруженные из БД, и в ``save()``
+без явного ``update_fields`` пишет только отличающиеся колонки (плюс
+``auto_now``). Если ничего не изменилось, запроса нет вовсе. Меньше
+колонок в UPDATE — меньше WAL и меньше конфликтов за строку, когда
+бот и админка правят одну запись.
+
+``warn_full_row_save`` — обработчик ``pre_save`` для разработки: пишет в
+лог каждый UPDATE всех колонок с местом вызова. Подключается в
+``ClientConfig.ready`` при ``WARN_FULL_ROW_SAVES``.
+"""
+import logging
+import traceback
+
+logger = logging.getLogger(__name__)
+
+# Кадры из этих мест пропускаются при поиске вызывающего кода
+_INTERNAL = ('/django/', '/asgiref/', __file__)
+
+
+class DirtyFieldsMixin:
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _snapshot(self, attnames):
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            loaded = self._loaded_values = {}
+        for attname in attnames:
+            if attname in self.__dict__:
+                loaded[attname] = self.__dict__[attname]
+
+    def dirty_fields(self):
+        """attname изменённых полей или ``None``, если исходные значения неизвестны."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        dirty = set()
+        for field in self._meta.concrete_fields:
+            name = field.attname
+            if field.primary_key or name not in self.__dict__:
+                continue
+            if name not in loaded or loaded[name] != self.__dict__[name]:
+                dirty.add(name)
+        return dirty
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            dirty = self.dirty_fields()
+            if dirty is not None:
+                if not dirty:
+                    return
+                auto_now = {
+                    f.attname for f in self._meta.concrete_fields if getattr(f, 'auto_now', False)
+                }
+                kwargs['update_fields'] = dirty | auto_now
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            attnames = [f.attname for f in self._meta.concrete_fields]
+        else:
+            # Остальные поля в БД не попали — они по-прежнему «грязные»
+            attnames = [self._meta.get_field(name).attname for name in update_fields]
+        self._snapshot(attnames)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None:
+            attnames = [f.attname for f in self._meta.concrete_fields]
+        else:
+            attnames = [self._meta.get_field(name).attname for name in fields]
+        self._snapshot(attnames)
+
+
+def _caller() -> str:
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if not any(part in frame.filename for part in _INTERNAL):
+            return f"{frame.filename}:{frame.lineno} in {frame.name}"
+    return "?"
+
+
+def warn_full_row_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or update_fields is not None or instance._state.adding:
+        return
+    logger.warning(f"Full-row UPDATE of {sender.__name__} #{instance.pk} from {_caller()}")
@@ -0,0 +1,115 @@
+"""Оценка времени доставки по истории.
+
+``rollups.refresh_eta_stats`` раз в ночь добавляет в ``EtaStat`` суммы
+времени этапов завершённых доставок по ячейке ``ETA_GRID`` точки А и
+часу суток. ``EtaTable`` держит эти суммы в памяти и отвечает словарным
+поиском: ожидание курьера и забор — средние по ячейке, поездка —
+расстояние, делённое на среднюю скорость.
+
+Если в ячейке за этот час меньше ``MIN_SAMPLES`` доставок, берётся
+ячейка за все часы, затем весь город в этот час, затем весь город; без
+истории — значения по умолчанию.
+"""
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.utils import timezone
+
+from .models import EtaStat
+
+# Ячейка, ° (~1 км): мельче — слишком мало доставок на ячейку
+ETA_GRID = 0.01
+MIN_SAMPLES = 5
+
+DEFAULT_WAIT = 5 * 60
+DEFAULT_PICKUP = 15 * 60
+DEFAULT_SPEED_KMH = 20.0
+# Скорости вне этих границ — ошибки отметок статуса, не учитываются
+MIN_SPEED_KMH = 3.0
+MAX_SPEED_KMH = 80.0
+
+# Какие этапы ещё впереди в каждом статусе
+REMAINING = {
+    'new': ('wait', 'pickup', 'drive'),
+    'assigned': ('pickup', 'drive'),
+    'to_a': ('pickup', 'drive'),
+    'to_b': ('drive',),
+}
+
+_ALL = None
+
+
+def cell_of(lat, lng):
+    return round(lat / ETA_GRID), round(lng / ETA_GRID)
+
+
+def local_hour(dt=None) -> int:
+    return timezone.localtime(dt).hour
+
+
+class Eta(NamedTuple):
+    wait: int
+    pickup: int
+    drive: int
+
+    def remaining(self, status) -> int | None:
+        """Секунд до доставки в статусе ``status``; ``None`` — уже доставлен."""
+        stages = REMAINING.get(status)
+        if stages is None:
+            return None
+        return sum(getattr(self, stage) for stage in stages)
+
+    @property
+    def total(self) -> int:
+        return self.wait + self.pickup + self.drive
+
+
+class EtaTable:
+    def __init__(self, rows=()):
+        # (cell, hour) -> [samples, wait, pickup, drive_seconds, drive_km];
+        # _ALL вместо ячейки или часа — агрегат по всем
+        self._stats = defaultdict(lambda: [0, 0, 0, 0, 0.0])
+        for cell, hour, *values in rows:
+            for key in ((cell, hour), (cell, _ALL), (_ALL, hour), (_ALL, _ALL)):
+                acc = self._stats[key]
+                for i, value in enumerate(values):
+                    acc[i] += value
+
+    def __len__(self):
+        return sum(1 for cell, hour in self._stats if cell is not _ALL and hour is not _ALL)
+
+    def _lookup(self, cell, hour):
+        for key in ((cell, hour), (cell, _ALL), (_ALL, hour), (_ALL, _ALL)):
+            acc = self._stats.get(key)
+            if acc and acc[0] >= MIN_SAMPLES:
+                return acc
+        return None
+
+    def estimate(self, point_a, distance_km, at=None) -> Eta:
+        acc = self._lookup(cell_of(*point_a), local_hour(at))
+        if acc is None:
+            wait, pickup, speed = DEFAULT_WAIT, DEFAULT_PICKUP, DEFAULT_SPEED_KMH
+        else:
+            samples, wait_s, pickup_s, drive_s, drive_km = acc
+            wait, pickup = wait_s / samples, pickup_s / samples
+            speed = drive_km / (drive_s / 3600) if drive_s else DEFAULT_SPEED_KMH
+        drive = float(distance_km or 0) / speed * 3600
+        return Eta(round(wait), round(pickup), round(drive))
+
+
+def load_eta_table() -> EtaTable:
+    return EtaTable(
+        ((row[0], row[1]), row[2], row[3], row[4], row[5], row[6], float(row[7]))
+        for row in EtaStat.objects.values_list(
+            'cell_lat', 'cell_lng', 'hour', 'samples',
+            'wait_seconds', 'pickup_seconds', 'drive_seconds', 'drive_km',
+        )
+    )
+
+
+def format_eta(seconds) -> str:
+    minutes = max(1, round(seconds / 60))
+    if minutes < 60:
+        return f"~{minutes} мин"
+    hours, minutes = divmod(minutes, 60)
+    return f"~{hours} ч {minutes} мин" if minutes else f"~{hours} ч"
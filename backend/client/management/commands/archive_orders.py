@@ -0,0 +1,83 @@
+import csv
+import gzip
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from client.models import CourierOrder, CourierOrderEvent, Order, OrderItem
+
+# Статусы, после которых курьерский заказ больше не меняется
+FINISHED_STATUSES = ('arrived', 'completed')
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит завершённые заказы старше N месяцев в сжатые CSV-файлы "
+        "и удаляет их из рабочих таблиц. Строки читаются и удаляются пачками."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=6, help="Возраст заказов в месяцах (по умолчанию 6)")
+        parser.add_argument('--output-dir', default='archive', help="Каталог для архивов")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true', help="Только посчитать строки")
+
+    def handle(self, *args, **opts):
+        cutoff = timezone.now() - timedelta(days=30 * opts['months'])
+        out_dir = Path(opts['output_dir'])
+        stamp = f"{cutoff:%Y%m%d}_{timezone.now():%Y%m%d%H%M%S}"
+        chunk = opts['chunk_size']
+
+        courier_qs = CourierOrder.objects.filter(created_at__lt=cutoff, status__in=FINISHED_STATUSES)
+        order_qs = Order.objects.filter(created_at__lt=cutoff)
+
+        if opts['dry_run']:
+            self.stdout.write(
+                f"До {cutoff:%d.%m.%Y}: курьерских заказов {courier_qs.count()}, заказов {order_qs.count()}"
+            )
+            return
+
+        out_dir.mkdir(parents=True, exist_ok=True)
+        moved = self._archive(
+            courier_qs, out_dir / f"courier_orders_{stamp}.csv.gz", chunk,
+            children=(CourierOrderEvent, 'order_id', out_dir / f"courier_order_events_{stamp}.csv.gz"),
+        )
+        self.stdout.write(f"Курьерских заказов перенесено: {moved}")
+        moved = self._archive(
+            order_qs, out_dir / f"orders_{stamp}.csv.gz", chunk,
+            children=(OrderItem, 'order_id', out_dir / f"order_items_{stamp}.csv.gz"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Заказов перенесено: {moved}"))
+
+    def _archive(self, qs, path, chunk, children):
+        child_model, child_fk, child_path = children
+        fields = [f.attname for f in qs.model._meta.concrete_fields]
+        child_fields = [f.attname for f in child_model._meta.concrete_fields]
+        total = 0
+        last_id = 0
+        with gzip.open(path, 'wt', newline='', encoding='utf-8') as fh, \
+                gzip.open(child_path, 'wt', newline='', encoding='utf-8') as child_fh:
+            writer = csv.writer(fh)
+            child_writer = csv.writer(child_fh)
+            writer.writerow(fields)
+            child_writer.writerow(child_fields)
+            while True:
+                rows = list(qs.filter(id__gt=last_id).order_by('id').values_list(*fields)[:chunk])
+                if not rows:
+                    break
+                ids = [row[0] for row in rows]
+                last_id = ids[-1]
+                writer.writerows(rows)
+                child_writer.writerows(
+                    child_model.objects.filter(**{f"{child_fk}__in": ids})
+                    .order_by('id').values_list(*child_fields).iterator(chunk_size=chunk)
+                )
+                fh.flush()
+                child_fh.flush()
+                with transaction.atomic():
+                    qs.model.objects.filter(id__in=ids).delete()
+                total += len(ids)
+        return total
@@ -0,0 +1,69 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from client.models import Shop
+from client.routing import (
+    LANDMARKS, RoadGraph, parse_osm, save_shop_tables, shop_tables_path,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Собирает граф дорог из выгрузки OSM в ROAD_GRAPH_PATH и таблицы "
+        "расстояний от магазинов. С --shops-only пересчитывает только таблицы "
+        "(после добавления магазинов)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('osm', nargs='?', help=".osm, .osm.bz2 или .osm.gz")
+        parser.add_argument('--output', default=getattr(settings, 'ROAD_GRAPH_PATH', None))
+        parser.add_argument(
+            '--bbox', type=float, nargs=4, metavar=('MIN_LAT', 'MAX_LAT', 'MIN_LNG', 'MAX_LNG'),
+            help="Взять только узлы внутри прямоугольника",
+        )
+        parser.add_argument('--landmarks', type=int, default=LANDMARKS)
+        parser.add_argument('--shops-only', action='store_true')
+
+    def handle(self, *args, **opts):
+        output = opts['output']
+        if not output:
+            raise CommandError("Не задан путь графа: ROAD_GRAPH или --output")
+        started = time.monotonic()
+        if opts['shops_only']:
+            try:
+                graph = RoadGraph.load(output)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Граф не загружен, соберите его заново из OSM: {e}")
+        else:
+            if not opts['osm']:
+                raise CommandError("Нужен файл OSM или --shops-only")
+            coords, edges = parse_osm(opts['osm'], bbox=opts['bbox'])
+            if not coords:
+                raise CommandError("В выгрузке нет дорог")
+            try:
+                graph = RoadGraph.build(coords, edges, landmarks=opts['landmarks'], bbox=opts['bbox'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            graph.save(output)
+            self.stdout.write(
+                f"Граф: {graph.n} узлов, {len(edges)} рёбер, "
+                f"{graph.grid[2]}x{graph.grid[3]} ячеек ({time.monotonic() - started:.0f} с)"
+            )
+
+        tables = {}
+        skipped = 0
+        for lat, lng in Shop.objects.values_list('point_a_lat', 'point_a_lng'):
+            cell = graph.cell_index(lat, lng)
+            if cell in tables:
+                continue
+            try:
+                tables[cell] = graph.shop_table(lat, lng)
+            except ValueError:
+                skipped += 1
+        save_shop_tables(shop_tables_path(output), tables, len(graph.cell_node))
+        self.stdout.write(self.style.SUCCESS(
+            f"Таблиц магазинов: {len(tables)}, вне сети: {skipped} "
+            f"({time.monotonic() - started:.0f} с)"
+        ))
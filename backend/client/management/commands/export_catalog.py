@@ -0,0 +1,25 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from client.catalog_io import FORMATS, export_catalog
+from client.models import Shop
+
+
+class Command(BaseCommand):
+    help = "Выгружает товары и услуги магазина в CSV или JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('shop_id', type=int)
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', default='-', help="Файл или «-» для stdout")
+
+    def handle(self, *args, **opts):
+        if not Shop.objects.filter(id=opts['shop_id']).exists():
+            raise CommandError(f"Магазин #{opts['shop_id']} не найден")
+        lines = export_catalog(opts['shop_id'], opts['format'])
+        if opts['output'] == '-':
+            sys.stdout.writelines(lines)
+            return
+        with open(opts['output'], 'w', encoding='utf-8', newline='') as fh:
+            fh.writelines(lines)
@@ -0,0 +1,38 @@
+import csv
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from client.catalog_io import FORMATS, import_catalog, read_rows
+from client.models import Shop
+
+
+class Command(BaseCommand):
+    help = "Импортирует товары и услуги магазина из CSV или JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('shop_id', type=int)
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help="По умолчанию — по расширению файла")
+        parser.add_argument('--dry-run', action='store_true', help="Показать изменения без записи")
+
+    def handle(self, *args, **opts):
+        if not Shop.objects.filter(id=opts['shop_id']).exists():
+            raise CommandError(f"Магазин #{opts['shop_id']} не найден")
+        path = Path(opts['path'])
+        fmt = opts['format'] or ('csv' if path.suffix.lower() == '.csv' else 'json')
+        try:
+            with path.open(encoding='utf-8-sig', newline='') as fh:
+                result = import_catalog(opts['shop_id'], read_rows(fh, fmt), dry_run=opts['dry_run'])
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            raise CommandError(f"Не удалось прочитать {path}: {e}")
+
+        for line in result.diff:
+            self.stdout.write(line)
+        for line_num, error in result.errors:
+            self.stderr.write(f"строка {line_num}: {error}")
+        prefix = "Пробный запуск: " if opts['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}создано {result.created}, обновлено {result.updated}, "
+            f"без изменений {result.unchanged}, ошибок {len(result.errors)}"
+        ))
@@ -0,0 +1,35 @@
+import csv
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from client.registration import BATCH_SIZE, upsert_clients
+
+COLUMNS = ('tg_code', 'name', 'phone', 'username')
+
+
+class Command(BaseCommand):
+    help = (
+        "Массово создаёт и обновляет клиентов из CSV с колонками "
+        "tg_code, name, phone, username. Пишет пачками одним upsert-запросом."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **opts):
+        path = Path(opts['path'])
+        with path.open(encoding='utf-8-sig', newline='') as fh:
+            reader = csv.DictReader(fh)
+            missing = {'tg_code'} - set(reader.fieldnames or ())
+            if missing:
+                raise CommandError("В файле нет колонки tg_code")
+            rows = (
+                tuple((row.get(col) or '').strip() or None for col in COLUMNS)
+                for row in reader if (row.get('tg_code') or '').strip()
+            )
+            result = upsert_clients(rows, batch_size=opts['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"создано {result.created}, обновлено {result.updated}, без изменений {result.unchanged}"
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from client.rollups import refresh_courier_deliveries, refresh_eta_stats, refresh_shop_sales
+
+
+class Command(BaseCommand):
+    help = "Инкрементально пересчитывает аналитику продаж, доставок и статистику ETA (запускать по cron)."
+
+    def handle(self, *args, **opts):
+        orders = refresh_shop_sales()
+        deliveries = refresh_courier_deliveries()
+        eta_samples = refresh_eta_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Учтено заказов: {orders}, доставок: {deliveries}, для ETA: {eta_samples}"
+        ))
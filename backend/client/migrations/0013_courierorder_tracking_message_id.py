@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-19 17:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0012_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courierorder',
+            name='tracking_message_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Сообщение со статусом у клиента'),
+        ),
+    ]
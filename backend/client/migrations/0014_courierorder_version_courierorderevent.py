@@ -0,0 +1,36 @@
+# Generated by Django 5.2.2 on 2026-10-19 17:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0013_courierorder_tracking_message_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courierorder',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Увеличивается при каждом переходе статуса', verbose_name='Версия'),
+        ),
+        migrations.CreateModel(
+            name='CourierOrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('new', 'Новый'), ('assigned', 'Назначен'), ('to_a', 'В пути до точки А'), ('to_b', 'В пути до точки Б'), ('arrived', 'Приехал'), ('completed', 'Завершён')], max_length=20, verbose_name='Статус')),
+                ('version', models.PositiveIntegerField(verbose_name='Версия заказа')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время перехода')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='client.courierorder', verbose_name='Заказ')),
+            ],
+            options={
+                'verbose_name': 'Переход статуса',
+                'verbose_name_plural': 'Переходы статусов',
+                'ordering': ['order', 'version'],
+                'indexes': [models.Index(fields=['order', 'version'], name='client_cour_order_i_388b74_idx')],
+            },
+        ),
+    ]
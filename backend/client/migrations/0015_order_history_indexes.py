@@ -0,0 +1,25 @@
+# Generated by Django 5.2.2 on 2026-10-19 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0014_courierorder_version_courierorderevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='courierorder',
+            index=models.Index(fields=['-created_at'], name='courierorder_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='courierorder',
+            index=models.Index(fields=['status', 'created_at'], name='courierorder_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-created_at'], name='order_created_idx'),
+        ),
+    ]
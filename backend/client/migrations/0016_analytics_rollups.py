@@ -0,0 +1,66 @@
+# Generated by Django 5.2.2 on 2026-10-19 17:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0015_order_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Источник')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='Последний id')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Отметка пересчёта',
+                'verbose_name_plural': 'Отметки пересчёта',
+            },
+        ),
+        migrations.CreateModel(
+            name='CourierDeliveryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Час'), ('day', 'День')], max_length=4, verbose_name='Период')),
+                ('bucket', models.DateTimeField(verbose_name='Начало периода')),
+                ('deliveries', models.PositiveIntegerField(default=0, verbose_name='Доставок')),
+                ('distance_km', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Расстояние (км)')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Стоимость доставок (сом)')),
+                ('wait_seconds', models.BigIntegerField(default=0, help_text='new → assigned', verbose_name='Ожидание курьера (сек)')),
+                ('to_a_seconds', models.BigIntegerField(default=0, help_text='assigned → to_b', verbose_name='До точки А (сек)')),
+                ('to_b_seconds', models.BigIntegerField(default=0, help_text='to_b → arrived', verbose_name='До точки Б (сек)')),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_rollups', to='client.client', verbose_name='Курьер')),
+            ],
+            options={
+                'verbose_name': 'Доставки курьера',
+                'verbose_name_plural': 'Аналитика: доставки курьеров',
+                'ordering': ['-bucket'],
+                'constraints': [models.UniqueConstraint(fields=('courier', 'period', 'bucket'), name='uniq_courier_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ShopSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Час'), ('day', 'День')], max_length=4, verbose_name='Период')),
+                ('bucket', models.DateTimeField(verbose_name='Начало периода')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Заказов')),
+                ('revenue', models.BigIntegerField(default=0, verbose_name='Выручка (KGS)')),
+                ('items_sold', models.PositiveIntegerField(default=0, verbose_name='Продано позиций')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='client.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Продажи магазина',
+                'verbose_name_plural': 'Аналитика: продажи магазинов',
+                'ordering': ['-bucket'],
+                'constraints': [models.UniqueConstraint(fields=('shop', 'period', 'bucket'), name='uniq_shop_rollup')],
+            },
+        ),
+    ]
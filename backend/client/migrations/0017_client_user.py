@@ -0,0 +1,33 @@
+# Generated by Django 5.2.2 on 2026-10-19 17:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def link_users_by_phone(apps, schema_editor):
+    """Раньше владелец определялся по совпадению User.last_name с Client.phone."""
+    Client = apps.get_model('client', 'Client')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    for user_id, phone in User.objects.exclude(last_name='').values_list('id', 'last_name'):
+        client = Client.objects.filter(phone=phone, user__isnull=True).order_by('id').first()
+        if client:
+            client.user_id = user_id
+            client.save(update_fields=['user'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0016_analytics_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='client', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь админки'),
+        ),
+        migrations.RunPython(link_users_by_phone, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.2 on 2026-10-19 17:34
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0017_client_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courierorder',
+            name='awaiting_dispatch',
+            field=models.BooleanField(default=False, editable=False, help_text='Заказ копится в окне объединения и ещё не опубликован', verbose_name='Ждёт отправки курьерам'),
+        ),
+        migrations.CreateModel(
+            name='CourierBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stops', models.JSONField(default=list, help_text="Точки объезда по порядку: [['a' или 'b', id заказа], ...]", verbose_name='Маршрут')),
+                ('distance_km', models.DecimalField(decimal_places=2, max_digits=6, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Длина маршрута (км)')),
+                ('price', models.DecimalField(decimal_places=2, help_text='Сумма цен заказов пакета', max_digits=8, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Цена (сом)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('courier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='delivery_batches', to='client.client', verbose_name='Курьер')),
+            ],
+            options={
+                'verbose_name': 'Пакет доставок',
+                'verbose_name_plural': 'Пакеты доставок',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='courierorder',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='client.courierbatch', verbose_name='Пакет'),
+        ),
+        migrations.AddIndex(
+            model_name='courierorder',
+            index=models.Index(condition=models.Q(('awaiting_dispatch', True)), fields=['created_at'], name='courierorder_dispatch_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.2 on 2026-10-19 17:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0018_courier_batches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EtaStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell_lat', models.IntegerField(help_text='round(широта / ETA_GRID)', verbose_name='Ячейка: широта')),
+                ('cell_lng', models.IntegerField(help_text='round(долгота / ETA_GRID)', verbose_name='Ячейка: долгота')),
+                ('hour', models.PositiveSmallIntegerField(verbose_name='Час суток')),
+                ('samples', models.PositiveIntegerField(default=0, verbose_name='Доставок')),
+                ('wait_seconds', models.BigIntegerField(default=0, help_text='new → assigned', verbose_name='Ожидание курьера (сек)')),
+                ('pickup_seconds', models.BigIntegerField(default=0, help_text='assigned → to_b', verbose_name='Забор (сек)')),
+                ('drive_seconds', models.BigIntegerField(default=0, help_text='to_b → arrived', verbose_name='В пути до Б (сек)')),
+                ('drive_km', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Расстояние (км)')),
+            ],
+            options={
+                'verbose_name': 'Статистика ETA',
+                'verbose_name_plural': 'Аналитика: статистика ETA',
+                'constraints': [models.UniqueConstraint(fields=('cell_lat', 'cell_lng', 'hour'), name='uniq_eta_stat')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.2 on 2026-10-19 17:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0019_eta_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourierTrack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(verbose_name='Первая точка')),
+                ('ended_at', models.DateTimeField(verbose_name='Последняя точка')),
+                ('points', models.PositiveIntegerField(verbose_name='Точек')),
+                ('data', models.BinaryField(help_text='Разности в zigzag-varint, см. client.tracks', verbose_name='Точки')),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tracks', to='client.client', verbose_name='Курьер')),
+            ],
+            options={
+                'verbose_name': 'Трек курьера',
+                'verbose_name_plural': 'Треки курьеров',
+                'ordering': ['-ended_at'],
+                'indexes': [models.Index(fields=['courier', '-ended_at'], name='couriertrack_courier_idx')],
+            },
+        ),
+    ]
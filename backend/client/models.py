@@ -1,14 +1,23 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 from decimal import Decimal
 from django.core.validators import MinValueValidator
 from django.utils.functional import cached_property
-from math import radians, sin, cos, sqrt, atan2
 
-class Client(models.Model):
+from .dirty import DirtyFieldsMixin
+from .routing import road_distance_km
+
+class Client(DirtyFieldsMixin, models.Model):
     tg_code = models.CharField("Telegram ID", max_length=50, unique=True)
     name = models.CharField("Имя клиента", max_length=200, blank=True, null=True)
     phone = models.CharField("Номер телефона", max_length=30, blank=True, null=True)
     username = models.CharField("Юзернейм", max_length=150, blank=True, null=True)
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, verbose_name="Пользователь админки",
+        on_delete=models.SET_NULL, null=True, blank=True, related_name='client'
+    )
     is_banned = models.BooleanField("Забанен", default=False)
     next_ability = models.DateTimeField(
         "Когда можно будет снова публиковать", null=True, blank=True
@@ -52,6 +61,34 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class CatalogVersion(models.Model):
+    """Счётчик изменений каталога: категории, магазины, товары, услуги.
+
+    Единственная строка (pk=1) увеличивается сигналами при любом изменении,
+    по её значению бот сбрасывает закэшированные меню.
+    """
+    version = models.PositiveBigIntegerField("Версия каталога", default=0)
+    updated_at = models.DateTimeField("Дата обновления", auto_now=True)
+
+    class Meta:
+        verbose_name = "Версия каталога"
+        verbose_name_plural = "Версия каталога"
+
+    def __str__(self):
+        return f"v{self.version}"
+
+    @classmethod
+    def current(cls) -> int:
+        return cls.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        updated = cls.objects.filter(pk=1).update(
+            version=F('version') + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            cls.objects.get_or_create(pk=1, defaults={'version': 1})
+
 class Shop(models.Model):
     owner = models.ForeignKey(
         Client,
@@ -127,7 +164,7 @@ class Service(models.Model):
     def __str__(self):
         return f"{self.name} ({self.shop.name}) — {self.price}KGS"
 
-class Order(models.Model):
+class Order(DirtyFieldsMixin, models.Model):
     shop = models.ForeignKey(
         Shop,
         verbose_name="Магазин",
@@ -147,6 +184,7 @@ class Order(models.Model):
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=['-created_at'], name='order_created_idx')]
 
     def __str__(self):
         return f"Заказ #{self.id} — {self.total_price}KGS"
@@ -226,7 +264,35 @@ class TimeSurcharge(models.Model):
             return self.start_time <= check_time < self.end_time
         return check_time >= self.start_time or check_time < self.end_time
 
-class CourierOrder(models.Model):
+class CourierBatch(models.Model):
+    """Несколько курьерских заказов, отданных одному курьеру одной поездкой"""
+    courier = models.ForeignKey(
+        Client, verbose_name="Курьер", on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='delivery_batches'
+    )
+    stops = models.JSONField(
+        "Маршрут", default=list,
+        help_text="Точки объезда по порядку: [['a' или 'b', id заказа], ...]"
+    )
+    distance_km = models.DecimalField(
+        "Длина маршрута (км)", max_digits=6, decimal_places=2,
+        validators=[MinValueValidator(0)]
+    )
+    price = models.DecimalField(
+        "Цена (сом)", max_digits=8, decimal_places=2,
+        validators=[MinValueValidator(0)], help_text="Сумма цен заказов пакета"
+    )
+    created_at = models.DateTimeField("Дата создания", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Пакет доставок"
+        verbose_name_plural = "Пакеты доставок"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Пакет #{self.id}"
+
+class CourierOrder(DirtyFieldsMixin, models.Model):
     """Модель чистой доставки (не привязана к магазину)"""
     client = models.ForeignKey(
         Client, verbose_name="Клиент", on_delete=models.CASCADE,
@@ -254,7 +320,22 @@ class CourierOrder(models.Model):
         choices=STATUS_CHOICES,
         default='new',
     )
+    version = models.PositiveIntegerField(
+        "Версия", default=0, editable=False,
+        help_text="Увеличивается при каждом переходе статуса"
+    )
     comment = models.TextField("Комментарий", blank=True)
+    tracking_message_id = models.BigIntegerField(
+        "Сообщение со статусом у клиента", null=True, blank=True
+    )
+    batch = models.ForeignKey(
+        CourierBatch, verbose_name="Пакет", on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='orders'
+    )
+    awaiting_dispatch = models.BooleanField(
+        "Ждёт отправки курьерам", default=False, editable=False,
+        help_text="Заказ копится в окне объединения и ещё не опубликован"
+    )
 
     distance_km = models.DecimalField(
         "Расстояние (км)", max_digits=6, decimal_places=2,
@@ -272,23 +353,37 @@ class CourierOrder(models.Model):
         verbose_name = "Курьерский заказ"
         verbose_name_plural = "Курьерские заказы"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='courierorder_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='courierorder_status_idx'),
+            models.Index(
+                fields=['created_at'], condition=models.Q(awaiting_dispatch=True),
+                name='courierorder_dispatch_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"Доставка #{self.id} от {self.client}"
 
+    PRICING_FIELDS = ('point_a_lat', 'point_a_lng', 'point_b_lat', 'point_b_lng')
+
     def save(self, *args, **kwargs):
-        # Рассчитать расстояние и цену при сохранении
-        # Формула гаверсинуса
-        R = 6371.0
-        lat1, lon1, lat2, lon2 = map(radians, [
+        # Цена пересчитывается только для нового заказа без цены (бот передаёт
+        # цену из предпросмотра) или при смене точек, а не при смене статуса
+        dirty = self.dirty_fields()
+        if self._state.adding:
+            if self.price is None:
+                self._calculate_price()
+        elif dirty is None or dirty.intersection(self.PRICING_FIELDS):
+            self._calculate_price()
+        super().save(*args, **kwargs)
+
+    def _calculate_price(self):
+        # По дорогам, если собран граф, иначе по прямой
+        dist = round(road_distance_km(
             self.point_a_lat, self.point_a_lng,
-            self.point_b_lat, self.point_b_lng
-        ])
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = sin(dlat/2)**2 + cos(lat1)*cos(lat2)*sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        dist = round(R * c, 2)
+            self.point_b_lat, self.point_b_lng,
+        ), 2)
         self.distance_km = dist
 
         # Поиск правила
@@ -303,17 +398,150 @@ class CourierOrder(models.Model):
             price = float(rule.base_price) + dist * float(rule.per_km_price)
             price *= float(rule.multiplier)
             # наценка по времени
-            now = self.created_at.time()
+            now = (self.created_at or timezone.now()).time()
             for ts in TimeSurcharge.objects.all():
                 if ts.applies(now):
                     price *= float(ts.multiplier)
             self.price = round(price, 2)
 
-        super().save(*args, **kwargs)
-
     def get_2gis_link(self) -> str:
         return (
             f"https://2gis.kg/routeSearch/geo/"
             f"{self.point_a_lat},{self.point_a_lng}/"
             f"{self.point_b_lat},{self.point_b_lng}"
         )
+
+class CourierTrack(models.Model):
+    """Отрезок трека курьера по live-location (см. client.tracks)"""
+    courier = models.ForeignKey(
+        Client, verbose_name="Курьер", on_delete=models.CASCADE,
+        related_name='tracks'
+    )
+    started_at = models.DateTimeField("Первая точка")
+    ended_at = models.DateTimeField("Последняя точка")
+    points = models.PositiveIntegerField("Точек")
+    data = models.BinaryField("Точки", help_text="Разности в zigzag-varint, см. client.tracks")
+
+    class Meta:
+        verbose_name = "Трек курьера"
+        verbose_name_plural = "Треки курьеров"
+        ordering = ['-ended_at']
+        indexes = [models.Index(fields=['courier', '-ended_at'], name='couriertrack_courier_idx')]
+
+    def __str__(self):
+        return f"{self.courier_id} {self.started_at:%d.%m %H:%M}–{self.ended_at:%H:%M}"
+
+class CourierOrderEvent(models.Model):
+    """Журнал переходов статуса курьерского заказа"""
+    order = models.ForeignKey(
+        CourierOrder, verbose_name="Заказ", on_delete=models.CASCADE,
+        related_name='events'
+    )
+    status = models.CharField("Статус", max_length=20, choices=CourierOrder.STATUS_CHOICES)
+    version = models.PositiveIntegerField("Версия заказа")
+    created_at = models.DateTimeField("Время перехода", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Переход статуса"
+        verbose_name_plural = "Переходы статусов"
+        ordering = ['order', 'version']
+        indexes = [models.Index(fields=['order', 'version'])]
+
+    def __str__(self):
+        return f"#{self.order_id} → {self.status}"
+
+# --------------- Аналитика: предагрегированные таблицы ---------------
+
+PERIOD_CHOICES = [
+    ('hour', 'Час'),
+    ('day', 'День'),
+]
+
+class ShopSalesRollup(models.Model):
+    """Продажи магазина за час/день"""
+    shop = models.ForeignKey(
+        Shop, verbose_name="Магазин", on_delete=models.CASCADE,
+        related_name='sales_rollups'
+    )
+    period = models.CharField("Период", max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField("Начало периода")
+    orders_count = models.PositiveIntegerField("Заказов", default=0)
+    revenue = models.BigIntegerField("Выручка (KGS)", default=0)
+    items_sold = models.PositiveIntegerField("Продано позиций", default=0)
+
+    class Meta:
+        verbose_name = "Продажи магазина"
+        verbose_name_plural = "Аналитика: продажи магазинов"
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'period', 'bucket'], name='uniq_shop_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.shop_id} {self.period} {self.bucket:%d.%m.%Y %H:%M}"
+
+class CourierDeliveryRollup(models.Model):
+    """Доставки курьера за час/день; время этапов — суммы в секундах"""
+    courier = models.ForeignKey(
+        Client, verbose_name="Курьер", on_delete=models.CASCADE,
+        related_name='delivery_rollups'
+    )
+    period = models.CharField("Период", max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField("Начало периода")
+    deliveries = models.PositiveIntegerField("Доставок", default=0)
+    distance_km = models.DecimalField("Расстояние (км)", max_digits=10, decimal_places=2, default=0)
+    revenue = models.DecimalField("Стоимость доставок (сом)", max_digits=12, decimal_places=2, default=0)
+    wait_seconds = models.BigIntegerField("Ожидание курьера (сек)", default=0,
+                                          help_text="new → assigned")
+    to_a_seconds = models.BigIntegerField("До точки А (сек)", default=0,
+                                          help_text="assigned → to_b")
+    to_b_seconds = models.BigIntegerField("До точки Б (сек)", default=0,
+                                          help_text="to_b → arrived")
+
+    class Meta:
+        verbose_name = "Доставки курьера"
+        verbose_name_plural = "Аналитика: доставки курьеров"
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['courier', 'period', 'bucket'], name='uniq_courier_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.courier_id} {self.period} {self.bucket:%d.%m.%Y %H:%M}"
+
+class EtaStat(models.Model):
+    """Суммы времени этапов доставок по ячейке точки А и часу суток — для ETA"""
+    cell_lat = models.IntegerField("Ячейка: широта", help_text="round(широта / ETA_GRID)")
+    cell_lng = models.IntegerField("Ячейка: долгота", help_text="round(долгота / ETA_GRID)")
+    hour = models.PositiveSmallIntegerField("Час суток")
+    samples = models.PositiveIntegerField("Доставок", default=0)
+    wait_seconds = models.BigIntegerField("Ожидание курьера (сек)", default=0,
+                                          help_text="new → assigned")
+    pickup_seconds = models.BigIntegerField("Забор (сек)", default=0,
+                                            help_text="assigned → to_b")
+    drive_seconds = models.BigIntegerField("В пути до Б (сек)", default=0,
+                                           help_text="to_b → arrived")
+    drive_km = models.DecimalField("Расстояние (км)", max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Статистика ETA"
+        verbose_name_plural = "Аналитика: статистика ETA"
+        constraints = [
+            models.UniqueConstraint(fields=['cell_lat', 'cell_lng', 'hour'], name='uniq_eta_stat'),
+        ]
+
+    def __str__(self):
+        return f"{self.cell_lat}:{self.cell_lng} {self.hour:02d}ч"
+
+class RollupWatermark(models.Model):
+    """Последняя учтённая строка источника для инкрементального пересчёта"""
+    name = models.CharField("Источник", max_length=50, unique=True)
+    last_id = models.BigIntegerField("Последний id", default=0)
+    updated_at = models.DateTimeField("Дата обновления", auto_now=True)
+
+    class Meta:
+        verbose_name = "Отметка пересчёта"
+        verbose_name_plural = "Отметки пересчёта"
+
+    def __str__(self):
+        return f"{self.name}: {self.last_id}"
@@ -0,0 +1,95 @@
+"""Регистрация клиентов бота одним upsert-запросом.
+
+``INSERT ... ON CONFLICT (tg_code) DO UPDATE ... WHERE`` вместо
+``get_or_create`` + сравнения в Python + полного ``save()``: новая запись и
+изменение имени/телефона/юзернейма — один запрос без гонки между
+SELECT и INSERT. Если данные не изменились, строка не перезаписывается
+(условие ``IS DISTINCT FROM``) и ``RETURNING`` пуст — тогда id читается
+отдельным SELECT по индексу.
+
+Юзернейм, как и раньше, только дописывается: пустой не затирает старый.
+"""
+from dataclasses import dataclass
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Client
+
+BATCH_SIZE = 1000
+
+CREATED, UPDATED, UNCHANGED = 'created', 'updated', 'unchanged'
+
+
+@dataclass
+class UpsertResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+
+def _sql(rows: int) -> str:
+    table = connection.ops.quote_name(Client._meta.db_table)
+    values = ", ".join(["(%s, %s, %s, NULLIF(%s, ''), FALSE, %s, %s)"] * rows)
+    return f"""
+        INSERT INTO {table} AS c (tg_code, name, phone, username, is_banned, created_at, updated_at)
+        VALUES {values}
+        ON CONFLICT (tg_code) DO UPDATE SET
+            name = EXCLUDED.name,
+            phone = EXCLUDED.phone,
+            username = COALESCE(EXCLUDED.username, c.username),
+            updated_at = EXCLUDED.updated_at
+        WHERE (c.name, c.phone, c.username)
+            IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.phone, COALESCE(EXCLUDED.username, c.username))
+        RETURNING tg_code, id, created_at = updated_at
+    """
+
+
+def _params(rows, now):
+    params = []
+    for tg_code, name, phone, username in rows:
+        params += [str(tg_code), name, phone, username or '', now, now]
+    return params
+
+
+def upsert_client(tg_code, name, phone, username=None):
+    """Создаёт или обновляет клиента; возвращает (id, CREATED/UPDATED/UNCHANGED)."""
+    with connection.cursor() as cursor:
+        cursor.execute(_sql(1), _params([(tg_code, name, phone, username)], timezone.now()))
+        row = cursor.fetchone()
+    if row:
+        return row[1], CREATED if row[2] else UPDATED
+    return Client.objects.filter(tg_code=str(tg_code)).values_list('id', flat=True).get(), UNCHANGED
+
+
+def upsert_clients(rows, batch_size=BATCH_SIZE) -> UpsertResult:
+    """Пакетный вариант для импорта: ``rows`` — (tg_code, name, phone, username).
+
+    Один запрос на ``batch_size`` строк. Повтор tg_code начинает новую
+    пачку, так что побеждает последняя строка — Postgres не даёт обновить
+    одну запись дважды за запрос.
+    """
+    result = UpsertResult()
+    batch = {}
+
+    def flush():
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(_sql(len(batch)), _params(batch.values(), now))
+            returned = cursor.fetchall()
+        created = sum(1 for row in returned if row[2])
+        result.created += created
+        result.updated += len(returned) - created
+        result.unchanged += len(batch) - len(returned)
+        batch.clear()
+
+    for tg_code, name, phone, username in rows:
+        tg_code = str(tg_code)
+        if tg_code in batch:
+            flush()
+        batch[tg_code] = (tg_code, name, phone, username)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return result
@@ -0,0 +1,263 @@
+"""Инкрементальный пересчёт аналитики продаж и доставок.
+
+Каждый источник обрабатывается от своей отметки (``RollupWatermark``):
+берутся только новые строки, их вклад суммируется с уже посчитанными
+часовыми и дневными корзинами. Полных сканов Order/OrderItem/CourierOrder
+нет — отчёты в админке читают только таблицы *Rollup. Так же
+копится ``EtaStat`` для оценки времени доставки (``client.eta``).
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from . import eta
+from .models import (
+    CourierDeliveryRollup, CourierOrder, CourierOrderEvent, EtaStat, Order, OrderItem,
+    RollupWatermark, ShopSalesRollup,
+)
+
+# Позиции заказа пишутся отдельным запросом после Order — даём им время
+SETTLE_DELAY = timedelta(minutes=5)
+BATCH_SIZE = 5000
+
+PERIODS = (('hour', TruncHour), ('day', TruncDay))
+
+SHOP_FIELDS = ('orders_count', 'revenue', 'items_sold')
+COURIER_FIELDS = ('deliveries', 'distance_km', 'revenue', 'wait_seconds', 'to_a_seconds', 'to_b_seconds')
+ETA_FIELDS = ('samples', 'wait_seconds', 'pickup_seconds', 'drive_seconds', 'drive_km')
+# Этап дольше этого — забытая кнопка статуса, а не реальная доставка
+MAX_STAGE = timedelta(hours=3)
+
+
+def _lock_watermark(name):
+    RollupWatermark.objects.get_or_create(name=name)
+    return RollupWatermark.objects.select_for_update().get(name=name)
+
+
+def _truncate(dt, period):
+    dt = dt.replace(minute=0, second=0, microsecond=0)
+    return dt.replace(hour=0) if period == 'day' else dt
+
+
+def _merge(model, owner_field, deltas, fields):
+    """Прибавляет ``deltas`` {(owner_id, period, bucket): {field: value}} к таблице."""
+    if not deltas:
+        return
+    owners = {key[0] for key in deltas}
+    buckets = {key[2] for key in deltas}
+    existing = {
+        (getattr(row, f"{owner_field}_id"), row.period, row.bucket): row
+        for row in model.objects.filter(**{f"{owner_field}_id__in": owners, 'bucket__in': buckets})
+    }
+    rows = []
+    for (owner_id, period, bucket), delta in deltas.items():
+        row = existing.get((owner_id, period, bucket)) or model(
+            **{f"{owner_field}_id": owner_id, 'period': period, 'bucket': bucket}
+        )
+        for field in fields:
+            setattr(row, field, (getattr(row, field) or 0) + delta.get(field, 0))
+        rows.append(row)
+    model.objects.bulk_create(
+        rows, update_conflicts=True,
+        unique_fields=[owner_field, 'period', 'bucket'], update_fields=list(fields),
+    )
+
+
+def refresh_shop_sales(batch_size=BATCH_SIZE) -> int:
+    """Добавляет в ShopSalesRollup заказы, появившиеся после отметки."""
+    processed = 0
+    while True:
+        with transaction.atomic():
+            mark = _lock_watermark('orders')
+            horizon = timezone.now() - SETTLE_DELAY
+            ids = list(
+                Order.objects
+                .filter(id__gt=mark.last_id, created_at__lt=horizon)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return processed
+
+            upper = ids[-1]
+            orders = Order.objects.filter(id__gt=mark.last_id, id__lte=upper)
+            items = OrderItem.objects.filter(order__id__gt=mark.last_id, order__id__lte=upper)
+            deltas = defaultdict(dict)
+            for period, trunc in PERIODS:
+                for row in (
+                    orders.annotate(b=trunc('created_at')).values('shop_id', 'b')
+                    .annotate(n=Count('id'), total=Sum('total_price')).order_by()
+                ):
+                    key = (row['shop_id'], period, row['b'])
+                    deltas[key]['orders_count'] = row['n']
+                    deltas[key]['revenue'] = row['total'] or 0
+                for row in (
+                    items.annotate(b=trunc('order__created_at')).values('order__shop_id', 'b')
+                    .annotate(qty=Sum('quantity')).order_by()
+                ):
+                    deltas[(row['order__shop_id'], period, row['b'])]['items_sold'] = row['qty'] or 0
+            _merge(ShopSalesRollup, 'shop', deltas, SHOP_FIELDS)
+            processed += orders.count()
+            mark.last_id = upper
+            mark.save(update_fields=['last_id', 'updated_at'])
+
+
+def _stage_seconds(events):
+    """Время этапов доставки по журналу переходов одного заказа."""
+    at = {status: ts for status, ts in events}
+
+    def span(start, end):
+        if start in at and end in at:
+            return max(0, int((at[end] - at[start]).total_seconds()))
+        return 0
+
+    return {
+        'wait_seconds': span('new', 'assigned'),
+        'to_a_seconds': span('assigned', 'to_b'),
+        'to_b_seconds': span('to_b', 'arrived'),
+    }
+
+
+def refresh_courier_deliveries(batch_size=BATCH_SIZE) -> int:
+    """Добавляет в CourierDeliveryRollup доставки, завершённые после отметки."""
+    processed = 0
+    while True:
+        with transaction.atomic():
+            mark = _lock_watermark('courier_arrivals')
+            arrivals = list(
+                CourierOrderEvent.objects
+                .filter(id__gt=mark.last_id, status='arrived')
+                .order_by('id')
+                .values_list('id', 'order_id', 'created_at')[:batch_size]
+            )
+            if not arrivals:
+                return processed
+
+            order_ids = [order_id for _, order_id, _ in arrivals]
+            orders = {
+                row['id']: row
+                for row in CourierOrder.objects.filter(id__in=order_ids, courier__isnull=False)
+                .values('id', 'courier_id', 'distance_km', 'price')
+            }
+            events = defaultdict(list)
+            for order_id, status, ts in (
+                CourierOrderEvent.objects.filter(order_id__in=order_ids)
+                .order_by('id').values_list('order_id', 'status', 'created_at')
+            ):
+                events[order_id].append((status, ts))
+
+            deltas = defaultdict(lambda: defaultdict(int))
+            for _, order_id, arrived_at in arrivals:
+                order = orders.get(order_id)
+                if not order:
+                    continue
+                stages = _stage_seconds(events[order_id])
+                for period, _ in PERIODS:
+                    delta = deltas[(order['courier_id'], period, _truncate(arrived_at, period))]
+                    delta['deliveries'] += 1
+                    delta['distance_km'] += order['distance_km'] or Decimal('0')
+                    delta['revenue'] += order['price'] or Decimal('0')
+                    for field, seconds in stages.items():
+                        delta[field] += seconds
+            _merge(CourierDeliveryRollup, 'courier', deltas, COURIER_FIELDS)
+            processed += len(arrivals)
+            mark.last_id = arrivals[-1][0]
+            mark.save(update_fields=['last_id', 'updated_at'])
+
+
+def _merge_eta(deltas):
+    """Прибавляет ``deltas`` {(cell_lat, cell_lng, hour): {field: value}} к EtaStat."""
+    if not deltas:
+        return
+    keys = set(deltas)
+    existing = {
+        (row.cell_lat, row.cell_lng, row.hour): row
+        for row in EtaStat.objects.filter(
+            cell_lat__in={k[0] for k in keys}, cell_lng__in={k[1] for k in keys},
+        )
+    }
+    rows = []
+    for key, delta in deltas.items():
+        row = existing.get(key) or EtaStat(cell_lat=key[0], cell_lng=key[1], hour=key[2])
+        for field in ETA_FIELDS:
+            setattr(row, field, (getattr(row, field) or 0) + delta.get(field, 0))
+        rows.append(row)
+    EtaStat.objects.bulk_create(
+        rows, update_conflicts=True,
+        unique_fields=['cell_lat', 'cell_lng', 'hour'], update_fields=list(ETA_FIELDS),
+    )
+
+
+def _eta_sample(events, distance_km):
+    """(ожидание, забор, поездка) в секундах или ``None``, если данные неполные."""
+    at = {status: ts for status, ts in events}
+    if not {'new', 'assigned', 'to_b', 'arrived'} <= at.keys() or not distance_km:
+        return None
+    spans = (
+        at['assigned'] - at['new'],
+        at['to_b'] - at['assigned'],
+        at['arrived'] - at['to_b'],
+    )
+    if any(span < timedelta(0) or span > MAX_STAGE for span in spans):
+        return None
+    wait, pickup, drive = (int(span.total_seconds()) for span in spans)
+    if not drive:
+        return None
+    speed = float(distance_km) / (drive / 3600)
+    if not eta.MIN_SPEED_KMH <= speed <= eta.MAX_SPEED_KMH:
+        return None
+    return wait, pickup, drive
+
+
+def refresh_eta_stats(batch_size=BATCH_SIZE) -> int:
+    """Добавляет в EtaStat доставки, завершённые после отметки."""
+    processed = 0
+    while True:
+        with transaction.atomic():
+            mark = _lock_watermark('eta_arrivals')
+            arrivals = list(
+                CourierOrderEvent.objects
+                .filter(id__gt=mark.last_id, status='arrived')
+                .order_by('id')
+                .values_list('id', 'order_id')[:batch_size]
+            )
+            if not arrivals:
+                return processed
+
+            order_ids = [order_id for _, order_id in arrivals]
+            orders = {
+                row['id']: row
+                for row in CourierOrder.objects.filter(id__in=order_ids)
+                .values('id', 'point_a_lat', 'point_a_lng', 'distance_km', 'created_at')
+            }
+            events = defaultdict(list)
+            for order_id, status, ts in (
+                CourierOrderEvent.objects.filter(order_id__in=order_ids)
+                .order_by('id').values_list('order_id', 'status', 'created_at')
+            ):
+                events[order_id].append((status, ts))
+
+            deltas = defaultdict(lambda: defaultdict(int))
+            for _, order_id in arrivals:
+                order = orders.get(order_id)
+                if not order:
+                    continue
+                sample = _eta_sample(events[order_id], order['distance_km'])
+                if sample is None:
+                    continue
+                cell = eta.cell_of(order['point_a_lat'], order['point_a_lng'])
+                delta = deltas[(*cell, eta.local_hour(order['created_at']))]
+                delta['samples'] += 1
+                delta['wait_seconds'] += sample[0]
+                delta['pickup_seconds'] += sample[1]
+                delta['drive_seconds'] += sample[2]
+                delta['drive_km'] += order['distance_km']
+            _merge_eta(deltas)
+            processed += len(arrivals)
+            mark.last_id = arrivals[-1][0]
+            mark.save(update_fields=['last_id', 'updated_at'])
@@ -0,0 +1,481 @@
+"""Расстояние по дорогам без внешних сервисов.
+
+Граф строится командой ``build_routing`` из локальной выгрузки OSM
+(город, .osm/.osm.bz2/.osm.gz) и хранится одним бинарным файлом
+``ROAD_GRAPH_PATH``: координаты узлов и рёбра в виде CSR-массивов
+(``array``, без numpy), расстояния до/от ориентиров (landmarks) и
+ближайший узел для каждой ячейки сетки ``GRID``.
+
+Поиск — A* с ориентирами (ALT): нижняя оценка по неравенству
+треугольника через расстояния до ориентиров, обычно на порядок меньше
+просмотренных узлов, чем у Дейкстры. Результаты по паре узлов — в
+LRU-кэше. Для магазинов рядом лежит ``<путь>.shops``: таблица
+«ячейка магазина → расстояние до каждой ячейки сетки», одна Дейкстра на
+магазин при сборке, поэтому доставка из магазина — обращение к массиву.
+
+Если граф не задан, не собран или точку не к чему привязать, берётся
+расстояние по прямой (``haversine_km``) — как было раньше.
+"""
+import bz2
+import gzip
+import heapq
+import logging
+import struct
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+from functools import lru_cache
+from math import ceil, cos, inf, radians
+from pathlib import Path
+
+from django.conf import settings
+
+from .geo import KM_PER_DEG_LAT, haversine_km
+
+logger = logging.getLogger(__name__)
+
+# Ячейка сетки, ° (~200 м) — та же, что у кэша цен бота
+GRID = 0.002
+# Ячейка пространственного индекса узлов, °
+INDEX_CELL = 0.005
+# Дальше этого точка считается вне дорожной сети
+MAX_SNAP_KM = 1.0
+LANDMARKS = 16
+# Сколько ориентиров с лучшей оценкой использовать в одном поиске
+ACTIVE_LANDMARKS = 4
+ROUTE_CACHE_SIZE = 65536
+# Сетка больше этого — выгрузка не городская, нужен --bbox
+MAX_CELLS = 2_000_000
+
+MAGIC = b'RGRF'
+SHOPS_MAGIC = b'RGRS'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sIIIIddII')
+_SHOPS_HEADER = struct.Struct('<4sIII')
+
+# Дороги, по которым ездит курьер
+ROAD_TYPES = {
+    'motorway', 'trunk', 'primary', 'secondary', 'tertiary', 'unclassified',
+    'residential', 'living_street', 'service', 'road',
+    'motorway_link', 'trunk_link', 'primary_link', 'secondary_link', 'tertiary_link',
+}
+ONEWAY_YES = {'yes', '1', 'true'}
+NO_ACCESS = {'no', 'private'}
+
+
+def _csr(n, edges, reverse=False):
+    """(offsets, targets, weights) списка рёбер (u, v, w) в виде массивов."""
+    counts = [0] * (n + 1)
+    for u, v, _ in edges:
+        counts[(v if reverse else u) + 1] += 1
+    for i in range(n):
+        counts[i + 1] += counts[i]
+    offsets = array('i', counts)
+    pos = counts[:-1]
+    targets = array('i', bytes(4 * len(edges)))
+    weights = array('f', bytes(4 * len(edges)))
+    for u, v, w in edges:
+        src, dst = (v, u) if reverse else (u, v)
+        targets[pos[src]] = dst
+        weights[pos[src]] = w
+        pos[src] += 1
+    return offsets, targets, weights
+
+
+def _dijkstra(offsets, targets, weights, source):
+    """Расстояния (м) от ``source`` до всех узлов."""
+    dist = [inf] * (len(offsets) - 1)
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        for i in range(offsets[u], offsets[u + 1]):
+            v = targets[i]
+            nd = d + weights[i]
+            if nd < dist[v]:
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+
+class RoadGraph:
+    """Направленный граф дорог в CSR-массивах; веса — метры."""
+
+    def __init__(self, lat, lng, fwd, rev, lm_from, lm_to, grid, cell_node):
+        self.lat, self.lng = lat, lng
+        self.n = len(lat)
+        self.fwd, self.rev = fwd, rev
+        # lm_from[k][v] = d(L_k, v), lm_to[k][v] = d(v, L_k)
+        self.lm_from, self.lm_to = lm_from, lm_to
+        # (lat0, lng0, rows, cols) сетки ячеек и ближайший узел каждой ячейки
+        self.grid = grid
+        self.cell_node = cell_node
+        self._index = {}
+        for v in range(self.n):
+            key = (int(lat[v] // INDEX_CELL), int(lng[v] // INDEX_CELL))
+            self._index.setdefault(key, []).append(v)
+        self.node_distance = lru_cache(maxsize=ROUTE_CACHE_SIZE)(self._astar)
+
+    @classmethod
+    def build(cls, coords, edges, landmarks=LANDMARKS, bbox=None):
+        """Граф из координат узлов и рёбер (u, v, метры) с ориентирами и сеткой."""
+        lat = array('d', (c[0] for c in coords))
+        lng = array('d', (c[1] for c in coords))
+        n = len(lat)
+        fwd = _csr(n, edges)
+        rev = _csr(n, edges, reverse=True)
+        lm_from, lm_to = [], []
+        # Ориентиры — самые удалённые друг от друга узлы (farthest point)
+        nearest = [inf] * n
+        current = max(range(n), key=lambda v: lat[v] + lng[v])
+        for _ in range(min(landmarks, n)):
+            d_from = _dijkstra(*fwd, current)
+            d_to = _dijkstra(*rev, current)
+            lm_from.append(array('f', d_from))
+            lm_to.append(array('f', d_to))
+            for v in range(n):
+                reach = min(d_from[v], d_to[v])
+                if reach < nearest[v]:
+                    nearest[v] = reach
+            current = max(
+                (v for v in range(n) if nearest[v] < inf),
+                key=nearest.__getitem__,
+            )
+        if bbox is None:
+            bbox = (min(lat), max(lat), min(lng), max(lng))
+        min_lat, max_lat, min_lng, max_lng = bbox
+        lat0, lng0 = round(min_lat / GRID), round(min_lng / GRID)
+        rows = round(max_lat / GRID) - lat0 + 1
+        cols = round(max_lng / GRID) - lng0 + 1
+        if rows * cols > MAX_CELLS:
+            raise ValueError(f"Сетка {rows}x{cols} слишком велика, ограничьте область")
+        graph = cls(lat, lng, fwd, rev, lm_from, lm_to, (lat0, lng0, rows, cols), array('i'))
+        graph.cell_node = array('i', (
+            graph.nearest_node((lat0 + r) * GRID, (lng0 + c) * GRID)[0]
+            for r in range(rows) for c in range(cols)
+        ))
+        return graph
+
+    # --- привязка точек ---
+
+    def nearest_node(self, lat, lng):
+        """(узел, км до него) или (-1, inf), если дорог ближе ``MAX_SNAP_KM`` нет."""
+        ci, cj = int(lat // INDEX_CELL), int(lng // INDEX_CELL)
+        # Меньшая сторона ячейки индекса, км: кольцо r не ближе (r - 1) ячеек
+        cell_km = INDEX_CELL * KM_PER_DEG_LAT * max(cos(radians(lat)), 0.1)
+        max_ring = ceil(MAX_SNAP_KM / cell_km) + 1
+        best, best_km = -1, inf
+        ring = 0
+        while ring <= max_ring and (ring - 1) * cell_km < best_km:
+            for i in range(ci - ring, ci + ring + 1):
+                for j in range(cj - ring, cj + ring + 1):
+                    if max(abs(i - ci), abs(j - cj)) != ring:
+                        continue
+                    for v in self._index.get((i, j), ()):
+                        km = haversine_km(lat, lng, self.lat[v], self.lng[v])
+                        if km < best_km:
+                            best, best_km = v, km
+            ring += 1
+        if best_km > MAX_SNAP_KM:
+            return -1, inf
+        return best, best_km
+
+    def cell_index(self, lat, lng):
+        lat0, lng0, rows, cols = self.grid
+        r, c = round(lat / GRID) - lat0, round(lng / GRID) - lng0
+        if 0 <= r < rows and 0 <= c < cols:
+            return r * cols + c
+        return -1
+
+    # --- поиск ---
+
+    def _astar(self, source, target):
+        """Кратчайший путь source → target, м; ``inf``, если пути нет."""
+        if source == target:
+            return 0.0
+        # Ориентиры с лучшей оценкой для этой пары
+        scored = []
+        for k in range(len(self.lm_from)):
+            f, t = self.lm_from[k], self.lm_to[k]
+            scored.append((max(f[target] - f[source], t[source] - t[target]), k))
+        scored.sort(reverse=True)
+        active = [
+            (self.lm_from[k], self.lm_to[k], self.lm_from[k][target], self.lm_to[k][target])
+            for _, k in scored[:ACTIVE_LANDMARKS]
+        ]
+
+        def h(v):
+            best = 0.0
+            for f, t, f_target, t_target in active:
+                bound = f_target - f[v]
+                if bound > best:
+                    best = bound
+                bound = t[v] - t_target
+                if bound > best:
+                    best = bound
+            return best
+
+        offsets, targets, weights = self.fwd
+        dist = {source: 0.0}
+        heap = [(h(source), 0.0, source)]
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if u == target:
+                return d
+            if d > dist[u]:
+                continue
+            for i in range(offsets[u], offsets[u + 1]):
+                v = targets[i]
+                nd = d + weights[i]
+                if nd < dist.get(v, inf):
+                    dist[v] = nd
+                    estimate = h(v)
+                    if estimate < inf:
+                        heapq.heappush(heap, (nd + estimate, nd, v))
+        return inf
+
+    def shop_table(self, lat, lng):
+        """Расстояния (м) от ячейки магазина до узла каждой ячейки сетки."""
+        cell = self.cell_index(lat, lng)
+        source = self.cell_node[cell] if cell >= 0 else -1
+        if source < 0:
+            raise ValueError(f"Точка {lat}, {lng} вне дорожной сети")
+        dist = _dijkstra(*self.fwd, source)
+        return array('f', (dist[v] if v >= 0 else inf for v in self.cell_node))
+
+    # --- файл ---
+
+    def save(self, path):
+        lat0, lng0, rows, cols = self.grid
+        with open(path, 'wb') as fh:
+            fh.write(_HEADER.pack(
+                MAGIC, FORMAT_VERSION, self.n, len(self.fwd[1]), len(self.lm_from),
+                lat0 * GRID, lng0 * GRID, rows, cols,
+            ))
+            for arr in (self.lat, self.lng, *self.fwd, *self.rev, *self.lm_from, *self.lm_to, self.cell_node):
+                arr.tofile(fh)
+
+    @classmethod
+    def load(cls, path):
+        """Читает граф из ``save``; битый или чужой файл — ``ValueError``."""
+        with open(path, 'rb') as fh:
+            try:
+                magic, version, n, m, k, lat0, lng0, rows, cols = _HEADER.unpack(fh.read(_HEADER.size))
+            except struct.error:
+                raise ValueError(f"{path}: не граф дорог")
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"{path}: не граф дорог или старый формат")
+
+            def read(typecode, count):
+                arr = array(typecode)
+                try:
+                    arr.fromfile(fh, count)
+                except EOFError:
+                    raise ValueError(f"{path}: файл графа обрезан")
+                return arr
+
+            lat, lng = read('d', n), read('d', n)
+            fwd = (read('i', n + 1), read('i', m), read('f', m))
+            rev = (read('i', n + 1), read('i', m), read('f', m))
+            lm_from = [read('f', n) for _ in range(k)]
+            lm_to = [read('f', n) for _ in range(k)]
+            cell_node = read('i', rows * cols)
+        grid = (round(lat0 / GRID), round(lng0 / GRID), rows, cols)
+        return cls(lat, lng, fwd, rev, lm_from, lm_to, grid, cell_node)
+
+
+def save_shop_tables(path, tables, cells):
+    """``tables`` — {индекс ячейки магазина: array('f') на ``cells`` ячеек}."""
+    with open(path, 'wb') as fh:
+        fh.write(_SHOPS_HEADER.pack(SHOPS_MAGIC, FORMAT_VERSION, len(tables), cells))
+        for cell, table in tables.items():
+            array('i', [cell]).tofile(fh)
+            table.tofile(fh)
+
+
+def load_shop_tables(path, cells):
+    with open(path, 'rb') as fh:
+        try:
+            magic, version, count, stored = _SHOPS_HEADER.unpack(fh.read(_SHOPS_HEADER.size))
+        except struct.error:
+            raise ValueError(f"{path}: не таблицы магазинов")
+        if magic != SHOPS_MAGIC or version != FORMAT_VERSION or stored != cells:
+            raise ValueError(f"{path}: таблицы не от этого графа")
+        tables = {}
+        try:
+            for _ in range(count):
+                key = array('i')
+                key.fromfile(fh, 1)
+                table = array('f')
+                table.fromfile(fh, cells)
+                tables[key[0]] = table
+        except EOFError:
+            raise ValueError(f"{path}: файл таблиц обрезан")
+    return tables
+
+
+def _open_osm(path):
+    path = str(path)
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def parse_osm(path, bbox=None):
+    """(координаты, рёбра) дорог из OSM XML; остаётся крупнейшая связная часть."""
+    nodes = {}
+    ways = []
+    with _open_osm(path) as fh:
+        for _, elem in ET.iterparse(fh):
+            if elem.tag == 'node':
+                lat, lng = float(elem.get('lat')), float(elem.get('lon'))
+                if bbox is None or (bbox[0] <= lat <= bbox[1] and bbox[2] <= lng <= bbox[3]):
+                    nodes[int(elem.get('id'))] = (lat, lng)
+            elif elem.tag == 'way':
+                tags = {t.get('k'): t.get('v') for t in elem.iter('tag')}
+                if tags.get('highway') in ROAD_TYPES and tags.get('access') not in NO_ACCESS:
+                    oneway = tags.get('oneway')
+                    if oneway in ONEWAY_YES or tags.get('junction') == 'roundabout':
+                        direction = 1
+                    elif oneway == '-1':
+                        direction = -1
+                    else:
+                        direction = 0
+                    ways.append(([int(nd.get('ref')) for nd in elem.iter('nd')], direction))
+            if elem.tag in ('node', 'way', 'relation'):
+                elem.clear()
+
+    ids = {}
+    coords = []
+    edges = []
+
+    def node_id(osm_id):
+        if osm_id not in ids:
+            ids[osm_id] = len(coords)
+            coords.append(nodes[osm_id])
+        return ids[osm_id]
+
+    for refs, direction in ways:
+        refs = [ref for ref in refs if ref in nodes]
+        for a, b in zip(refs, refs[1:]):
+            u, v = node_id(a), node_id(b)
+            meters = haversine_km(*coords[u], *coords[v]) * 1000
+            if direction >= 0:
+                edges.append((u, v, meters))
+            if direction <= 0:
+                edges.append((v, u, meters))
+    return _largest_component(coords, edges)
+
+
+def _largest_component(coords, edges):
+    """Оставляет крупнейшую слабо связную компоненту и перенумеровывает узлы."""
+    n = len(coords)
+    adjacent = [[] for _ in range(n)]
+    for u, v, _ in edges:
+        adjacent[u].append(v)
+        adjacent[v].append(u)
+    component = [-1] * n
+    sizes = []
+    for start in range(n):
+        if component[start] >= 0:
+            continue
+        label = len(sizes)
+        component[start] = label
+        stack, size = [start], 0
+        while stack:
+            u = stack.pop()
+            size += 1
+            for v in adjacent[u]:
+                if component[v] < 0:
+                    component[v] = label
+                    stack.append(v)
+        sizes.append(size)
+    if not sizes:
+        return [], []
+    keep = max(range(len(sizes)), key=sizes.__getitem__)
+    renumber = {}
+    kept = []
+    for v in range(n):
+        if component[v] == keep:
+            renumber[v] = len(kept)
+            kept.append(coords[v])
+    kept_edges = [(renumber[u], renumber[v], w) for u, v, w in edges if component[u] == keep]
+    return kept, kept_edges
+
+
+class Router:
+    """Граф и таблицы магазинов; ``distance_km`` — основной вход."""
+
+    def __init__(self, graph: RoadGraph, shop_tables=None):
+        self.graph = graph
+        self.shop_tables = shop_tables or {}
+
+    def route_km(self, lat1, lng1, lat2, lng2):
+        """Расстояние по дорогам, км, или ``None``, если маршрута нет."""
+        graph = self.graph
+        cell_a = graph.cell_index(lat1, lng1)
+        table = self.shop_tables.get(cell_a)
+        if table is not None:
+            cell_b = graph.cell_index(lat2, lng2)
+            if cell_b >= 0 and table[cell_b] < inf:
+                node_a = graph.cell_node[cell_a]
+                node_b = graph.cell_node[cell_b]
+                return (
+                    table[cell_b] / 1000
+                    + haversine_km(lat1, lng1, graph.lat[node_a], graph.lng[node_a])
+                    + haversine_km(lat2, lng2, graph.lat[node_b], graph.lng[node_b])
+                )
+        node_a, access_a = graph.nearest_node(lat1, lng1)
+        node_b, access_b = graph.nearest_node(lat2, lng2)
+        if node_a < 0 or node_b < 0:
+            return None
+        meters = graph.node_distance(node_a, node_b)
+        if meters == inf:
+            return None
+        return meters / 1000 + access_a + access_b
+
+
+_router = None
+_router_lock = threading.Lock()
+_router_loaded = False
+
+
+def shop_tables_path(graph_path) -> Path:
+    return Path(f"{graph_path}.shops")
+
+
+def load_router():
+    """Загружает граф из ``ROAD_GRAPH_PATH`` (один раз); ``None``, если его нет."""
+    global _router, _router_loaded
+    if _router_loaded:
+        return _router
+    with _router_lock:
+        if _router_loaded:
+            return _router
+        path = getattr(settings, 'ROAD_GRAPH_PATH', None)
+        if path:
+            try:
+                graph = RoadGraph.load(path)
+                tables = {}
+                if shop_tables_path(path).exists():
+                    tables = load_shop_tables(shop_tables_path(path), len(graph.cell_node))
+                _router = Router(graph, tables)
+                logger.info(f"Road graph: {graph.n} nodes, {len(tables)} shop tables")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Road graph {path} not loaded, using straight-line distance: {e}")
+        _router_loaded = True
+    return _router
+
+
+def road_distance_km(lat1, lng1, lat2, lng2) -> float:
+    """Расстояние по дорогам, км; по прямой, если граф недоступен."""
+    router = load_router()
+    if router is not None:
+        km = router.route_km(lat1, lng1, lat2, lng2)
+        if km is not None:
+            return km
+    return haversine_km(lat1, lng1, lat2, lng2)
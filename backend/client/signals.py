@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, post_delete
+
+from .models import CatalogVersion, Category, Shop, Product, Service, CourierOrder, CourierOrderEvent
+
+
+def bump_catalog_version(sender, **kwargs):
+    CatalogVersion.bump()
+
+
+for model in (Category, Shop, Product, Service):
+    post_save.connect(bump_catalog_version, sender=model, dispatch_uid=f"catalog_{model.__name__}_save")
+    post_delete.connect(bump_catalog_version, sender=model, dispatch_uid=f"catalog_{model.__name__}_delete")
+
+
+def record_courier_order_created(sender, instance, created, **kwargs):
+    if created:
+        CourierOrderEvent.objects.create(
+            order=instance, status=instance.status, version=instance.version,
+            created_at=instance.created_at
+        )
+
+
+post_save.connect(record_courier_order_created, sender=CourierOrder, dispatch_uid="courier_order_created")
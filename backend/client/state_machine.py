@@ -0,0 +1,71 @@
+"""Конечный автомат статусов CourierOrder.
+
+Переход применяется одним compare-and-swap UPDATE по ``status``/``version``
+без ``select_for_update``: из двух курьеров, одновременно нажавших
+«Взять заказ», строку обновит только один. Каждый успешный переход
+дописывается в ``CourierOrderEvent`` — по нему считается время этапов.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CourierOrder, CourierOrderEvent
+
+TRANSITIONS = {
+    'new': ('assigned',),
+    'assigned': ('to_a',),
+    'to_a': ('to_b',),
+    'to_b': ('arrived',),
+    'arrived': ('completed',),
+    'completed': (),
+}
+
+
+class TransitionError(Exception):
+    pass
+
+
+def can_transition(from_status: str, to_status: str) -> bool:
+    return to_status in TRANSITIONS.get(from_status, ())
+
+
+def sources(to_status: str) -> list:
+    """Статусы, из которых разрешён переход в ``to_status``."""
+    return [src for src, targets in TRANSITIONS.items() if to_status in targets]
+
+
+def transition(order_id, to_status, *, from_status=None, version=None, filters=None, **fields) -> bool:
+    """Переводит заказ в ``to_status``.
+
+    ``from_status``/``version`` — ожидаемое текущее состояние; если не
+    заданы, подходит любой допустимый исходный статус. ``filters`` —
+    дополнительные условия (например, владелец заказа), ``fields`` —
+    поля, записываемые вместе со статусом. Возвращает ``False``, если
+    заказ уже изменился и CAS не сработал.
+    """
+    if from_status is not None:
+        if not can_transition(from_status, to_status):
+            raise TransitionError(f"{from_status} -> {to_status} is not allowed")
+        allowed = [from_status]
+    else:
+        allowed = sources(to_status)
+        if not allowed:
+            raise TransitionError(f"Unknown target status: {to_status}")
+
+    qs = CourierOrder.objects.filter(id=order_id, status__in=allowed, **(filters or {}))
+    if version is not None:
+        qs = qs.filter(version=version)
+
+    now = timezone.now()
+    with transaction.atomic():
+        updated = qs.update(status=to_status, version=F('version') + 1, updated_at=now, **fields)
+        if not updated:
+            return False
+        if version is not None:
+            new_version = version + 1
+        else:
+            new_version = CourierOrder.objects.filter(id=order_id).values_list('version', flat=True).get()
+        CourierOrderEvent.objects.create(
+            order_id=order_id, status=to_status, version=new_version, created_at=now
+        )
+    return True
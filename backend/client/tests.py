@@ -1,3 +1,168 @@
-from django.test import TestCase
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta, timezone
+from math import inf
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from .batching import DROP, MAX_BATCH_SIZE, MAX_DETOUR, MIN_DETOUR_KM, PICKUP, Leg, plan_batches
+from .geo import haversine_km
+from .routing import RoadGraph, _dijkstra
+from .tracks import COORD_SCALE, MAX_GAP_S, decode_track, downsample, encode_track
+
+
+def _grid_graph(size=6, seed=7):
+    """Решётка ``size`` x ``size`` ~300 м с разными весами туда и обратно."""
+    rng = random.Random(seed)
+    coords = [(42.87 + i * 0.003, 74.59 + j * 0.003) for i in range(size) for j in range(size)]
+    edges = []
+    for i in range(size):
+        for j in range(size):
+            u = i * size + j
+            for v in ((u + 1) if j + 1 < size else None, (u + size) if i + 1 < size else None):
+                if v is None:
+                    continue
+                meters = rng.uniform(250, 400)
+                edges.append((u, v, meters))
+                edges.append((v, u, meters * rng.uniform(1.0, 1.5)))
+    return coords, edges
+
+
+class RoadGraphTests(SimpleTestCase):
+    def setUp(self):
+        coords, edges = _grid_graph()
+        self.graph = RoadGraph.build(coords, edges, landmarks=4)
+
+    def test_alt_matches_dijkstra(self):
+        graph = self.graph
+        for source in range(graph.n):
+            expected = _dijkstra(*graph.fwd, source)
+            for target in range(graph.n):
+                self.assertAlmostEqual(graph.node_distance(source, target), expected[target], delta=0.01)
+
+    def test_direction_matters(self):
+        forward = _dijkstra(*self.graph.fwd, 0)[self.graph.n - 1]
+        backward = _dijkstra(*self.graph.fwd, self.graph.n - 1)[0]
+        self.assertNotAlmostEqual(forward, backward, delta=1.0)
+
+    def test_save_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'graph.bin')
+            self.graph.save(path)
+            loaded = RoadGraph.load(path)
+            self.assertEqual(loaded.n, self.graph.n)
+            self.assertEqual(loaded.grid, self.graph.grid)
+            self.assertEqual(loaded.node_distance(0, loaded.n - 1), self.graph.node_distance(0, self.graph.n - 1))
+
+            with open(path, 'r+b') as fh:
+                fh.truncate(os.path.getsize(path) // 2)
+            with self.assertRaises(ValueError):
+                RoadGraph.load(path)
+            with open(path, 'wb') as fh:
+                fh.write(b'RG')
+            with self.assertRaises(ValueError):
+                RoadGraph.load(path)
+
+    def test_nearest_node_and_snap_limit(self):
+        node, km = self.graph.nearest_node(42.8701, 74.5901)
+        self.assertEqual(node, 0)
+        self.assertLess(km, 0.05)
+        self.assertEqual(self.graph.nearest_node(43.5, 75.5), (-1, inf))
+
+
+def _leg(leg_id, a, b, minute=0):
+    return Leg(leg_id, a, b, datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=minute))
+
+
+class PlanBatchesTests(SimpleTestCase):
+    SHOP = (42.870, 74.590)
+
+    def assertWithinDetour(self, bundle):
+        offsets, picked = [0.0], {}
+        points = [leg.a if kind == PICKUP else leg.b for kind, leg in bundle.stops]
+        for p, q in zip(points, points[1:]):
+            offsets.append(offsets[-1] + haversine_km(*p, *q))
+        for i, (kind, leg) in enumerate(bundle.stops):
+            if kind == PICKUP:
+                picked[leg.id] = offsets[i]
+                continue
+            direct = haversine_km(*leg.a, *leg.b)
+            self.assertLessEqual(offsets[i] - picked[leg.id], direct + max(direct * MAX_DETOUR, MIN_DETOUR_KM) + 1e-9)
+        self.assertAlmostEqual(bundle.cost, offsets[-1])
+
+    def test_same_direction_is_bundled(self):
+        legs = [
+            _leg(1, self.SHOP, (42.900, 74.600)),
+            _leg(2, self.SHOP, (42.905, 74.602), minute=1),
+        ]
+        bundles = plan_batches(legs, dist=haversine_km)
+        self.assertEqual(len(bundles), 1)
+        self.assertEqual({leg.id for leg in bundles[0].legs}, {1, 2})
+        self.assertWithinDetour(bundles[0])
+        self.assertLess(bundles[0].cost, sum(haversine_km(*leg.a, *leg.b) for leg in legs))
+
+    def test_opposite_direction_exceeds_detour(self):
+        legs = [
+            _leg(1, self.SHOP, (42.900, 74.590)),
+            _leg(2, self.SHOP, (42.840, 74.590), minute=1),
+        ]
+        bundles = plan_batches(legs, dist=haversine_km)
+        self.assertEqual([[leg.id for leg in bundle.legs] for bundle in bundles], [[1], [2]])
+
+    def test_far_pickups_are_not_bundled(self):
+        legs = [
+            _leg(1, self.SHOP, (42.900, 74.600)),
+            _leg(2, (42.870, 74.620), (42.900, 74.601), minute=1),
+        ]
+        self.assertEqual(len(plan_batches(legs, dist=haversine_km)), 2)
+
+    def test_batch_size_limit(self):
+        legs = [_leg(i, self.SHOP, (42.900 + i * 0.001, 74.600), minute=i) for i in range(MAX_BATCH_SIZE + 1)]
+        bundles = plan_batches(legs, dist=haversine_km)
+        self.assertEqual(sorted(len(bundle.legs) for bundle in bundles), [1, MAX_BATCH_SIZE])
+        for bundle in bundles:
+            self.assertWithinDetour(bundle)
+            for leg in bundle.legs:
+                kinds = [kind for kind, stop_leg in bundle.stops if stop_leg is leg]
+                self.assertEqual(kinds, [PICKUP, DROP])
+
+
+class TrackEncodingTests(SimpleTestCase):
+    def test_round_trip(self):
+        rng = random.Random(3)
+        points, ts, lat, lng = [], 1_760_000_000, 42.87654, 74.61234
+        for _ in range(200):
+            ts += rng.randint(1, 90)
+            lat += rng.uniform(-0.002, 0.002)
+            lng += rng.uniform(-0.002, 0.002)
+            points.append((ts, lat, lng))
+        decoded = decode_track(encode_track(points))
+        self.assertEqual(len(decoded), len(points))
+        for (ts1, lat1, lng1), (ts2, lat2, lng2) in zip(points, decoded):
+            self.assertEqual(ts1, ts2)
+            self.assertLessEqual(abs(lat1 - lat2), 0.5 / COORD_SCALE + 1e-12)
+            self.assertLessEqual(abs(lng1 - lng2), 0.5 / COORD_SCALE + 1e-12)
+
+    def test_negative_and_large_values(self):
+        points = [(0, -33.86785, -151.20732), (2**40, 89.99999, 179.99999), (1, 0.0, 0.0)]
+        self.assertEqual(decode_track(encode_track(points)), points)
+
+    def test_empty(self):
+        self.assertEqual(encode_track([]), b'')
+        self.assertEqual(decode_track(b''), [])
+
+    def test_small_deltas_are_compact(self):
+        points = [(1_760_000_000 + i * 5, 42.87 + i * 0.0002, 74.59) for i in range(100)]
+        data = encode_track(points)
+        # Первая точка целиком, дальше по байту на каждую разность
+        self.assertLess(len(data), 20 + 3 * len(points))
+
+    def test_downsample_keeps_moves_and_gaps(self):
+        still = [(t, 42.87, 74.59) for t in range(0, 50, 5)]
+        self.assertEqual(downsample(still), still[:1])
+        moved = still + [(55, 42.871, 74.59)]
+        self.assertEqual(downsample(moved), [still[0], moved[-1]])
+        late = still + [(MAX_GAP_S + 1, 42.87, 74.59)]
+        self.assertEqual(downsample(late), [still[0], late[-1]])
+        self.assertEqual(downsample(still, last=(-1, 42.87, 74.59)), [])
@@ -0,0 +1,106 @@
+"""Хранение треков курьеров: прореживание и дельта-кодирование.
+
+Бот получает live-location каждые несколько секунд и копит точки в
+памяти (``bot/services/locations.py``). В БД раз в ``FLUSH_INTERVAL``
+секунд уходит одна строка ``CourierTrack`` на курьера. Точки в ней
+прорежены (``downsample``: только сдвиг на ``MIN_MOVE_M`` или
+пауза ``MAX_GAP_S``) и записаны разностями с предыдущей точкой — секунды
+и 1e-5° (~1 м) — в zigzag-varint, обычно 3-5 байт на точку вместо 24.
+"""
+from math import inf
+
+from .geo import haversine_km
+from .models import CourierTrack
+
+MIN_MOVE_M = 25.0
+MAX_GAP_S = 60.0
+# Единица координат в треке, °
+COORD_SCALE = 100_000
+
+
+def downsample(points, last=None, min_move_m=MIN_MOVE_M, max_gap_s=MAX_GAP_S):
+    """Точки (ts, lat, lng), сдвинувшиеся от предыдущей оставленной.
+
+    ``last`` — последняя уже сохранённая точка, от неё продолжается отбор.
+    """
+    kept = []
+    for point in points:
+        if last is not None:
+            moved_m = haversine_km(last[1], last[2], point[1], point[2]) * 1000
+            if moved_m < min_move_m and point[0] - last[0] < max_gap_s:
+                continue
+        kept.append(point)
+        last = point
+    return kept
+
+
+def _write_varint(out: bytearray, value: int):
+    value = (value << 1) ^ (value >> 63)  # zigzag: малые по модулю -> малые
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varints(data: bytes):
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        yield (value >> 1) ^ -(value & 1)
+        value = shift = 0
+
+
+def encode_track(points) -> bytes:
+    """(ts, lat, lng) -> байты: первая точка целиком, дальше разности."""
+    out = bytearray()
+    prev = (0, 0, 0)
+    for ts, lat, lng in points:
+        current = (int(ts), round(lat * COORD_SCALE), round(lng * COORD_SCALE))
+        for value, before in zip(current, prev):
+            _write_varint(out, value - before)
+        prev = current
+    return bytes(out)
+
+
+def decode_track(data: bytes):
+    values = list(_read_varints(data))
+    points = []
+    ts = lat = lng = 0
+    for i in range(0, len(values) - 2, 3):
+        ts += values[i]
+        lat += values[i + 1]
+        lng += values[i + 2]
+        points.append((ts, lat / COORD_SCALE, lng / COORD_SCALE))
+    return points
+
+
+def last_point(courier_id):
+    """Последняя сохранённая точка курьера (ts, lat, lng) или ``None``."""
+    data = (
+        CourierTrack.objects.filter(courier_id=courier_id)
+        .order_by('-ended_at').values_list('data', flat=True).first()
+    )
+    if not data:
+        return None
+    points = decode_track(bytes(data))
+    return points[-1] if points else None
+
+
+def track_points(courier_id, since=None, until=None):
+    """Все сохранённые точки курьера за период, по времени."""
+    qs = CourierTrack.objects.filter(courier_id=courier_id)
+    if since is not None:
+        qs = qs.filter(ended_at__gte=since)
+    if until is not None:
+        qs = qs.filter(started_at__lte=until)
+    low = since.timestamp() if since else -inf
+    high = until.timestamp() if until else inf
+    return [
+        point
+        for data in qs.order_by('started_at').values_list('data', flat=True).iterator()
+        for point in decode_track(bytes(data))
+        if low <= point[0] <= high
+    ]
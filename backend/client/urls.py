@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'catalog_api'
+
+urlpatterns = [
+    path('categories/', views.categories, name='categories'),
+    path('shops/', views.shops, name='shops'),
+    path('shops/<int:shop_id>/products/', views.shop_products, name='shop_products'),
+    path('shops/<int:shop_id>/services/', views.shop_services, name='shop_services'),
+]
@@ -1,3 +1,132 @@
-from django.shortcuts import render
+"""Публичное read-only API каталога для мини-приложения и партнёров.
 
-# Create your views here.
+Все ответы зависят только от данных каталога, поэтому ETag — это версия
+каталога плюс путь запроса: повторный запрос с ``If-None-Match`` получает
+``304`` без обращения к таблицам. Тела ответов кэшируются по тому же ключу.
+Списки товаров и услуг листаются по ключу (``?after=<id>``), а не OFFSET.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from .geo import bounding_box, haversine_km
+from .models import CatalogVersion, Category, Product, Service, Shop
+
+CACHE_TIMEOUT = 60 * 60
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+MAX_RADIUS_KM = 50
+
+
+def _cache_key(request):
+    digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"catalog-api:{CatalogVersion.current()}:{digest}"
+
+
+def _etag(request, *args, **kwargs):
+    key = getattr(request, '_catalog_key', None) or _cache_key(request)
+    request._catalog_key = key
+    return key.split(':', 1)[1]
+
+
+def catalog_view(builder):
+    """GET + ETag/304 + кэш тела ответа по версии каталога."""
+    @require_GET
+    @condition(etag_func=_etag)
+    def view(request, *args, **kwargs):
+        key = getattr(request, '_catalog_key', None) or _cache_key(request)
+        payload = cache.get(key)
+        if payload is None:
+            try:
+                payload = builder(request, *args, **kwargs)
+            except ValueError as e:
+                return HttpResponseBadRequest(str(e))
+            cache.set(key, payload, CACHE_TIMEOUT)
+        response = JsonResponse(payload, json_dumps_params={'ensure_ascii': False})
+        response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        return response
+    view.__name__ = builder.__name__
+    return view
+
+
+def _int_param(request, name, default=None, maximum=None):
+    raw = request.GET.get(name)
+    if raw in (None, ''):
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if value < 0:
+        raise ValueError(f"{name} must be positive")
+    return min(value, maximum) if maximum else value
+
+
+def _float_param(request, name):
+    raw = request.GET.get(name)
+    if raw in (None, ''):
+        return None
+    try:
+        return float(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+
+
+def _page(qs, request, fields):
+    """Страница по ключу id: ``?after=<последний id>&limit=N``."""
+    after = _int_param(request, 'after', 0)
+    limit = _int_param(request, 'limit', DEFAULT_LIMIT, MAX_LIMIT) or DEFAULT_LIMIT
+    rows = list(qs.filter(id__gt=after).order_by('id').values(*fields)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'results': rows,
+        'next_after': rows[-1]['id'] if has_more else None,
+    }
+
+
+@catalog_view
+def categories(request):
+    return {'results': list(Category.objects.values('id', 'name', 'description'))}
+
+
+@catalog_view
+def shops(request):
+    qs = Shop.objects.all()
+    category = _int_param(request, 'category')
+    if category is not None:
+        qs = qs.filter(category_id=category)
+
+    lat, lng = _float_param(request, 'lat'), _float_param(request, 'lng')
+    fields = ('id', 'name', 'category_id', 'address', 'description', 'point_a_lat', 'point_a_lng')
+    if lat is None or lng is None:
+        return _page(qs, request, fields)
+
+    # Гео-фильтр: грубый отбор прямоугольником в SQL, точный — гаверсинусом
+    radius = min(_float_param(request, 'radius_km') or 5, MAX_RADIUS_KM)
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius)
+    rows = []
+    for row in qs.filter(
+        point_a_lat__range=(min_lat, max_lat), point_a_lng__range=(min_lng, max_lng)
+    ).values(*fields):
+        distance = haversine_km(lat, lng, row['point_a_lat'], row['point_a_lng'])
+        if distance <= radius:
+            row['distance_km'] = round(distance, 2)
+            rows.append(row)
+    rows.sort(key=lambda r: r['distance_km'])
+    return {'results': rows, 'next_after': None}
+
+
+def _shop_items(model):
+    def build(request, shop_id):
+        if not Shop.objects.filter(id=shop_id).exists():
+            raise Http404
+        return _page(model.objects.filter(shop_id=shop_id), request, ('id', 'name', 'price', 'description'))
+    build.__name__ = f"shop_{model._meta.model_name}s"
+    return catalog_view(build)
+
+
+shop_products = _shop_items(Product)
+shop_services = _shop_items(Service)
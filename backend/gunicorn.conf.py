@@ -0,0 +1,24 @@
+"""Продакшн-профиль: gunicorn управляет uvicorn-воркерами (ASGI).
+
+Запуск:  gunicorn -c gunicorn.conf.py backend.asgi:application
+Плавный перезапуск после деплоя: ``kill -HUP <pid master>`` — новые
+воркеры поднимаются до остановки старых, активные запросы дорабатывают.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8010')}"
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.getenv('WEB_CONCURRENCY') or multiprocessing.cpu_count() * 2 + 1)
+
+# Сколько ждать завершения активных запросов при перезапуске/остановке
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', '30'))
+timeout = int(os.getenv('WORKER_TIMEOUT', '60'))
+keepalive = 5
+
+# Периодически перезапускаем воркеры, чтобы не копить утечки памяти
+max_requests = int(os.getenv('MAX_REQUESTS', '2000'))
+max_requests_jitter = 200
+
+accesslog = os.getenv('ACCESS_LOG', '-') or None
+errorlog = '-'
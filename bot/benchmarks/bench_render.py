@@ -0,0 +1,69 @@
+"""Микробенчмарк рендера корзины и объявления.
+
+Запуск из каталога bot/:  python benchmarks/bench_render.py
+Сравнивает старую сборку строк через ``+=`` с шаблонами из ``render``.
+"""
+import sys
+import timeit
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from render import render_cart, render_listing  # noqa: E402
+
+LINES = [
+    (SimpleNamespace(name=f"Товар <{i}> & Co", price=100 + i), i % 4 + 1)
+    for i in range(20)
+]
+TOTAL = sum(item.price * qty for item, qty in LINES)
+LISTING = {
+    'status': "💰 Продажа",
+    'name': "Велосипед <Stels>",
+    'desc': "Состояние отличное & комплект полный\n" * 10,
+    'price': "25000",
+}
+
+
+def cart_concat():
+    text = "🛒 <b>Ваша корзина:</b>\n\n"
+    for item, qty in LINES:
+        text += f"• {item.name} — <b>{item.price} KGS</b> x{qty} = <b>{item.price * qty} KGS</b>\n"
+    text += f"\n💰 <b>Итого: {TOTAL} KGS</b>\n"
+    return text
+
+
+def cart_template():
+    return render_cart(LINES, TOTAL)
+
+
+def listing_concat():
+    phone_text = f"📱 <b>Телефон:</b> {'+996700000000'}"
+    return (
+        f"<b>{LISTING['status']}</b>\n"
+        f"🏷️ <b>{LISTING['name']}</b> \n\n"
+        f"{LISTING['desc']}\n\n"
+        f"💵 <b>Цена:</b> {LISTING['price']} KGS\n"
+        f"{phone_text}\n"
+        f"✉️ <a href='tg://user?id={123456789}'>Связаться</a>\n"
+        f"📢 <a href='https://t.me/tez4917_bot'>Разместить объявление</a>"
+    )
+
+
+def listing_template():
+    return render_listing(LISTING, '+996700000000', 123456789, footer=True)
+
+
+def bench(fn, number=20000):
+    best = min(timeit.repeat(fn, number=number, repeat=5))
+    return best / number * 1e6
+
+
+if __name__ == '__main__':
+    for name, fn in [
+        ('cart (+=, без экранирования)', cart_concat),
+        ('cart (Template)', cart_template),
+        ('listing (f-string, без экранирования)', listing_concat),
+        ('listing (Template)', listing_template),
+    ]:
+        print(f"{name:40s} {bench(fn):8.2f} мкс")
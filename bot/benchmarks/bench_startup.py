@@ -0,0 +1,65 @@
+"""Время холодного старта бота до готовности к polling.
+
+Запуск из каталога bot/:  python benchmarks/bench_startup.py [-n 5]
+Нужны те же переменные окружения, что и боту (хватит BOT_TOKEN, сеть и БД
+не используются). Каждый замер — отдельный процесс, который импортирует
+``main`` и собирает диспетчер (``setup_dispatcher``); сравниваются
+профили ``backend.settings`` и ``backend.settings_bot``. Для последнего
+прогона печатаются самые тяжёлые модули по ``-X importtime``.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BOT_DIR = Path(__file__).resolve().parent.parent
+PROFILES = ('backend.settings', 'backend.settings_bot')
+READY = (
+    "import main; from conf import dp; main.setup_dispatcher(dp); "
+    "dp.resolve_used_update_types()"
+)
+
+
+def run(settings, importtime=False):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings)
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', READY]
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=BOT_DIR, env=env, capture_output=True, text=True, check=True)
+    return time.perf_counter() - started, proc.stderr
+
+
+def heaviest(stderr, top=10):
+    """Модули верхнего уровня с наибольшим кумулятивным временем импорта."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # У вложенных импортов имя сдвинуто дополнительными пробелами
+        if cumulative.strip().isdigit() and not name.startswith('  '):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=5, help="Прогонов на профиль")
+    args = parser.parse_args()
+
+    for settings in PROFILES:
+        times = [run(settings)[0] for _ in range(args.n)]
+        _, stderr = run(settings, importtime=True)
+        modules = sum(1 for line in stderr.splitlines() if line.startswith('import time:')) - 1
+        print(
+            f"{settings:24} median {statistics.median(times) * 1000:7.1f} ms  "
+            f"min {min(times) * 1000:7.1f} ms  modules {modules}"
+        )
+        for cumulative, name in heaviest(stderr):
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
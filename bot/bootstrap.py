@@ -0,0 +1,28 @@
+"""Единственная точка настройки Django в процессах бота.
+
+Любой модуль бота, которому нужен ORM, первым делом делает
+``import bootstrap``: путь к backend/ добавляется в ``sys.path`` и
+``django.setup()`` вызывается ровно один раз. По умолчанию берётся
+облегчённый профиль ``backend.settings_bot`` — без админки, jazzmin,
+статики и шаблонов, которые боту не нужны, но заметно удлиняют старт.
+"""
+import os
+import sys
+from pathlib import Path
+
+_BOT_DIR = Path(__file__).resolve().parent
+
+# В репозитории backend/ лежит рядом с bot/, в образе — внутри /app
+for _backend in (_BOT_DIR.parent / 'backend', _BOT_DIR / 'backend'):
+    if (_backend / 'manage.py').exists():
+        if str(_backend) not in sys.path:
+            sys.path.insert(0, str(_backend))
+        break
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings_bot')
+
+import django  # noqa: E402
+from django.apps import apps  # noqa: E402
+
+if not apps.ready:
+    django.setup()
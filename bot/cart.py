@@ -0,0 +1,117 @@
+"""Корзина покупателя в /stores.
+
+В FSM корзина хранится одним компактным значением: магазин, сумма и
+список строк ``[вид, id, кол-во, цена, название]``. Ключи — элементы
+списка, а не словаря, поэтому id остаются ``int`` после сериализации
+любым хранилищем. Цена и название запоминаются при первом ``➕``, сумма
+пересчитывается на каждом добавлении, так что показ корзины не ходит в БД.
+При оформлении заказа строки сверяются с каталогом одним ``in_bulk`` на
+вид позиции — по id из корзины, а не по всему магазину.
+
+``revalidate`` и ``create_order`` синхронные (ORM), вызывать через
+``sync_to_async``.
+"""
+from typing import NamedTuple
+
+import bootstrap  # noqa: F401
+from django.db import transaction
+
+from client.models import Order, OrderItem, Product, Service
+
+# chosen_type из callback_data -> (код в корзине, модель, поле OrderItem)
+KINDS = {
+    'products': ('p', Product, 'product'),
+    'services': ('s', Service, 'service'),
+}
+_BY_CODE = {code: (chosen, model, fk) for chosen, (code, model, fk) in KINDS.items()}
+
+FSM_KEY = 'cart'
+
+
+class CartLine(NamedTuple):
+    kind: str
+    id: int
+    qty: int
+    price: int
+    name: str
+
+
+class Cart:
+    __slots__ = ('shop_id', 'total', '_lines')
+
+    def __init__(self, shop_id, lines=(), total=None):
+        self.shop_id = shop_id
+        # (код вида, id) -> CartLine, порядок добавления сохраняется
+        self._lines = {(line.kind, line.id): line for line in lines}
+        self.total = sum(l.price * l.qty for l in self._lines.values()) if total is None else total
+
+    @classmethod
+    def load(cls, data: dict, shop_id=None) -> 'Cart':
+        """Корзина из данных FSM; корзина другого магазина не переносится."""
+        raw = data.get(FSM_KEY)
+        shop_id = shop_id if shop_id is not None else data.get('shop_id')
+        if not raw or raw[0] != shop_id:
+            return cls(shop_id)
+        _, total, lines = raw
+        return cls(shop_id, (CartLine(*line) for line in lines), total)
+
+    def dump(self) -> list:
+        return [self.shop_id, self.total, [list(line) for line in self._lines.values()]]
+
+    def __bool__(self):
+        return bool(self._lines)
+
+    def __len__(self):
+        return len(self._lines)
+
+    def add(self, chosen: str, item, qty: int = 1):
+        """Добавляет ``qty`` штук; цена фиксируется при первом добавлении."""
+        key = (KINDS[chosen][0], item.id)
+        line = self._lines.get(key)
+        if line is None:
+            line = CartLine(key[0], item.id, 0, item.price, item.name)
+        self._lines[key] = line._replace(qty=line.qty + qty)
+        self.total += line.price * qty
+
+    def quantities(self, chosen: str) -> dict:
+        """{id: кол-во} позиций одного вида — для бейджей на кнопках."""
+        code = KINDS[chosen][0]
+        return {line.id: line.qty for line in self._lines.values() if line.kind == code}
+
+    def lines(self):
+        """Пары (строка, кол-во) в формате ``render.render_cart``."""
+        return [(line, line.qty) for line in self._lines.values()]
+
+    def revalidate(self) -> bool:
+        """Сверяет строки с каталогом; ``True``, если что-то изменилось.
+
+        Пропавшие позиции удаляются, изменившиеся цены и названия
+        обновляются. По одному запросу на вид позиции в корзине.
+        """
+        changed = False
+        for code in {kind for kind, _ in self._lines}:
+            _, model, _ = _BY_CODE[code]
+            ids = [item_id for kind, item_id in self._lines if kind == code]
+            current = model.objects.filter(shop_id=self.shop_id).only('name', 'price').in_bulk(ids)
+            for item_id in ids:
+                line = self._lines[(code, item_id)]
+                item = current.get(item_id)
+                if item is None:
+                    del self._lines[(code, item_id)]
+                    changed = True
+                elif (item.price, item.name) != (line.price, line.name):
+                    self._lines[(code, item_id)] = line._replace(price=item.price, name=item.name)
+                    changed = True
+        if changed:
+            self.total = sum(l.price * l.qty for l in self._lines.values())
+        return changed
+
+    def create_order(self, client) -> Order:
+        """Заказ и его позиции: две вставки в одной транзакции."""
+        with transaction.atomic():
+            order = Order.objects.create(shop_id=self.shop_id, client=client, total_price=self.total)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, quantity=line.qty, **{f"{_BY_CODE[line.kind][2]}_id": line.id})
+                for line in self._lines.values()
+            ])
+        return order
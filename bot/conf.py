@@ -1,4 +1,5 @@
 from aiogram import Bot, Dispatcher, types
+from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 import os
 
@@ -11,5 +12,30 @@ token = os.getenv('BOT_TOKEN')
 if not token:
     raise ValueError("BOT_TOKEN not set in environment variables")
 
+# Уведомления владельцам магазинов: 0 секунд / 1 заказ = отправлять сразу
+ORDER_DIGEST_INTERVAL = float(os.getenv('ORDER_DIGEST_INTERVAL', '0'))
+ORDER_DIGEST_SIZE = int(os.getenv('ORDER_DIGEST_SIZE', '1'))
+
+# Группа курьеров, куда публикуются заказы на доставку
+GROUP_CHAT_ID = '-1002265233281'
+# Окно объединения курьерских заказов в пакеты, сек; 0 = публиковать сразу
+DELIVERY_BATCH_WINDOW = float(os.getenv('DELIVERY_BATCH_WINDOW', '0'))
+
+# Число процессов-воркеров (см. sharding.py); 1 = обычный polling в одном процессе
+BOT_WORKERS = int(os.getenv('BOT_WORKERS') or 1)
+# Файл-флаг готовности (создаётся после прогрева), для healthcheck
+READY_FILE = os.getenv('BOT_READY_FILE')
+# Сколько апдейтов разных пользователей обрабатывать одновременно
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY') or 100)
+# Общее FSM-хранилище для воркеров; без него состояние живёт в памяти процесса
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    from aiogram.fsm.storage.redis import RedisStorage
+
+    storage = RedisStorage.from_url(REDIS_URL)
+else:
+    storage = MemoryStorage()
+
 bot = Bot(token=token)
-dp = Dispatcher(bot=bot)
\ No newline at end of file
+dp = Dispatcher(bot=bot, storage=storage)
@@ -6,24 +6,12 @@ from aiogram.types import (
     InlineKeyboardMarkup, InlineKeyboardButton,
     CallbackQuery, ReplyKeyboardMarkup, KeyboardButton
 )
-import os
-import sys
 from asgiref.sync import sync_to_async
 import math
 from aiogram.types import Message
 
-
-# Настройка Django
-from pathlib import Path
-BACKEND_ROOT = Path(__file__).resolve().parent.parent / 'backend'
-if str(BACKEND_ROOT) not in sys.path:
-    sys.path.insert(0, str(BACKEND_ROOT))
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
-import django
-django.setup()
-
-from client.models import Client
+import bootstrap  # noqa: F401
+from client.registration import upsert_client
 
 commands_router = Router()
 
@@ -33,24 +21,8 @@ class RegistrationStates(StatesGroup):
 
 @sync_to_async
 def save_client(name, phone, tg_code, username=None):
-    client, created = Client.objects.get_or_create(
-        tg_code=tg_code,
-        defaults={'name': name, 'phone': phone, 'username': username}
-    )
-    if not created:
-        updated = False
-        if client.name != name:
-            client.name = name
-            updated = True
-        if client.phone != phone:
-            client.phone = phone
-            updated = True
-        if username and client.username != username:
-            client.username = username
-            updated = True
-        if updated:
-            client.save()
-    return client
+    # Один INSERT ... ON CONFLICT DO UPDATE вместо get_or_create + save()
+    return upsert_client(tg_code, name, phone, username)
 
 @commands_router.message(Command('start'))
 async def greeting(message: types.Message, state: FSMContext):
@@ -0,0 +1,62 @@
+import logging
+import time
+
+from aiogram import F, Router, types
+from aiogram.filters import Command
+from asgiref.sync import sync_to_async
+
+import bootstrap  # noqa: F401
+from client.models import CourierOrder
+from client.tracks import last_point
+from services.locations import ACTIVE_STATUSES, STALE_AFTER, locations
+
+logger = logging.getLogger(__name__)
+
+couriers_router = Router()
+
+
+def _active_order(client_tg):
+    return (
+        CourierOrder.objects
+        .filter(client__tg_code=client_tg, status__in=ACTIVE_STATUSES, courier__isnull=False)
+        .order_by('-created_at')
+        .values_list('id', 'courier_id', 'courier__tg_code')
+        .first()
+    )
+
+
+# Начало трансляции — сообщение с live_period, дальше — его правки
+@couriers_router.message(F.location.live_period)
+@couriers_router.edited_message(F.location)
+async def courier_location(message: types.Message):
+    tg_code = str(message.from_user.id)
+    if not await locations.is_courier(tg_code):
+        return
+    # edit_date — unix time (int), date — datetime
+    sent_at = message.edit_date or message.date.timestamp()
+    locations.record(tg_code, float(sent_at), message.location.latitude, message.location.longitude)
+
+
+@couriers_router.message(Command('where'))
+async def where_is_courier(message: types.Message):
+    order = await sync_to_async(_active_order, thread_sensitive=True)(str(message.from_user.id))
+    if not order:
+        await message.answer('🚴 Нет заказа, который сейчас везёт курьер.')
+        return
+    order_id, courier_id, courier_tg = order
+    point = locations.where(courier_tg)
+    if point is None:
+        # Апдейты курьера мог принять другой воркер — берём последнюю сохранённую точку
+        point = await sync_to_async(last_point, thread_sensitive=True)(courier_id)
+        if point is not None and time.time() - point[0] > STALE_AFTER:
+            point = None
+    if point is None:
+        await message.answer('📡 Курьер сейчас не делится местоположением.')
+        return
+    ts, lat, lng = point
+    minutes = int((time.time() - ts) // 60)
+    await message.answer_location(latitude=lat, longitude=lng)
+    await message.answer(
+        f"🚴 Курьер заказа #{order_id}, "
+        + (f"обновлено {minutes} мин назад" if minutes else "только что")
+    )
@@ -4,27 +4,27 @@ from aiogram.types import ContentType, KeyboardButton, ReplyKeyboardMarkup, Inli
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from asgiref.sync import sync_to_async
-import os, sys, logging
+import logging
+import bootstrap  # noqa: F401
 from django.db import transaction
-import math
-from datetime import datetime
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
-# Django setup
-BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
-if BACKEND_ROOT not in sys.path:
-    sys.path.insert(0, BACKEND_ROOT)
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
-import django
-django.setup()
-
-from client.models import CourierOrder, Client, PricingRule, TimeSurcharge
+from client.models import CourierOrder, Client
+from client import state_machine
+from client.batching import take_batch
+from conf import GROUP_CHAT_ID
 from django.core.exceptions import ObjectDoesNotExist
+from render import render_courier_card
+from services.batching import dispatcher, render_route
+from services.eta import eta_line, estimate as estimate_eta
+from services.quotes import Quote, quote_cache
+from services.tracking import order_eta, tracker
 
 router = Router()
-GROUP_CHAT_ID = '-1002265233281'
+
+LIVE_LOCATION_HINT = '📡 Поделитесь с ботом геопозицией в реальном времени — клиент увидит, где вы (/where).'
 
 ORDER_STATUSES = {
     'new': 'Новый',
@@ -77,39 +77,19 @@ def get_status_keyboard(order_id, current_status):
         ])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
-# Distance and price calculations
-def calculate_distance(lat1, lon1, lat2, lon2):
-    R = 6371.0
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return round(R * c, 2)
+# Price calculations
+async def get_quote(point_a, point_b) -> Quote:
+    return await quote_cache.quote(point_a, point_b)
 
-async def calculate_delivery_price(point_a, point_b):
-    lat1, lon1 = point_a
-    lat2, lon2 = point_b
-    distance = calculate_distance(lat1, lon1, lat2, lon2)
-    pricing_rules = await sync_to_async(list, thread_sensitive=True)(PricingRule.objects.all().order_by('min_distance'))
-    base_price, per_km_price, multiplier = 0, 0, 1.0
-    for rule in pricing_rules:
-        max_dist = rule.max_distance if rule.max_distance > 0 else float('inf')
-        if rule.min_distance <= distance < max_dist:
-            base_price = float(rule.base_price)
-            per_km_price = float(rule.per_km_price)
-            multiplier = float(rule.multiplier)
-            break
-    price = (base_price + distance * per_km_price) * multiplier
-    time_surcharges = await sync_to_async(list, thread_sensitive=True)(TimeSurcharge.objects.all())
-    now = datetime.now().time()
-    for surcharge in time_surcharges:
-        if surcharge.start_time <= now <= surcharge.end_time:
-            price *= float(surcharge.multiplier)
-    return round(price, 2), distance
+async def confirmed_quote(data) -> tuple[Quote, bool]:
+    """Цена из предпросмотра; если она устарела — новая и флаг изменения."""
+    if 'quote' not in data:
+        return await get_quote(data['point_a'], data['point_b']), False
+    quote = Quote(*data['quote'])
+    if quote.fresh:
+        return quote, False
+    fresh = await get_quote(data['point_a'], data['point_b'])
+    return fresh, fresh.price != quote.price
 
 # Sync helper functions for atomic operations
 def _create_order_sync(client, data, price, distance):
@@ -124,23 +104,15 @@ def _create_order_sync(client, data, price, distance):
             status='new',
             price=price,
             distance_km=distance,
+            awaiting_dispatch=dispatcher.enabled,
             created_at=timezone.now()
         )
 
 def _take_order_sync(order_id, courier):
-    with transaction.atomic():
-        order = (
-            CourierOrder.objects
-            .select_for_update()
-            .select_related('client')
-            .get(id=order_id)
-        )
-        if order.status != 'new':
-            raise ValueError("Order already taken")
-        order.courier = courier
-        order.status = 'assigned'
-        order.save()
-        return order
+    # CAS-переход new -> assigned вместо блокировки строки
+    if not state_machine.transition(order_id, 'assigned', from_status='new', courier=courier):
+        raise ValueError("Order already taken")
+    return CourierOrder.objects.select_related('client').get(id=order_id)
 
 # Handlers
 @router.message(Command('delivery'))
@@ -182,15 +154,19 @@ async def get_point_b(message: types.Message, state: FSMContext):
 @router.message(DeliveryFSM.comment_order)
 async def get_comment(message: types.Message, state: FSMContext):
     text = message.text if message.content_type == ContentType.TEXT and message.text != '📝 Пропустить' else ''
-    await state.update_data(comment=text)
     data = await state.get_data()
-    price, distance = await calculate_delivery_price(data['point_a'], data['point_b'])
+    quote = await get_quote(data['point_a'], data['point_b'])
+    price, distance = quote.price, quote.distance
+    eta = await estimate_eta(data['point_a'], distance)
+    # Эта цена и будет списана при подтверждении
+    await state.update_data(comment=text, quote=list(quote))
     preview = (
         f"📌 Предпросмотр заказа:\n"
         f"📍 Точка А: {data['point_a'][0]:.5f}, {data['point_a'][1]:.5f}\n"
         f"📍 Точка Б: {data['point_b'][0]:.5f}, {data['point_b'][1]:.5f}\n"
         f"📏 Расстояние: {distance} км\n"
         f"💰 Стоимость: {price} сом\n"
+        f"{eta_line(eta.total)}\n"
         f"📝 Комментарий: {text or 'нет'}"
     )
     kb = InlineKeyboardMarkup(inline_keyboard=[
@@ -215,9 +191,18 @@ async def handle_confirmation(cb: types.CallbackQuery, state: FSMContext):
         if not client:
             await state.clear()
             return
-        price, distance = await calculate_delivery_price(data['point_a'], data['point_b'])
+        quote, changed = await confirmed_quote(data)
+        if changed:
+            await state.update_data(quote=list(quote))
+            await cb.message.answer(f"💰 Стоимость изменилась: {quote.price} сом. Подтвердите заказ ещё раз.")
+            return
+        price, distance = quote.price, quote.distance
         try:
             order = await sync_to_async(_create_order_sync, thread_sensitive=True)(client, data, price, distance)
+            if dispatcher.enabled:
+                # Опубликует фоновая задача, возможно вместе с попутными заказами
+                await cb.message.edit_text('✅ Заказ принят, передаём курьерам.')
+                return
             text = (
                 f"📦 Новый заказ #{order.id}\n"
                 f"📍 https://2gis.kg/geo/{order.point_a_lng:.5f},{order.point_a_lat:.5f}\n"
@@ -234,6 +219,13 @@ async def handle_confirmation(cb: types.CallbackQuery, state: FSMContext):
         finally:
             await state.clear()
 
+async def open_tracking(bot, order):
+    """Трекер у клиента; его ошибка (клиент заблокировал бота и т.п.) не мешает курьеру."""
+    try:
+        await tracker.open(bot, order.id, order.client.tg_code, eta=await order_eta(order))
+    except Exception as e:
+        logger.error(f"Tracking message open error for order {order.id}: {e}", exc_info=True)
+
 @router.callback_query(F.data.startswith('delivery_take_'))
 async def take_order(cb: types.CallbackQuery):
     print(f"[DEBUG] Callback data: {cb.data}")
@@ -246,26 +238,56 @@ async def take_order(cb: types.CallbackQuery):
         order = await sync_to_async(_take_order_sync, thread_sensitive=True)(order_id, courier)
         await cb.message.edit_reply_markup(reply_markup=None)
         await cb.answer('✅ Заказ назначен вам', show_alert=True)
-        details = (
-            f"🛵 Заказ #{order.id}\n"
-            f"👤 Клиент: {order.client.name} - {order.client.phone} | <a href='tg://user?id={order.client.tg_code}'>связаться</a>\n"
-            f"📍 A: https://2gis.kg/geo/{order.point_a_lng:.5f},{order.point_a_lat:.5f}\n"
-            f"📍 B: https://2gis.kg/geo/{order.point_b_lng:.5f},{order.point_b_lat:.5f}\n"
-            f"📏 Расстояние: {order.distance_km} км\n"
-            f"💰 Стоимость: {order.price} сом\n"
-            f"📝 Комментарий: {order.comment or 'нет'}"
-        )
+        details = render_courier_card(order)
         await cb.bot.send_message(cb.from_user.id, details, parse_mode='HTML')
         status_kb = get_status_keyboard(order.id, 'assigned')
         if status_kb.inline_keyboard:
             await cb.bot.send_message(cb.from_user.id, 'Обновите статус заказа:', reply_markup=status_kb)
+        await cb.bot.send_message(cb.from_user.id, LIVE_LOCATION_HINT)
     except Exception as e:
         logger.error(f"Order take error: {e}", exc_info=True)
         await cb.answer('❌ Ошибка при взятии заказа', show_alert=True)
+        return
+    await open_tracking(cb.bot, order)
+
+@router.callback_query(F.data.startswith('batch_take_'))
+async def take_batch_order(cb: types.CallbackQuery):
+    batch_id = int(cb.data.split('_')[-1])
+    courier = await aget_object_or_404(Client, cb.message, tg_code=str(cb.from_user.id))
+    if not courier or getattr(courier, 'is_banned', False):
+        return await cb.answer('❗️ Вы не можете брать заказы', show_alert=True)
+    try:
+        batch, orders = await sync_to_async(take_batch, thread_sensitive=True)(batch_id, courier)
+    except ValueError:
+        return await cb.answer('❗️ Пакет уже взят', show_alert=True)
+    await cb.answer('✅ Пакет назначен вам', show_alert=True)
+    try:
+        await cb.message.edit_reply_markup(reply_markup=None)
+        await cb.bot.send_message(
+            cb.from_user.id,
+            f"🗺 Маршрут пакета #{batch.id}:\n{render_route(batch, orders)}",
+            disable_web_page_preview=True,
+        )
+    except Exception as e:
+        logger.error(f"Batch take error: {e}", exc_info=True)
+    # Все заказы уже назначены — ошибка с одним не должна оставить остальные без кнопок
+    for order in orders:
+        try:
+            await cb.bot.send_message(cb.from_user.id, render_courier_card(order), parse_mode='HTML')
+            await cb.bot.send_message(
+                cb.from_user.id, f'Обновите статус заказа #{order.id}:',
+                reply_markup=get_status_keyboard(order.id, 'assigned')
+            )
+        except Exception as e:
+            logger.error(f"Batch order #{order.id} card error: {e}", exc_info=True)
+        await open_tracking(cb.bot, order)
+    try:
+        await cb.bot.send_message(cb.from_user.id, LIVE_LOCATION_HINT)
+    except Exception as e:
+        logger.error(f"Batch take error: {e}", exc_info=True)
 
 @router.callback_query(F.data.regexp(r"^status_(toa|tob|arrived)_[0-9]+$"))
 async def update_status(cb: types.CallbackQuery):
-    await cb.answer()
     _, action, order_id_str = cb.data.split('_')
     order_id = int(order_id_str)
     status_map = {'toa': 'to_a', 'tob': 'to_b', 'arrived': 'arrived'}
@@ -273,31 +295,14 @@ async def update_status(cb: types.CallbackQuery):
     if not new_status:
         return await cb.answer('❌ Неизвестное действие', show_alert=True)
 
-    courier = await aget_object_or_404(Client, cb.message, tg_code=str(cb.from_user.id))
-    if not courier:
-        return
-
-    # Загружаем заказ вместе с client
-    order = await sync_to_async(
-        lambda oid: CourierOrder.objects.select_related('client').get(id=oid),
-        thread_sensitive=True
-    )(order_id)
-    if not order:
-        return await cb.answer('❌ Заказ не найден', show_alert=True)
-
-    if order.courier_id != courier.id:
-        return await cb.answer('❗️ Это не ваш заказ', show_alert=True)
-
-    order.status = new_status
-    await sync_to_async(order.save, thread_sensitive=True)()
+    # Один условный UPDATE: проверяет и владельца заказа, и текущий статус
+    if not await tracker.transition(cb.bot, order_id, cb.from_user.id, new_status):
+        return await cb.answer('❗️ Статус уже обновлён или это не ваш заказ', show_alert=True)
+    await cb.answer()
 
-    await cb.message.edit_text(f"🔄 Статус обновлён: {ORDER_STATUSES[new_status]}")
-    # Теперь order.client.tg_code уже в памяти
-    await cb.bot.send_message(
-        chat_id=int(order.client.tg_code),
-        text=f"🔄 Статус заказа #{order.id} обновлён: {ORDER_STATUSES[new_status]}"
+    # Клиенту правится сообщение-трекер, курьеру — это же сообщение с кнопками
+    new_kb = get_status_keyboard(order_id, new_status)
+    await cb.message.edit_text(
+        f"🔄 Статус обновлён: {ORDER_STATUSES[new_status]}",
+        reply_markup=new_kb if new_kb.inline_keyboard else None
     )
-
-    new_kb = get_status_keyboard(order.id, new_status)
-    if new_kb.inline_keyboard:
-        await cb.bot.send_message(cb.from_user.id, 'Далее:', reply_markup=new_kb)
\ No newline at end of file
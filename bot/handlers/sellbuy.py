@@ -6,23 +6,19 @@ from aiogram.types import (
     InlineKeyboardMarkup, InlineKeyboardButton,
     ReplyKeyboardMarkup, KeyboardButton, InputMediaPhoto
 )
-import os
-import sys
+import bootstrap  # noqa: F401
 from django.utils import timezone
 from datetime import timedelta
 
-BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
-if BACKEND_ROOT not in sys.path:
-    sys.path.insert(0, BACKEND_ROOT)
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
-import django
-django.setup()
-
 from client.models import Client
 from asgiref.sync import sync_to_async
+from middlewares import AlbumMiddleware
+from render import render_listing
 
 sellbuy_router = Router()
+sellbuy_router.message.middleware(AlbumMiddleware())
+
+MAX_PHOTOS = 10
 
 CHANNELS = {
     "Веломаркет": {
@@ -215,7 +211,7 @@ async def get_price(message: types.Message, state: FSMContext):
     await message.answer(
         "📸 <b>Добавьте фотографии товара</b>\n\n"
         "• Можно загрузить до 10 фото\n"
-        "• Отправляйте по одному фото\n"
+        "• Отправляйте по одному фото или альбомом\n"
         "• Когда закончите, нажмите <b>Готово ✅</b>",
         reply_markup=ReplyKeyboardMarkup(
             keyboard=[[KeyboardButton(text="Готово ✅")]],
@@ -227,24 +223,28 @@ async def get_price(message: types.Message, state: FSMContext):
     await state.set_state(SellFSM.photos)
 
 @sellbuy_router.message(SellFSM.photos)
-async def get_photos(message: types.Message, state: FSMContext):
+async def get_photos(message: types.Message, state: FSMContext, album: list[types.Message] | None = None):
     data = await state.get_data()
     photos = data.get("photos", [])
     if message.photo:
-        if len(photos) >= 10:
+        free = MAX_PHOTOS - len(photos)
+        if free <= 0:
             await message.answer("⚠️ <b>Максимум 10 фото!</b> Нажмите <b>Готово ✅</b>", parse_mode="HTML")
             return
-        file_id = message.photo[-1].file_id
-        photos.append(file_id)
+        # Альбом приходит одним вызовом: одна запись в state и один ответ
+        batch = [m.photo[-1].file_id for m in (album or [message]) if m.photo]
+        photos.extend(batch[:free])
         await state.update_data(photos=photos)
 
         kb = ReplyKeyboardMarkup(
             keyboard=[[KeyboardButton(text="Готово ✅")]],
             resize_keyboard=True
         )
+        text = f"✅ Фото {len(photos)}/10 добавлено!\n"
+        if len(batch) > free:
+            text += "⚠️ Лишние фото не добавлены — максимум 10.\n"
         await message.answer(
-            f"✅ Фото {len(photos)}/10 добавлено!\n"
-            "Можете добавить ещё или нажать <b>Готово ✅</b>",
+            text + "Можете добавить ещё или нажать <b>Готово ✅</b>",
             reply_markup=kb,
             parse_mode="HTML"
         )
@@ -276,27 +276,8 @@ async def choose_phone_visibility(callback: types.CallbackQuery, state: FSMConte
     await state.update_data(show_phone=show_phone)
     data = await state.get_data()
 
-    # Обновленный словарь эмодзи статусов
-    status_emoji = {
-        "💰 Продажа": "💰", 
-        "🔄 Обмен": "🔄", 
-        "🔍 Поиск": "🔍", 
-        "🔑 Сдаю": "🔑",
-        "👨‍💼 Резюме": "👨‍💼",
-        "💼 Вакансия": "💼"
-    }
-    emoji = status_emoji.get(data["status"], "")
-    
-    phone_text = f"📱 <b>Телефон:</b> {await get_client_phone(callback.from_user.id)}" if show_phone else "📱 <b>Телефон:</b> <i>Скрыт</i>"
-
-    text = (
-        f"<b>{data['status']}</b>\n"
-        f"🏷️ <b>{data['name']}</b> \n\n"
-        f"{data['desc']}\n\n"
-        f"💵 <b>Цена:</b> {data['price']} KGS\n"
-        f"{phone_text}\n"
-        f"✉️ <a href='tg://user?id={callback.from_user.id}'>Связаться</a>"
-    )
+    phone = await get_client_phone(callback.from_user.id) if show_phone else None
+    text = render_listing(data, phone, callback.from_user.id)
 
     if data['photos']:
         media = [InputMediaPhoto(media=pid) for pid in data['photos']]
@@ -331,28 +312,8 @@ async def send_to_channel(callback: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     chan_info = CHANNELS[data['category']]
 
-    # Обновленный словарь эмодзи статусов
-    status_emoji = {
-        "💰 Продажа": "💰", 
-        "🔄 Обмен": "🔄", 
-        "🔍 Поиск": "🔍", 
-        "🔑 Сдаю": "🔑",
-        "👨‍💼 Резюме": "👨‍💼",
-        "💼 Вакансия": "💼"
-    }
-    emoji = status_emoji.get(data["status"], "")
-    
-    phone_text = f"📱 <b>Телефон:</b> {await get_client_phone(callback.from_user.id)}" if data.get('show_phone') else "📱 <b>Телефон:</b> <i>Скрыт</i>"
-
-    text = (
-        f"<b>{data['status']}</b>\n"
-        f"🏷️ <b>{data['name']}</b> \n\n"
-        f"{data['desc']}\n\n"
-        f"💵 <b>Цена:</b> {data['price']} KGS\n"
-        f"{phone_text}\n"
-        f"✉️ <a href='tg://user?id={callback.from_user.id}'>Связаться</a>\n"
-        f"📢 <a href='https://t.me/tez4917_bot'>Разместить объявление</a>"
-    )
+    phone = await get_client_phone(callback.from_user.id) if data.get('show_phone') else None
+    text = render_listing(data, phone, callback.from_user.id, footer=True)
 
     try:
         if data['photos']:
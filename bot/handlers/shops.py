@@ -4,27 +4,24 @@ from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton, ContentType, ReplyKeyboardRemove
 from asgiref.sync import sync_to_async
-from pathlib import Path
-import os, sys
+import bootstrap  # noqa: F401
 from django.utils import timezone
 import logging
 from django.db import transaction
 from math import sqrt
 
 # Импорты из delivery для расчета цены и GROUP_CHAT_ID
-from .delivery import calculate_delivery_price, GROUP_CHAT_ID
-from client.models import Category, Shop, Product, Service, Client, Order, OrderItem, CourierOrder
+from .delivery import confirmed_quote, get_quote, GROUP_CHAT_ID
+from client.models import Category, Shop, Client, Order, CourierOrder
+from render import render_shop_card, render_items_page, render_cart, ORDER_CREATED
+from cart import Cart
+from services.batching import dispatcher
+from services.eta import eta_line, estimate as estimate_eta
+from services.notifications import notifier
+import keyboards
 
 logger = logging.getLogger(__name__)
 
-BASE_DIR = Path(__file__).resolve().parent.parent.parent
-if str(BASE_DIR) not in sys.path:
-    sys.path.insert(0, str(BASE_DIR))
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
-import django
-django.setup()
-
 shops_router = Router()
 
 class CartFSM(StatesGroup):
@@ -37,42 +34,14 @@ class CartFSM(StatesGroup):
     delivery_point_b = State() 
     delivery_confirm = State()
 
-@sync_to_async
-def get_categories():
-    return list(Category.objects.all())
-
-@sync_to_async
-def get_shops_by_category(cat_id):
-    return list(Shop.objects.filter(category_id=cat_id))
-
 @sync_to_async
 def get_shop_by_id(shop_id):
     return Shop.objects.select_related('owner').filter(id=shop_id).first()
 
-@sync_to_async
-def get_products(shop_id):
-    return list(Product.objects.filter(shop_id=shop_id))
-
-@sync_to_async
-def get_services(shop_id):
-    return list(Service.objects.filter(shop_id=shop_id))
-
 @sync_to_async
 def get_client_by_tg(tg_id):
     return Client.objects.filter(tg_code=str(tg_id)).first()
 
-@sync_to_async
-def create_order(shop, client, total_price):
-    return Order.objects.create(shop=shop, client=client, total_price=total_price)
-
-@sync_to_async
-def add_order_items(order, selected_objects, chosen_type):
-    for item, qty in selected_objects:
-        if chosen_type == 'products':
-            OrderItem.objects.create(order=order, product=item, quantity=qty)
-        else:
-            OrderItem.objects.create(order=order, service=item, quantity=qty)
-
 # Синхронная функция для генерации комментария
 def generate_comment_sync(order):
     comment = f"Заказ #{order.id}\nСостав:\n"
@@ -88,15 +57,11 @@ ITEMS_PER_PAGE = 5
 @shops_router.message(Command("stores"))
 async def start_stores(message: types.Message, state: FSMContext):
     await state.clear()
-    cats = await get_categories()
-    if not cats:
+    kb = await keyboards.categories_keyboard()
+    if not kb:
         await message.answer("ℹ️ <b>Нет доступных категорий</b>", parse_mode="HTML")
         return
         
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=cat.name, callback_data=f"cat_{cat.id}")]
-        for cat in cats
-    ])
     await message.answer(
         "🛒 <b>Магазины и услуги</b>\n\n"
         "🗂 <b>Выберите категорию:</b>",
@@ -109,16 +74,12 @@ async def start_stores(message: types.Message, state: FSMContext):
 async def choose_category(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     cat_id = int(callback.data.split("_")[1])
-    shops = await get_shops_by_category(cat_id)
-    if not shops:
+    kb = await keyboards.shops_keyboard(cat_id)
+    if not kb:
         await callback.message.edit_text("ℹ️ <b>Нет магазинов в этой категории</b>", parse_mode="HTML")
         await state.clear()
         return
         
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=shop.name, callback_data=f"shop_{shop.id}")]
-        for shop in shops
-    ])
     await callback.message.edit_text(
         "🏪 <b>Выберите магазин:</b>",
         reply_markup=kb,
@@ -130,52 +91,24 @@ async def choose_category(callback: CallbackQuery, state: FSMContext):
 async def handle_shop_selection(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     shop_id = int(callback.data.split("_")[1])
-    shop = await get_shop_by_id(shop_id)
+    shop, type_buttons = await keyboards.shop_menu(shop_id)
     if not shop:
         await callback.message.edit_text("❌ <b>Магазин не найден</b>", parse_mode="HTML")
         await state.clear()
         return
         
     await state.update_data(shop_id=shop_id)
-    products = await get_products(shop_id)
-    services = await get_services(shop_id)
-    
-    text = (
-        f"🏪 <b>{shop.name}</b>\n"
-        f"👤 <b>Владелец:</b> {shop.owner.name}\n"
-        f"📍 <b>Адрес:</b> {shop.address or 'Не указан'}\n"
-        f"ℹ️ <b>Описание:</b> {shop.description or 'Без описания'}\n\n"
-        "📌 <b>Выберите тип товаров:</b>"
-    )
-    
-    buttons = []
-    if products: 
-        buttons.append(InlineKeyboardButton(text="🛒 Товары", callback_data="type_products"))
-    if services: 
-        buttons.append(InlineKeyboardButton(text="🛠 Услуги", callback_data="type_services"))
-    
-    kb = InlineKeyboardMarkup(inline_keyboard=[buttons])
+    text = render_shop_card(shop)
+    kb = InlineKeyboardMarkup(inline_keyboard=[list(type_buttons)])
     await callback.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
     await state.set_state(CartFSM.choosing_type)
 
 @shops_router.callback_query(lambda c: c.data in ("type_products", "type_services"))
 async def handle_type_selection(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
-    data = await state.get_data()
     chosen_type = callback.data.split("_")[1]
     
-    # Инициализируем корзину, если она еще не создана
-    if 'cart_products' not in data:
-        data['cart_products'] = {}
-    if 'cart_services' not in data:
-        data['cart_services'] = {}
-    
-    await state.update_data(
-        chosen_type=chosen_type, 
-        current_page=0,
-        cart_products=data.get('cart_products', {}),
-        cart_services=data.get('cart_services', {})
-    )
+    await state.update_data(chosen_type=chosen_type, current_page=0)
     await state.set_state(CartFSM.choosing_items)
     await show_items_page(callback, state, 0)
 
@@ -184,24 +117,17 @@ async def show_items_page(callback: CallbackQuery, state: FSMContext, page: int)
     data = await state.get_data()
     shop_id = data["shop_id"]
     chosen = data["chosen_type"]
-    all_items = await get_products(shop_id) if chosen == "products" else await get_services(shop_id)
+    all_items, all_buttons = await keyboards.shop_items(shop_id, chosen)
     total = len(all_items)
     start = page * ITEMS_PER_PAGE
     end = min(start + ITEMS_PER_PAGE, total)
     items_slice = all_items[start:end]
     
-    text = f"📋 <b>Выберите {chosen}:</b>\n\n"
-    for item in items_slice:
-        text += f"• {item.name} — <b>{item.price} KGS</b>\n"
+    text = render_items_page(chosen, items_slice)
     
-    keyboard_buttons = []
-    for item in items_slice:
-        # Проверяем количество в корзине
-        cart_key = f"cart_{chosen}"
-        cart = data.get(cart_key, {})
-        qty = cart.get(item.id, 0)
-        btn_text = f"➕ {item.name} ({qty})" if qty > 0 else f"➕ {item.name}"
-        keyboard_buttons.append([InlineKeyboardButton(text=btn_text, callback_data=f"add_{chosen}_{item.id}")])
+    # Готовые кнопки + количество из корзины поверх
+    cart = Cart.load(data)
+    keyboard_buttons = keyboards.item_rows(items_slice, all_buttons[start:end], cart.quantities(chosen))
     
     # Кнопки навигации
     nav = []
@@ -212,7 +138,7 @@ async def show_items_page(callback: CallbackQuery, state: FSMContext, page: int)
     
     # Основные кнопки
     buttons_row = []
-    if data.get('cart_products') or data.get('cart_services'):
+    if cart:
         buttons_row.append(InlineKeyboardButton(text="🛒 Корзина", callback_data="items_done"))
     
     buttons_row.append(InlineKeyboardButton(text="↩️ Назад к выбору типа", callback_data="back_to_type"))
@@ -244,13 +170,15 @@ async def handle_item_callbacks(callback: CallbackQuery, state: FSMContext):
         return
         
     parts = callback.data.split("_")
-    cart_key = f"cart_{parts[1]}"
-    item_id = int(parts[2])
+    chosen = parts[1]
+    item = await keyboards.shop_item(data["shop_id"], chosen, int(parts[2]))
+    if item is None:
+        return
     
     # Обновляем корзину
-    cart = data.get(cart_key, {})
-    cart[item_id] = cart.get(item_id, 0) + 1
-    await state.update_data(**{cart_key: cart})
+    cart = Cart.load(data)
+    cart.add(chosen, item)
+    await state.update_data(cart=cart.dump())
     
     # Обновляем текущую страницу
     await show_items_page(callback, state, data["current_page"])
@@ -258,76 +186,31 @@ async def handle_item_callbacks(callback: CallbackQuery, state: FSMContext):
 async def back_to_type_selection(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     shop_id = data["shop_id"]
-    shop = await get_shop_by_id(shop_id)
-    products = await get_products(shop_id)
-    services = await get_services(shop_id)
+    shop, type_buttons = await keyboards.shop_menu(shop_id)
     
-    text = (
-        f"🏪 <b>{shop.name}</b>\n"
-        f"👤 <b>Владелец:</b> {shop.owner.name}\n"
-        f"📍 <b>Адрес:</b> {shop.address or 'Не указан'}\n"
-        f"ℹ️ <b>Описание:</b> {shop.description or 'Без описания'}\n\n"
-        "📌 <b>Выберите тип товаров:</b>"
-    )
+    text = render_shop_card(shop)
     
-    buttons = []
-    if products: 
-        buttons.append(InlineKeyboardButton(text="🛒 Товары", callback_data="type_products"))
-    if services: 
-        buttons.append(InlineKeyboardButton(text="🛠 Услуги", callback_data="type_services"))
+    buttons = list(type_buttons)
     
     # Добавляем кнопку корзины, если в ней есть товары
-    if data.get('cart_products') or data.get('cart_services'):
+    if Cart.load(data):
         buttons.append(InlineKeyboardButton(text="🛒 Перейти в корзину", callback_data="items_done"))
     
     kb = InlineKeyboardMarkup(inline_keyboard=[buttons])
     await callback.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
     await state.set_state(CartFSM.choosing_type)
 
-async def confirm_cart(callback: CallbackQuery, state: FSMContext):
+async def confirm_cart(callback: CallbackQuery, state: FSMContext, note: str = ""):
     data = await state.get_data()
-    shop = await get_shop_by_id(data.get("shop_id"))
-    
-    # Получаем содержимое корзины
-    cart_products = data.get("cart_products", {})
-    cart_services = data.get("cart_services", {})
-    
-    # Получаем полные объекты
-    all_products = {p.id: p for p in await get_products(data["shop_id"])}
-    all_services = {s.id: s for s in await get_services(data["shop_id"])}
-    
-    selected_products = []
-    selected_services = []
-    total_price = 0
-    
-    # Формируем список товаров
-    for pid, qty in cart_products.items():
-        if pid in all_products:
-            item = all_products[pid]
-            selected_products.append((item, qty))
-            total_price += item.price * qty
-    
-    # Формируем список услуг
-    for sid, qty in cart_services.items():
-        if sid in all_services:
-            item = all_services[sid]
-            selected_services.append((item, qty))
-            total_price += item.price * qty
+    cart = Cart.load(data)
     
     # Проверяем, что корзина не пуста
-    if not selected_products and not selected_services:
+    if not cart:
         await callback.message.answer("❌ <b>Ваша корзина пуста!</b>", parse_mode="HTML")
         return
     
-    # Формируем текст корзины
-    text = "🛒 <b>Ваша корзина:</b>\n\n"
-    for item, qty in selected_products:
-        text += f"• {item.name} — <b>{item.price} KGS</b> x{qty} = <b>{item.price * qty} KGS</b>\n"
-    
-    for item, qty in selected_services:
-        text += f"• {item.name} — <b>{item.price} KGS</b> x{qty} = <b>{item.price * qty} KGS</b>\n"
-    
-    text += f"\n💰 <b>Итого: {total_price} KGS</b>\n"
+    # Формируем текст корзины: цены и сумма уже лежат в корзине
+    text = note + render_cart(cart.lines(), cart.total)
     
     kb = InlineKeyboardMarkup(inline_keyboard=[[
         InlineKeyboardButton(text="✅ Оформить заказ", callback_data="cart_confirm"),
@@ -361,45 +244,22 @@ async def finalize_order(callback: CallbackQuery, state: FSMContext):
     
     shop = await get_shop_by_id(data["shop_id"])
     
-    # Рассчитываем итоговую сумму
-    cart_products = data.get("cart_products", {})
-    cart_services = data.get("cart_services", {})
-    
-    all_products = {p.id: p for p in await get_products(data["shop_id"])}
-    all_services = {s.id: s for s in await get_services(data["shop_id"])}
-    
-    total_price = 0
-    selected_products = []
-    selected_services = []
-    
-    for pid, qty in cart_products.items():
-        if pid in all_products:
-            item = all_products[pid]
-            total_price += item.price * qty
-            selected_products.append((item, qty))
-    
-    for sid, qty in cart_services.items():
-        if sid in all_services:
-            item = all_services[sid]
-            total_price += item.price * qty
-            selected_services.append((item, qty))
-    
-    # Создаем заказ
-    order = await create_order(shop, client, total_price)
+    # Сверяем с каталогом только позиции из корзины
+    cart = Cart.load(data)
+    if await sync_to_async(cart.revalidate)():
+        await state.update_data(cart=cart.dump())
+        await confirm_cart(callback, state, note="⚠️ <b>Цены или наличие изменились, проверьте корзину.</b>\n\n")
+        return
+    if not cart:
+        await callback.message.edit_text("❌ <b>Ваша корзина пуста!</b>", parse_mode="HTML")
+        await state.clear()
+        return
     
-    # Добавляем товары и услуги
-    if selected_products:
-        await add_order_items(order, selected_products, 'products')
-    if selected_services:
-        await add_order_items(order, selected_services, 'services')
+    # Создаем заказ вместе с позициями
+    order = await sync_to_async(cart.create_order)(client)
     
     # Формируем сообщение
-    text = (
-        f"✅ <b>Ваш заказ #{order.id} оформлен!</b>\n\n"
-        f"🏪 <b>Магазин:</b> {shop.name}\n"
-        f"💰 <b>Сумма:</b> {total_price} KGS\n\n"
-        "🚚 Желаете ли вы доставку заказа?"
-    )
+    text = ORDER_CREATED.render(order_id=order.id, shop=shop.name, total=cart.total)
 
     kb = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Да", callback_data="delivery_yes")],
@@ -417,45 +277,8 @@ async def handle_delivery_choice(callback: CallbackQuery, state: FSMContext):
     
     if callback.data == "delivery_no":
         try:
-            # Получаем данные заказа
-            order_id = data['order_id']
-            shop_id = data['shop_id']
-            
-            # Получаем объекты из БД
-            order = await sync_to_async(Order.objects.get)(id=order_id)
-            shop = await get_shop_by_id(shop_id)
-            client = await get_client_by_tg(callback.from_user.id)
-            
-            # Формируем сообщение для владельца магазина
-            owner_message = (
-                f"📦 <b>Новый заказ #{order.id}</b>\n"
-                f"👤 Клиент: {client.name} ({client.phone})\n"
-                f"📅 Дата: {order.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
-                f"<b>Состав заказа:</b>\n"
-            )
-            
-            # Получаем элементы заказа
-            def get_order_items_sync(order_id):
-                order = Order.objects.get(id=order_id)
-                return list(order.items.select_related('product', 'service').all())
-            
-            order_items = await sync_to_async(get_order_items_sync)(order_id)
-            
-            # Добавляем информацию о товарах/услугах
-            for item in order_items:
-                if item.product:
-                    owner_message += f"  - {item.product.name} × {item.quantity} = {item.product.price * item.quantity} KGS\n"
-                elif item.service:
-                    owner_message += f"  - {item.service.name} × {item.quantity} = {item.service.price * item.quantity} KGS\n"
-            
-            owner_message += f"\n💰 <b>Итого: {order.total_price} KGS</b>"
-            
-            # Отправляем уведомление владельцу магазина
-            await callback.bot.send_message(
-                chat_id=shop.owner.tg_code,
-                text=owner_message,
-                parse_mode="HTML"
-            )
+            # Уведомление владельцу уходит в фоне, покупатель его не ждёт
+            notifier.enqueue_order(data['order_id'])
             
             # Сообщение для покупателя
             await callback.message.edit_text(
@@ -513,14 +336,16 @@ async def get_delivery_point_b(message: types.Message, state: FSMContext):
         # Рассчитываем стоимость доставки
         point_a = (shop.point_a_lat, shop.point_a_lng)
         point_b = (message.location.latitude, message.location.longitude)
-        price, distance = await calculate_delivery_price(point_a, point_b)
+        quote = await get_quote(point_a, point_b)
+        price, distance = quote.price, quote.distance
+        eta = await estimate_eta(point_a, distance)
         
-        # Сохраняем данные для подтверждения
+        # Сохраняем данные для подтверждения: списана будет именно эта цена
         await state.update_data(
+            point_a=point_a,
             point_b=point_b,
             comment=comment,
-            price=price,
-            distance=distance
+            quote=list(quote)
         )
         
         # Показываем подтверждение доставки
@@ -530,7 +355,8 @@ async def get_delivery_point_b(message: types.Message, state: FSMContext):
             f"📍 Откуда: {shop.address or 'магазин'}\n"
             f"📍 Куда: ваше местоположение\n"
             f"📏 Расстояние: {distance:.2f} км\n"
-            f"💰 Стоимость доставки: {price:.2f} сом"
+            f"💰 Стоимость доставки: {price:.2f} сом\n"
+            f"{eta_line(eta.total)}"
         )
         
         kb = InlineKeyboardMarkup(inline_keyboard=[
@@ -555,8 +381,14 @@ async def handle_delivery_confirmation(cb: types.CallbackQuery, state: FSMContex
         await state.clear()
         return
         
+    data = await state.get_data()
+    quote, changed = await confirmed_quote(data)
+    if changed:
+        await state.update_data(quote=list(quote))
+        await cb.message.answer(f"💰 Стоимость доставки изменилась: {quote.price:.2f} сом. Подтвердите ещё раз.")
+        return
+        
     try:
-        data = await state.get_data()
         client = await get_client_by_tg(cb.from_user.id)
         shop = await get_shop_by_id(data['shop_id'])
         point_b = data['point_b']
@@ -571,12 +403,17 @@ async def handle_delivery_confirmation(cb: types.CallbackQuery, state: FSMContex
                 point_b_lng=point_b[1],
                 comment=data['comment'],
                 status='new',
-                price=data['price'],
-                distance_km=data['distance'],
+                price=quote.price,
+                distance_km=quote.distance,
+                awaiting_dispatch=dispatcher.enabled,
                 created_at=timezone.now()
             )
         
         order = await sync_to_async(create_delivery_order_sync)()
+        if dispatcher.enabled:
+            # Опубликует фоновая задача, возможно вместе с попутными заказами
+            await cb.message.edit_text('✅ Заказ на доставку принят, передаём курьерам!')
+            return
         
         # Отправляем уведомление в группу курьеров
         text = (
@@ -0,0 +1,129 @@
+"""Закэшированные inline-клавиатуры каталога (/stores).
+
+Меню категорий, магазинов и списки товаров строятся один раз на версию
+каталога (``CatalogVersion``) и переиспользуются между пользователями.
+Персональная часть — счётчик в корзине ``➕ name (qty)`` — накладывается
+поверх готовых кнопок без повторной сборки всей клавиатуры.
+"""
+import time
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from asgiref.sync import sync_to_async
+
+import bootstrap  # noqa: F401
+from client.models import CatalogVersion, Category, Product, Service, Shop
+
+# Как часто (сек.) сверяться с версией каталога в БД
+VERSION_TTL = 5.0
+
+_version = None
+_checked_at = 0.0
+_cache = {}
+
+
+async def catalog_version() -> int:
+    """Текущая версия каталога; при смене версии кэш сбрасывается."""
+    global _version, _checked_at
+    now = time.monotonic()
+    if _version is None or now - _checked_at > VERSION_TTL:
+        version = await sync_to_async(CatalogVersion.current)()
+        _checked_at = now
+        if version != _version:
+            _cache.clear()
+            _version = version
+    return _version
+
+
+def invalidate():
+    global _version
+    _cache.clear()
+    _version = None
+
+
+async def _cached(key, build):
+    await catalog_version()
+    if key not in _cache:
+        _cache[key] = await sync_to_async(build)()
+    return _cache[key]
+
+
+def _build_categories():
+    cats = list(Category.objects.values_list('id', 'name'))
+    if not cats:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=name, callback_data=f"cat_{cat_id}")]
+        for cat_id, name in cats
+    ])
+
+
+def _build_shops(cat_id):
+    shops = list(Shop.objects.filter(category_id=cat_id).values_list('id', 'name'))
+    if not shops:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=name, callback_data=f"shop_{shop_id}")]
+        for shop_id, name in shops
+    ])
+
+
+def _build_shop(shop_id):
+    shop = Shop.objects.select_related('owner').filter(id=shop_id).first()
+    if not shop:
+        return None, ()
+    buttons = []
+    if Product.objects.filter(shop_id=shop_id).exists():
+        buttons.append(InlineKeyboardButton(text="🛒 Товары", callback_data="type_products"))
+    if Service.objects.filter(shop_id=shop_id).exists():
+        buttons.append(InlineKeyboardButton(text="🛠 Услуги", callback_data="type_services"))
+    return shop, tuple(buttons)
+
+
+def _build_items(shop_id, chosen):
+    model = Product if chosen == "products" else Service
+    items = list(model.objects.filter(shop_id=shop_id))
+    buttons = tuple(
+        InlineKeyboardButton(text=f"➕ {item.name}", callback_data=f"add_{chosen}_{item.id}")
+        for item in items
+    )
+    return items, buttons
+
+
+async def categories_keyboard():
+    """Меню категорий или ``None``, если категорий нет."""
+    return await _cached(('categories',), _build_categories)
+
+
+async def shops_keyboard(cat_id: int):
+    """Меню магазинов категории или ``None``, если магазинов нет."""
+    return await _cached(('shops', cat_id), lambda: _build_shops(cat_id))
+
+
+async def shop_menu(shop_id: int):
+    """Пара (магазин, кнопки выбора типа). Магазин ``None``, если не найден."""
+    return await _cached(('shop', shop_id), lambda: _build_shop(shop_id))
+
+
+async def shop_items(shop_id: int, chosen: str):
+    """Пара (список товаров/услуг, готовые кнопки ``➕`` в том же порядке)."""
+    return await _cached(('items', shop_id, chosen), lambda: _build_items(shop_id, chosen))
+
+
+async def shop_item(shop_id: int, chosen: str, item_id: int):
+    """Позиция магазина по id из закэшированного списка или ``None``."""
+    items, _ = await shop_items(shop_id, chosen)
+    index = _cache.get(('index', shop_id, chosen))
+    if index is None:
+        index = _cache[('index', shop_id, chosen)] = {item.id: item for item in items}
+    return index.get(item_id)
+
+
+def item_rows(items, buttons, cart: dict):
+    """Строки клавиатуры с бейджем количества из корзины пользователя."""
+    rows = []
+    for item, button in zip(items, buttons):
+        qty = cart.get(item.id, 0)
+        if qty > 0:
+            button = InlineKeyboardButton(text=f"➕ {item.name} ({qty})", callback_data=button.callback_data)
+        rows.append([button])
+    return rows
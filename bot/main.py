@@ -1,10 +1,9 @@
 import asyncio
-from conf import bot, dp
-from handlers.commands import commands_router
-from handlers.sellbuy import sellbuy_router
-from handlers.shops import shops_router
+import importlib
+from conf import BOT_WORKERS, UPDATE_CONCURRENCY, bot, dp
 from aiogram.types import BotCommand
-from handlers.delivery import router as delivery_router
+from middlewares import UserOrderMiddleware
+from services.notifications import notifier
 
 
 async def set_commands(bot):
@@ -14,17 +13,58 @@ async def set_commands(bot):
         BotCommand(command="sell", description="Создать объявление"),
         BotCommand(command="stores", description="Запись (Мастерские, салоны и магазины)"),
         BotCommand(command="delivery", description="Доставка"),
+        BotCommand(command="where", description="Где мой курьер"),
     ]
     await bot.set_my_commands(commands)
 
 
+# Роутеры в порядке регистрации. Модули хендлеров (и Django вместе с ними)
+# загружаются при вызове setup_dispatcher, а не при импорте main. Откладывается
+# только это: до начала поллинга загружаются все роутеры. Зато ``import main``
+# дёшев там, где хендлеры не нужны (или подключаются позже, как в воркерах
+# sharding: spawn заново импортирует main в каждом процессе)
+ROUTERS = (
+    'handlers.delivery:router',
+    'handlers.commands:commands_router',
+    'handlers.sellbuy:sellbuy_router',
+    'handlers.shops:shops_router',
+    'handlers.couriers:couriers_router',
+)
+
+
+def setup_dispatcher(dp):
+    dp.update.outer_middleware(UserOrderMiddleware(limit=UPDATE_CONCURRENCY))
+    for path in ROUTERS:
+        module, name = path.split(':')
+        dp.include_router(getattr(importlib.import_module(module), name))
+
+
 async def main():
     await set_commands(bot)
-    dp.include_router(delivery_router)
-    dp.include_router(commands_router)
-    dp.include_router(sellbuy_router)
-    dp.include_router(shops_router)
-    await dp.start_polling(bot, skip_updates=True)
+    setup_dispatcher(dp)
+    if BOT_WORKERS > 1:
+        from sharding import Supervisor
+
+        try:
+            await Supervisor(BOT_WORKERS).run(bot, dp.resolve_used_update_types())
+        finally:
+            await bot.session.close()
+        return
+    from services.batching import dispatcher
+    from services.locations import locations
+    from services.warmup import warm_up
+
+    # Апдейты начинаем читать только после прогрева
+    await warm_up(bot)
+    notifier.start(bot)
+    dispatcher.start(bot)
+    locations.start()
+    try:
+        await dp.start_polling(bot, skip_updates=True)
+    finally:
+        await locations.stop()
+        await dispatcher.stop()
+        await notifier.stop()
 
 
 if __name__ == "__main__":
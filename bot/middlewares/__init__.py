@@ -0,0 +1,4 @@
+from .album import AlbumMiddleware
+from .ordering import UserOrderMiddleware
+
+__all__ = ["AlbumMiddleware", "UserOrderMiddleware"]
@@ -0,0 +1,38 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+
+
+class AlbumMiddleware(BaseMiddleware):
+    """Собирает сообщения одного альбома (media_group_id) в один вызов хендлера.
+
+    Первое сообщение группы ждёт ``latency`` секунд, остальные только
+    дописываются в буфер. Хендлер получает весь альбом в ``data['album']``.
+    """
+
+    def __init__(self, latency: float = 0.6):
+        self.latency = latency
+        self.albums: Dict[str, List[Message]] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Message) or not event.media_group_id:
+            return await handler(event, data)
+
+        group_id = event.media_group_id
+        if group_id in self.albums:
+            self.albums[group_id].append(event)
+            return None
+
+        self.albums[group_id] = [event]
+        await asyncio.sleep(self.latency)
+        album = self.albums.pop(group_id)
+        album.sort(key=lambda m: m.message_id)
+        data["album"] = album
+        return await handler(event, data)
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+logger = logging.getLogger(__name__)
+
+# Кнопки, повторное нажатие которых — осознанное действие (➕ ещё одна штука)
+REPEATABLE_CALLBACKS = ("add_",)
+
+
+class _KeyLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class UserOrderMiddleware(BaseMiddleware):
+    """Обрабатывает апдейты одного пользователя строго по очереди.
+
+    Разные пользователи идут параллельно, но не больше ``limit`` апдейтов
+    одновременно. Ожидающий своей очереди апдейт слот не занимает. Части
+    альбома очередь пользователя не ждут.
+
+    Повторный колбэк той же кнопки того же сообщения, пока первый ещё в
+    очереди или прошло меньше ``duplicate_window`` секунд, отбрасывается
+    (кроме ``REPEATABLE_CALLBACKS``).
+    """
+
+    def __init__(self, limit: int = 100, duplicate_window: float = 1.0):
+        self.duplicate_window = duplicate_window
+        self._slots = asyncio.Semaphore(limit)
+        self._locks: Dict[Any, _KeyLock] = {}
+        # (пользователь, сообщение, data) -> время нажатия; None = ещё в работе
+        self._callbacks: Dict[Any, float | None] = {}
+
+    def _callback_key(self, key, event: Update):
+        callback = event.callback_query
+        if not callback or not callback.data or callback.data.startswith(REPEATABLE_CALLBACKS):
+            return None
+        message_id = callback.message.message_id if callback.message else callback.inline_message_id
+        return key, message_id, callback.data
+
+    def _is_duplicate(self, callback_key) -> bool:
+        now = time.monotonic()
+        if len(self._callbacks) > 1000:
+            self._callbacks = {
+                k: ts for k, ts in self._callbacks.items()
+                if ts is None or now - ts < self.duplicate_window
+            }
+        if callback_key in self._callbacks:
+            done_at = self._callbacks[callback_key]
+            if done_at is None or now - done_at < self.duplicate_window:
+                return True
+        self._callbacks[callback_key] = None
+        return False
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        # Части альбома собирает AlbumMiddleware, ждать друг друга им нельзя
+        album_part = isinstance(event, Update) and event.message and event.message.media_group_id
+        if (user is None and chat is None) or album_part:
+            async with self._slots:
+                return await handler(event, data)
+
+        key = (chat.id if chat else None, user.id if user else None)
+        callback_key = self._callback_key(key, event) if isinstance(event, Update) else None
+        if callback_key and self._is_duplicate(callback_key):
+            logger.info(f"Duplicate callback {callback_key[2]!r} from {key} dropped")
+            try:
+                await event.callback_query.answer()
+            except Exception:
+                pass
+            return None
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = _KeyLock()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                async with self._slots:
+                    return await handler(event, data)
+        finally:
+            entry.users -= 1
+            if not entry.users:
+                del self._locks[key]
+            if callback_key:
+                self._callbacks[callback_key] = time.monotonic()
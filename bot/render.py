@@ -0,0 +1,183 @@
+"""Скомпилированные HTML-шаблоны для сообщений бота.
+
+Шаблон компилируется один раз при импорте: статические фрагменты становятся
+константами, а все подставляемые значения экранируются, так что
+пользовательский текст с ``<`` или ``&`` не ломает ``parse_mode="HTML"``.
+"""
+from decimal import Decimal
+from html import escape
+from string import Formatter
+
+
+class Safe(str):
+    """Строка, которая уже является корректным HTML и не экранируется."""
+    __slots__ = ()
+
+
+# Типы, строковое представление которых не может содержать HTML
+_PLAIN = frozenset({int, float, Decimal, Safe})
+
+
+def esc(value) -> str:
+    if type(value) in _PLAIN:
+        return str(value)
+    return escape(str(value))
+
+
+class Template:
+    """Шаблон в синтаксисе ``str.format`` с полями-идентификаторами.
+
+    При создании шаблон компилируется в обычную функцию: литералы
+    становятся константами, поля — вызовами ``esc``. ``fields`` — порядок
+    аргументов для позиционного вызова в ``join``.
+    """
+    __slots__ = ('fields', '_fn')
+
+    def __init__(self, source: str):
+        parts = []
+        fields = []
+        for literal, name, spec, conversion in Formatter().parse(source):
+            if literal:
+                parts.append(repr(literal))
+            if name is None:
+                continue
+            if not name.isidentifier() or name.startswith('_') or conversion:
+                raise ValueError(f"Unsupported template field: {name!r}")
+            if name not in fields:
+                fields.append(name)
+            parts.append(f"_esc(_format({name}, {spec!r}))" if spec else f"_esc({name})")
+        code = f"def render({', '.join(fields)}):\n    return ''.join(({', '.join(parts)},))"
+        namespace = {'_esc': esc, '_format': format}
+        exec(code, namespace)
+        self.fields = tuple(fields)
+        self._fn = namespace['render']
+
+    def render(self, **ctx) -> str:
+        return self._fn(**ctx)
+
+    def join(self, rows, sep: str = '') -> str:
+        """Рендерит строки-кортежи в порядке ``fields`` и склеивает их."""
+        fn = self._fn
+        return sep.join([fn(*row) for row in rows])
+
+
+# ─── Объявления (/sell) ────────────────────────────────────────────────────────
+
+LISTING = Template(
+    "<b>{status}</b>\n"
+    "🏷️ <b>{name}</b> \n\n"
+    "{desc}\n\n"
+    "💵 <b>Цена:</b> {price} KGS\n"
+    "📱 <b>Телефон:</b> {phone}\n"
+    "✉️ <a href='tg://user?id={user_id}'>Связаться</a>"
+)
+LISTING_FOOTER = "\n📢 <a href='https://t.me/tez4917_bot'>Разместить объявление</a>"
+PHONE_HIDDEN = Safe("<i>Скрыт</i>")
+
+
+def render_listing(data: dict, phone, user_id, footer: bool = False) -> str:
+    text = LISTING.render(
+        status=data['status'],
+        name=data['name'],
+        desc=data['desc'],
+        price=data['price'],
+        phone=phone if phone is not None else PHONE_HIDDEN,
+        user_id=user_id,
+    )
+    return text + LISTING_FOOTER if footer else text
+
+
+# ─── Магазины и корзина (/stores) ──────────────────────────────────────────────
+
+SHOP_CARD = Template(
+    "🏪 <b>{name}</b>\n"
+    "👤 <b>Владелец:</b> {owner}\n"
+    "📍 <b>Адрес:</b> {address}\n"
+    "ℹ️ <b>Описание:</b> {description}\n\n"
+    "📌 <b>Выберите тип товаров:</b>"
+)
+ITEMS_HEADER = Template("📋 <b>Выберите {chosen}:</b>\n\n")
+ITEM_LINE = Template("• {name} — <b>{price} KGS</b>\n")
+CART_HEADER = "🛒 <b>Ваша корзина:</b>\n\n"
+CART_LINE = Template("• {name} — <b>{price} KGS</b> x{qty} = <b>{sum} KGS</b>\n")
+CART_TOTAL = Template("\n💰 <b>Итого: {total} KGS</b>\n")
+ORDER_CREATED = Template(
+    "✅ <b>Ваш заказ #{order_id} оформлен!</b>\n\n"
+    "🏪 <b>Магазин:</b> {shop}\n"
+    "💰 <b>Сумма:</b> {total} KGS\n\n"
+    "🚚 Желаете ли вы доставку заказа?"
+)
+OWNER_ORDER_HEADER = Template(
+    "📦 <b>Новый заказ #{order_id}</b>\n"
+    "👤 Клиент: {client} ({phone})\n"
+    "📅 Дата: {date}\n\n"
+    "<b>Состав заказа:</b>\n"
+)
+OWNER_ORDER_LINE = Template("  - {name} × {qty} = {sum} KGS\n")
+OWNER_ORDER_TOTAL = Template("\n💰 <b>Итого: {total} KGS</b>")
+
+
+def render_shop_card(shop) -> str:
+    return SHOP_CARD.render(
+        name=shop.name,
+        owner=shop.owner.name,
+        address=shop.address or 'Не указан',
+        description=shop.description or 'Без описания',
+    )
+
+
+def render_items_page(chosen: str, items) -> str:
+    return ITEMS_HEADER.render(chosen=chosen) + ITEM_LINE.join(
+        (item.name, item.price) for item in items
+    )
+
+
+def render_cart(lines, total) -> str:
+    """``lines`` — пары (объект с name/price, количество)."""
+    return CART_HEADER + CART_LINE.join(
+        (item.name, item.price, qty, item.price * qty) for item, qty in lines
+    ) + CART_TOTAL.render(total=total)
+
+
+def render_owner_order(order, client, lines) -> str:
+    return (
+        OWNER_ORDER_HEADER.render(
+            order_id=order.id,
+            client=client.name,
+            phone=client.phone,
+            date=order.created_at.strftime('%d.%m.%Y %H:%M'),
+        )
+        + OWNER_ORDER_LINE.join(
+            (item.name, qty, item.price * qty) for item, qty in lines
+        )
+        + OWNER_ORDER_TOTAL.render(total=order.total_price)
+    )
+
+
+# ─── Курьерская доставка (/delivery) ───────────────────────────────────────────
+
+COURIER_CARD = Template(
+    "🛵 Заказ #{order_id}\n"
+    "👤 Клиент: {client} - {phone} | <a href='tg://user?id={tg_code}'>связаться</a>\n"
+    "📍 A: https://2gis.kg/geo/{a_lng:.5f},{a_lat:.5f}\n"
+    "📍 B: https://2gis.kg/geo/{b_lng:.5f},{b_lat:.5f}\n"
+    "📏 Расстояние: {distance} км\n"
+    "💰 Стоимость: {price} сом\n"
+    "📝 Комментарий: {comment}"
+)
+
+
+def render_courier_card(order) -> str:
+    return COURIER_CARD.render(
+        order_id=order.id,
+        client=order.client.name,
+        phone=order.client.phone,
+        tg_code=order.client.tg_code,
+        a_lat=order.point_a_lat,
+        a_lng=order.point_a_lng,
+        b_lat=order.point_b_lat,
+        b_lng=order.point_b_lng,
+        distance=order.distance_km,
+        price=order.price,
+        comment=order.comment or 'нет',
+    )
@@ -0,0 +1,132 @@
+"""Публикация курьерских заказов пакетами.
+
+При ``DELIVERY_BATCH_WINDOW`` > 0 хендлеры создают заказ с
+``awaiting_dispatch`` и в группу его не шлют. Фоновая задача раз в
+``tick`` секунд забирает созревшие пакеты (``client.batching``) и
+публикует их: одиночный заказ — прежним сообщением с «Взять заказ»,
+пакет — одним сообщением с маршрутом и кнопкой «Взять все». Не ушедшее
+в группу сообщение возвращает заказы в очередь, а не теряет их.
+"""
+import asyncio
+import logging
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from asgiref.sync import sync_to_async
+
+import bootstrap  # noqa: F401
+from client.batching import PICKUP, claim_bundles, pending_legs, plan_batches, release_batch
+from conf import DELIVERY_BATCH_WINDOW, GROUP_CHAT_ID
+
+logger = logging.getLogger(__name__)
+
+# Проверять созревшие пакеты не реже раза в столько секунд
+MAX_TICK = 5.0
+
+
+def _point_link(lat, lng):
+    return f"https://2gis.kg/geo/{lng:.5f},{lat:.5f}"
+
+
+def render_single(order) -> str:
+    return (
+        f"📦 Новый заказ #{order.id}\n"
+        f"📍 {_point_link(order.point_a_lat, order.point_a_lng)}\n"
+        f"💰 Стоимость: {order.price} сом"
+    )
+
+
+def render_route(batch, orders) -> str:
+    by_id = {order.id: order for order in orders}
+    lines = []
+    for n, (kind, order_id) in enumerate(batch.stops, 1):
+        order = by_id[order_id]
+        if kind == PICKUP:
+            lines.append(f"{n}. 🅰️ Забрать #{order_id}: {_point_link(order.point_a_lat, order.point_a_lng)}")
+        else:
+            lines.append(f"{n}. 🅱️ Доставить #{order_id}: {_point_link(order.point_b_lat, order.point_b_lng)}")
+    return "\n".join(lines)
+
+
+def render_batch(batch, orders) -> str:
+    return (
+        f"📦 Пакет #{batch.id}: {len(orders)} заказа одной поездкой\n"
+        f"{render_route(batch, orders)}\n"
+        f"📏 Маршрут: {batch.distance_km} км\n"
+        f"💰 Стоимость: {batch.price} сом"
+    )
+
+
+class BatchDispatcher:
+    def __init__(self, window: float = 0.0):
+        self.window = window
+        self.tick = min(MAX_TICK, max(window / 4, 0.5))
+        self._task: asyncio.Task | None = None
+        self._bot = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def start(self, bot):
+        if not self.enabled:
+            return
+        self._bot = bot
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                legs = await sync_to_async(pending_legs, thread_sensitive=True)()
+                if not legs:
+                    continue
+                # Маршруты — CPU и граф дорог без БД: в своём потоке, не в общем для ORM
+                bundles = await asyncio.to_thread(plan_batches, legs)
+                due = await sync_to_async(claim_bundles, thread_sensitive=True)(bundles, self.window)
+            except Exception as e:
+                logger.error(f"Batch planning error: {e}", exc_info=True)
+                continue
+            for i, (batch, orders) in enumerate(due):
+                try:
+                    await self._publish(batch, orders)
+                except asyncio.CancelledError:
+                    # Остановка посреди публикации: неотправленное — обратно в очередь
+                    for batch, orders in due[i:]:
+                        await self._release(batch, orders)
+                    raise
+
+    async def _publish(self, batch, orders):
+        if batch is None:
+            text = render_single(orders[0])
+            button = InlineKeyboardButton(text='🚴 Взять заказ', callback_data=f'delivery_take_{orders[0].id}')
+        else:
+            text = render_batch(batch, orders)
+            button = InlineKeyboardButton(text='🚴 Взять все', callback_data=f'batch_take_{batch.id}')
+        try:
+            await self._bot.send_message(
+                GROUP_CHAT_ID, text,
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=[[button]]),
+                disable_web_page_preview=True,
+            )
+        except Exception as e:
+            logger.error(f"Batch publish error ({[o.id for o in orders]}): {e}", exc_info=True)
+            await self._release(batch, orders)
+
+    async def _release(self, batch, orders):
+        try:
+            await sync_to_async(release_batch, thread_sensitive=True)(batch, orders)
+        except Exception as e:
+            logger.error(f"Batch release error ({[o.id for o in orders]}): {e}", exc_info=True)
+
+
+dispatcher = BatchDispatcher(DELIVERY_BATCH_WINDOW)
@@ -0,0 +1,35 @@
+"""Таблица ETA (``client.eta.EtaTable``) в памяти бота.
+
+Статистика пересчитывается раз в ночь, поэтому таблица перечитывается
+не чаще раза в ``ETA_TTL`` секунд; сама оценка — поиск в словаре без
+запросов к БД.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+
+import bootstrap  # noqa: F401
+from client.eta import Eta, EtaTable, format_eta, load_eta_table
+
+ETA_TTL = 600.0
+
+_table = None
+_loaded_at = 0.0
+
+
+async def eta_table(force: bool = False) -> EtaTable:
+    """Актуальная таблица ETA; ``force`` — перечитать прямо сейчас."""
+    global _table, _loaded_at
+    now = time.monotonic()
+    if force or _table is None or now - _loaded_at > ETA_TTL:
+        _table = await sync_to_async(load_eta_table, thread_sensitive=True)()
+        _loaded_at = now
+    return _table
+
+
+async def estimate(point_a, distance_km) -> Eta:
+    return (await eta_table()).estimate(point_a, distance_km)
+
+
+def eta_line(seconds) -> str:
+    return f"⏱ Доставка: {format_eta(seconds)}"
@@ -0,0 +1,194 @@
+"""Live-location курьеров в памяти.
+
+Курьер делится live-location с ботом, и Telegram присылает
+``edited_message`` с новой точкой каждые несколько секунд. В БД на
+каждую точку не пишем: точки кладутся в кольцевой буфер курьера
+(``Track``, три ``array('d')`` фиксированного размера), «где курьер»
+отвечается из памяти по последней точке.
+
+Фоновая задача раз в ``FLUSH_INTERVAL`` секунд забирает новые точки,
+прореживает и сжимает их (``client.tracks``) и пишет одним
+``bulk_create`` по строке на курьера. Принимаются точки только тех, у
+кого есть заказ в работе; список перечитывается не чаще раза в
+``COURIERS_TTL`` секунд.
+"""
+import asyncio
+import logging
+import time
+from array import array
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+
+import bootstrap  # noqa: F401
+from client.models import Client, CourierOrder, CourierTrack
+from client.tracks import downsample, encode_track
+
+logger = logging.getLogger(__name__)
+
+RING_SIZE = 256
+# Точка старше этого — курьер перестал делиться местоположением
+STALE_AFTER = 10 * 60
+FLUSH_INTERVAL = 30.0
+COURIERS_TTL = 30.0
+# Чаще этого список курьеров не перечитывается даже при промахе
+COURIERS_MIN_REFRESH = 5.0
+ACTIVE_STATUSES = ('assigned', 'to_a', 'to_b')
+
+
+class Track:
+    """Кольцевой буфер последних ``size`` точек (ts, lat, lng) одного курьера."""
+
+    __slots__ = ('size', 'ts', 'lat', 'lng', 'seq', 'flushed', 'last_kept')
+
+    def __init__(self, size: int = RING_SIZE):
+        self.size = size
+        self.ts = array('d', bytes(8 * size))
+        self.lat = array('d', bytes(8 * size))
+        self.lng = array('d', bytes(8 * size))
+        # Сколько точек записано всего и сколько из них уже ушло в БД
+        self.seq = 0
+        self.flushed = 0
+        # Последняя сохранённая точка — от неё продолжается прореживание
+        self.last_kept = None
+
+    def push(self, ts, lat, lng):
+        i = self.seq % self.size
+        self.ts[i], self.lat[i], self.lng[i] = ts, lat, lng
+        self.seq += 1
+
+    def last(self):
+        if not self.seq:
+            return None
+        i = (self.seq - 1) % self.size
+        return self.ts[i], self.lat[i], self.lng[i]
+
+    def since(self, seq):
+        """Точки с номера ``seq`` (не старше размера буфера), по времени."""
+        start = max(seq, self.seq - self.size)
+        return [
+            (self.ts[n % self.size], self.lat[n % self.size], self.lng[n % self.size])
+            for n in range(start, self.seq)
+        ]
+
+
+def _active_couriers():
+    return set(
+        CourierOrder.objects.filter(status__in=ACTIVE_STATUSES, courier__isnull=False)
+        .values_list('courier__tg_code', flat=True)
+    )
+
+
+def _save_tracks(rows):
+    """``rows`` — (tg_code, точки); одна вставка на все треки."""
+    ids = dict(Client.objects.filter(tg_code__in={tg for tg, _ in rows}).values_list('tg_code', 'id'))
+    CourierTrack.objects.bulk_create([
+        CourierTrack(
+            courier_id=ids[tg],
+            started_at=datetime.fromtimestamp(points[0][0], timezone.utc),
+            ended_at=datetime.fromtimestamp(points[-1][0], timezone.utc),
+            points=len(points),
+            data=encode_track(points),
+        )
+        for tg, points in rows if tg in ids
+    ])
+
+
+class LocationStore:
+    def __init__(self, ring_size: int = RING_SIZE):
+        self.ring_size = ring_size
+        self._tracks: dict[str, Track] = {}
+        self._couriers: set = set()
+        self._couriers_at = -COURIERS_TTL
+        self._task: asyncio.Task | None = None
+
+    # --- приём ---
+
+    async def is_courier(self, tg_code: str) -> bool:
+        now = time.monotonic()
+        stale = now - self._couriers_at > COURIERS_TTL
+        missed = tg_code not in self._couriers and now - self._couriers_at > COURIERS_MIN_REFRESH
+        if stale or missed:
+            self._couriers = await sync_to_async(_active_couriers, thread_sensitive=True)()
+            self._couriers_at = now
+        return tg_code in self._couriers
+
+    def record(self, tg_code: str, ts: float, lat: float, lng: float):
+        track = self._tracks.get(tg_code)
+        if track is None:
+            track = self._tracks[tg_code] = Track(self.ring_size)
+        previous = track.last()
+        if previous is not None and ts < previous[0]:
+            return
+        track.push(ts, lat, lng)
+
+    # --- запросы ---
+
+    def where(self, tg_code: str):
+        """Последняя точка курьера (ts, lat, lng) или ``None``, если её нет или она устарела."""
+        track = self._tracks.get(tg_code)
+        point = track.last() if track else None
+        if point is None or time.time() - point[0] > STALE_AFTER:
+            return None
+        return point
+
+    # --- сохранение ---
+
+    def _collect(self):
+        """(tg_code, прореженные точки, seq) курьеров с новыми точками."""
+        rows = []
+        for tg_code, track in self._tracks.items():
+            if track.seq != track.flushed:
+                rows.append((tg_code, downsample(track.since(track.flushed), track.last_kept), track.seq))
+        return rows
+
+    def _mark_flushed(self, rows):
+        for tg_code, points, seq in rows:
+            track = self._tracks.get(tg_code)
+            if track is None:
+                continue
+            track.flushed = seq
+            if points:
+                track.last_kept = points[-1]
+
+    def _evict_stale(self):
+        now = time.time()
+        for tg_code, track in list(self._tracks.items()):
+            point = track.last()
+            if track.seq == track.flushed and (point is None or now - point[0] > STALE_AFTER):
+                del self._tracks[tg_code]
+
+    async def flush(self):
+        rows = self._collect()
+        tracks = [(tg_code, points) for tg_code, points, _ in rows if points]
+        try:
+            if tracks:
+                await sync_to_async(_save_tracks, thread_sensitive=True)(tracks)
+        except Exception as e:
+            # Маркеры не сдвигаем — точки уйдут следующим сохранением
+            logger.error(f"Courier tracks save error: {e}", exc_info=True)
+        else:
+            self._mark_flushed(rows)
+        self._evict_stale()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await self.flush()
+
+
+locations = LocationStore()
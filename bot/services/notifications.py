@@ -0,0 +1,157 @@
+"""Асинхронные уведомления владельцам магазинов о новых заказах.
+
+Хендлер только кладёт ``order_id`` в очередь и сразу отвечает покупателю.
+Фоновая задача загружает заказ одним запросом, рендерит сообщение и
+копит его в дайджест владельца: дайджест уходит по первому из заданных
+порогов — набралось ``digest_size`` заказов или прошло ``digest_interval``
+секунд с первого. Без обоих порогов заказ уходит сразу.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+
+from conf import ORDER_DIGEST_INTERVAL, ORDER_DIGEST_SIZE
+from render import render_owner_order
+
+logger = logging.getLogger(__name__)
+
+# Ограничение Telegram на длину одного сообщения
+MESSAGE_LIMIT = 4096
+DIGEST_SEPARATOR = "\n\n──────────\n\n"
+
+
+@dataclass
+class DigestPolicy:
+    digest_interval: float = 0.0
+    digest_size: int = 1
+
+    @property
+    def by_time(self) -> bool:
+        return self.digest_interval > 0
+
+    @property
+    def by_size(self) -> bool:
+        return self.digest_size > 1
+
+    @property
+    def immediate(self) -> bool:
+        # Дайджест выключен, только если не задан ни один порог
+        return not (self.by_time or self.by_size)
+
+
+def _load_order_message(order_id):
+    from client.models import Order
+
+    order = (
+        Order.objects
+        .select_related('shop__owner', 'client')
+        .prefetch_related('items__product', 'items__service')
+        .get(id=order_id)
+    )
+    lines = [
+        (item.product or item.service, item.quantity)
+        for item in order.items.all()
+        if item.product or item.service
+    ]
+    return order.shop.owner.tg_code, render_owner_order(order, order.client, lines)
+
+
+def _split_digest(texts):
+    """Склеивает сообщения дайджеста, не превышая лимит Telegram."""
+    chunks, current = [], ""
+    for text in texts:
+        candidate = f"{current}{DIGEST_SEPARATOR}{text}" if current else text
+        if current and len(candidate) > MESSAGE_LIMIT:
+            chunks.append(current)
+            current = text
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class OwnerNotifier:
+    def __init__(self, policy: DigestPolicy | None = None):
+        self.policy = policy or DigestPolicy()
+        self._queue: asyncio.Queue | None = None
+        self._pending: dict[str, list[str]] = {}
+        self._first_at: dict[str, float] = {}
+        self._task: asyncio.Task | None = None
+        self._bot = None
+
+    def start(self, bot):
+        self._bot = bot
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        for chat_id in list(self._pending):
+            await self._flush(chat_id)
+        self._task = None
+
+    def enqueue_order(self, order_id: int):
+        if self._queue is None:
+            raise RuntimeError("OwnerNotifier is not started")
+        self._queue.put_nowait(order_id)
+
+    def _next_timeout(self):
+        if not self._first_at or not self.policy.by_time:
+            return None
+        oldest = min(self._first_at.values())
+        return max(0.0, oldest + self.policy.digest_interval - time.monotonic())
+
+    async def _run(self):
+        while True:
+            try:
+                order_id = await asyncio.wait_for(self._queue.get(), self._next_timeout())
+            except asyncio.TimeoutError:
+                await self._flush_due()
+                continue
+            try:
+                chat_id, text = await sync_to_async(_load_order_message)(order_id)
+                self._pending.setdefault(chat_id, []).append(text)
+                self._first_at.setdefault(chat_id, time.monotonic())
+                full = self.policy.by_size and len(self._pending[chat_id]) >= self.policy.digest_size
+                if self.policy.immediate or full:
+                    await self._flush(chat_id)
+            except Exception as e:
+                logger.error(f"Order notification error: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+            await self._flush_due()
+
+    async def _flush_due(self):
+        if not self.policy.by_time:
+            return
+        now = time.monotonic()
+        for chat_id, first_at in list(self._first_at.items()):
+            if now - first_at >= self.policy.digest_interval:
+                await self._flush(chat_id)
+
+    async def _flush(self, chat_id):
+        texts = self._pending.pop(chat_id, [])
+        self._first_at.pop(chat_id, None)
+        if not texts:
+            return
+        if len(texts) > 1:
+            texts[0] = f"📬 <b>Новые заказы: {len(texts)}</b>{DIGEST_SEPARATOR}{texts[0]}"
+        for chunk in _split_digest(texts):
+            try:
+                await self._bot.send_message(chat_id=chat_id, text=chunk, parse_mode="HTML")
+            except Exception as e:
+                logger.error(f"Owner digest send error ({chat_id}): {e}", exc_info=True)
+
+
+notifier = OwnerNotifier(DigestPolicy(ORDER_DIGEST_INTERVAL, ORDER_DIGEST_SIZE))
@@ -0,0 +1,74 @@
+"""Снимок тарифов доставки (PricingRule + TimeSurcharge) в памяти.
+
+Правила меняются редко, а читались на каждый расчёт цены двумя запросами.
+Теперь они загружаются одной выборкой на таблицу и перечитываются не чаще
+раза в ``PRICING_TTL`` секунд. ``PricingTable.version`` меняется вместе с
+содержимым — по нему можно ключевать кэши посчитанных цен.
+
+Правила применяются так же, как в ``CourierOrder.save``: первое подходящее
+по дистанции правило, иначе последнее; наценки — через ``TimeSurcharge.applies``.
+"""
+import time
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+
+import bootstrap  # noqa: F401
+from client.models import PricingRule, TimeSurcharge
+
+PRICING_TTL = 30.0
+
+_table = None
+_loaded_at = 0.0
+
+
+@dataclass(frozen=True)
+class PricingTable:
+    # (PricingRule, ...) и (TimeSurcharge, ...) — отсоединённые от БД объекты
+    rules: tuple
+    surcharges: tuple
+    version: int
+
+    def rule_for(self, distance_km: float):
+        for rule in self.rules:
+            if rule.applies(distance_km):
+                return rule
+        return self.rules[-1] if self.rules else None
+
+    def multiplier_at(self, check_time) -> float:
+        multiplier = 1.0
+        for surcharge in self.surcharges:
+            if surcharge.applies(check_time):
+                multiplier *= float(surcharge.multiplier)
+        return multiplier
+
+    def price(self, distance_km: float, check_time) -> float:
+        rule = self.rule_for(distance_km)
+        if rule is None:
+            return 0.0
+        price = (float(rule.base_price) + distance_km * float(rule.per_km_price)) * float(rule.multiplier)
+        return round(price * self.multiplier_at(check_time), 2)
+
+
+def _fingerprint(objects, fields):
+    return tuple(tuple(getattr(obj, field) for field in fields) for obj in objects)
+
+
+def load_pricing_table() -> PricingTable:
+    rules = tuple(PricingRule.objects.order_by('min_distance', 'id'))
+    surcharges = tuple(TimeSurcharge.objects.order_by('id'))
+    version = hash((
+        _fingerprint(rules, ('min_distance', 'max_distance', 'base_price', 'per_km_price', 'multiplier')),
+        _fingerprint(surcharges, ('start_time', 'end_time', 'multiplier')),
+    ))
+    return PricingTable(rules, surcharges, version)
+
+
+async def pricing_table(force: bool = False) -> PricingTable:
+    """Актуальный снимок тарифов; ``force`` — перечитать прямо сейчас."""
+    global _table, _loaded_at
+    now = time.monotonic()
+    if force or _table is None or now - _loaded_at > PRICING_TTL:
+        _table = await sync_to_async(load_pricing_table, thread_sensitive=True)()
+        _loaded_at = now
+    return _table
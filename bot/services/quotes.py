@@ -0,0 +1,103 @@
+"""LRU-кэш расчётов стоимости доставки.
+
+Ключ — точки А и Б, привязанные к сетке ``GRID`` градусов (~200 м),
+действующий множитель наценки по времени и версия тарифов. Доставки из
+одного магазина соседям, повторный расчёт того же маршрута и пересчёт
+при подтверждении не считаются заново. Расстояние считается между
+центрами ячеек (по дорогам, если собран граф — ``client.routing``),
+поэтому цена по ключу детерминирована; погрешность — не больше
+диагонали ячейки.
+
+Посчитанная цена кладётся в FSM как ``Quote`` и при подтверждении
+списывается именно она, без пересчёта, пока не прошло ``QUOTE_TTL``.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple
+
+import bootstrap  # noqa: F401
+from client.routing import road_distance_km
+from services.pricing import pricing_table
+
+logger = logging.getLogger(__name__)
+
+GRID = 0.002
+MAX_SIZE = 4096
+# Сколько секунд цена из предпросмотра действительна для подтверждения
+QUOTE_TTL = 15 * 60
+# Раз в сколько запросов писать hit rate в лог
+STATS_EVERY = 1000
+
+
+class Quote(NamedTuple):
+    price: float
+    distance: float
+    version: int
+    quoted_at: float
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() - self.quoted_at < QUOTE_TTL
+
+
+def snap(point):
+    lat, lng = point
+    return round(lat / GRID), round(lng / GRID)
+
+
+def _center(cell):
+    return cell[0] * GRID, cell[1] * GRID
+
+
+class QuoteCache:
+    def __init__(self, maxsize: int = MAX_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # ключ -> (цена, расстояние)
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def clear(self):
+        self._data.clear()
+
+    async def quote(self, point_a, point_b, at=None) -> Quote:
+        table = await pricing_table()
+        check_time = (at or datetime.now()).time()
+        cell_a, cell_b = snap(point_a), snap(point_b)
+        key = (cell_a, cell_b, table.multiplier_at(check_time), table.version)
+        cached = self._data.get(key)
+        if cached is not None:
+            self.hits += 1
+            self._data.move_to_end(key)
+            price, distance = cached
+        else:
+            self.misses += 1
+            # Поиск маршрута — CPU, не держим им цикл событий
+            distance = round(await asyncio.to_thread(
+                road_distance_km, *_center(cell_a), *_center(cell_b)
+            ), 2)
+            price = table.price(distance, check_time)
+            self._data[key] = (price, distance)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        if (self.hits + self.misses) % STATS_EVERY == 0:
+            logger.info(f"Quote cache: {self.stats()}")
+        return Quote(price, distance, table.version, time.time())
+
+
+quote_cache = QuoteCache()
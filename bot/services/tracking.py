@@ -0,0 +1,115 @@
+"""Смена статусов курьерского заказа и живое сообщение-трекер у клиента.
+
+Переход статуса — один условный UPDATE через ``client.state_machine``:
+повторное нажатие или чужой заказ просто не обновляют ни одной строки.
+Клиент получает одно сообщение со статусом (создаётся при назначении
+курьера и закрепляется), дальше оно только редактируется. Быстрые
+переходы подряд склеиваются: в Telegram уходит последний статус. В
+сообщении — оставшееся время по таблице ETA на момент перехода.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+
+import bootstrap  # noqa: F401
+from client import state_machine
+from client.eta import Eta
+from client.models import CourierOrder
+from services.eta import eta_line, estimate
+
+logger = logging.getLogger(__name__)
+
+ORDER_STATUSES = dict(CourierOrder.STATUS_CHOICES)
+
+# Сколько секунд ждать следующего перехода перед правкой сообщения клиента
+COALESCE_DELAY = 1.5
+
+
+def tracking_text(order_id, status, eta: Eta | None = None) -> str:
+    text = f"📦 Заказ #{order_id}\n🔄 Статус: {ORDER_STATUSES[status]}"
+    remaining = eta.remaining(status) if eta else None
+    if remaining is not None:
+        text += f"\n{eta_line(remaining)}"
+    return text
+
+
+async def order_eta(order) -> Eta:
+    return await estimate((order.point_a_lat, order.point_a_lng), order.distance_km)
+
+
+def _transition_sync(order_id, courier_tg, new_status):
+    changed = state_machine.transition(
+        order_id, new_status, filters={'courier__tg_code': courier_tg}
+    )
+    if not changed:
+        return None
+    return (
+        CourierOrder.objects
+        .filter(id=order_id)
+        .values_list('client__tg_code', 'tracking_message_id', 'point_a_lat', 'point_a_lng', 'distance_km')
+        .first()
+    )
+
+
+def _save_tracking_message_sync(order_id, message_id):
+    CourierOrder.objects.filter(id=order_id).update(tracking_message_id=message_id)
+
+
+class StatusTracker:
+    def __init__(self, delay: float = COALESCE_DELAY):
+        self.delay = delay
+        # order_id -> (chat_id, message_id, последний статус, Eta)
+        self._pending = {}
+        self._tasks = {}
+
+    async def transition(self, bot, order_id, courier_tg, new_status) -> bool:
+        """Применяет переход; ``False`` если заказ не в ожидаемом статусе
+        или принадлежит другому курьеру."""
+        row = await sync_to_async(_transition_sync, thread_sensitive=True)(
+            order_id, str(courier_tg), new_status
+        )
+        if row is None:
+            return False
+        client_tg, message_id, lat, lng, distance_km = row
+        eta = await estimate((lat, lng), distance_km)
+        self._pending[order_id] = (int(client_tg), message_id, new_status, eta)
+        if order_id not in self._tasks:
+            self._tasks[order_id] = asyncio.create_task(self._deliver(bot, order_id))
+        return True
+
+    async def open(self, bot, order_id, client_tg, status='assigned', eta: Eta | None = None):
+        """Создаёт (и закрепляет) сообщение-трекер у клиента."""
+        msg = await bot.send_message(chat_id=int(client_tg), text=tracking_text(order_id, status, eta))
+        await sync_to_async(_save_tracking_message_sync, thread_sensitive=True)(order_id, msg.message_id)
+        try:
+            await bot.pin_chat_message(
+                chat_id=int(client_tg), message_id=msg.message_id, disable_notification=True
+            )
+        except Exception as e:
+            logger.warning(f"Tracking message pin failed for order {order_id}: {e}")
+        return msg.message_id
+
+    async def _deliver(self, bot, order_id):
+        try:
+            await asyncio.sleep(self.delay)
+            chat_id, message_id, status, eta = self._pending.pop(order_id)
+            if message_id:
+                await bot.edit_message_text(
+                    chat_id=chat_id, message_id=message_id, text=tracking_text(order_id, status, eta)
+                )
+            else:
+                message_id = await self.open(bot, order_id, chat_id, status, eta)
+                if order_id in self._pending:
+                    chat_id, _, status, eta = self._pending[order_id]
+                    self._pending[order_id] = (chat_id, message_id, status, eta)
+        except Exception as e:
+            logger.error(f"Tracking message update error for order {order_id}: {e}", exc_info=True)
+        finally:
+            self._tasks.pop(order_id, None)
+            # Переход мог прийти, пока шла правка сообщения
+            if order_id in self._pending:
+                self._tasks[order_id] = asyncio.create_task(self._deliver(bot, order_id))
+
+
+tracker = StatusTracker()
@@ -0,0 +1,89 @@
+"""Прогрев перед приёмом апдейтов.
+
+После рестарта первые пользователи платили за всё «холодное»: соединение
+с БД, сессию aiohttp и TLS до api.telegram.org, загрузку тарифов, ETA,
+меню каталога и графа дорог. ``warm_up`` делает это заранее и параллельно, а
+затем выставляет ``ready``; ``main`` и воркеры начинают читать апдейты
+только после него. Если задан ``BOT_READY_FILE``, файл создаётся в
+момент готовности — для healthcheck контейнера.
+
+Ошибка любого шага не мешает старту: она логируется, шаг просто остаётся
+холодным.
+"""
+import asyncio
+import logging
+import time
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+
+import bootstrap  # noqa: F401
+from django.db import connection
+
+import keyboards
+from conf import READY_FILE
+from client.models import Category, Shop
+from client.routing import load_router
+from services.eta import eta_table
+from services.pricing import pricing_table
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TIMEOUT = 30.0
+# Сколько магазинов прогревать (меню с кнопками «Товары»/«Услуги»)
+WARMUP_SHOPS = 200
+
+ready = asyncio.Event()
+
+
+def _open_db():
+    connection.ensure_connection()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+async def _catalog():
+    await keyboards.categories_keyboard()
+    cat_ids = await sync_to_async(list, thread_sensitive=True)(Category.objects.values_list('id', flat=True))
+    shop_ids = await sync_to_async(list, thread_sensitive=True)(
+        Shop.objects.order_by('id').values_list('id', flat=True)[:WARMUP_SHOPS]
+    )
+    for cat_id in cat_ids:
+        await keyboards.shops_keyboard(cat_id)
+    for shop_id in shop_ids:
+        await keyboards.shop_menu(shop_id)
+
+
+async def _step(name, coro):
+    started = time.monotonic()
+    try:
+        await coro
+    except Exception as e:
+        logger.warning(f"Warm-up step {name} failed: {e}")
+    else:
+        logger.info(f"Warm-up step {name}: {(time.monotonic() - started) * 1000:.0f} ms")
+
+
+async def warm_up(bot):
+    """Прогревает БД, HTTP-сессию, тарифы, ETA, каталог и граф дорог, затем ставит ``ready``."""
+    started = time.monotonic()
+    if READY_FILE:
+        Path(READY_FILE).unlink(missing_ok=True)
+    # Соединение с БД открывается в том же потоке, где потом работает ORM
+    db = sync_to_async(_open_db, thread_sensitive=True)()
+    steps = asyncio.gather(
+        _step('db', db),
+        _step('telegram', bot.get_me()),
+        _step('pricing', pricing_table(force=True)),
+        _step('eta', eta_table(force=True)),
+        _step('catalog', _catalog()),
+        _step('routing', asyncio.to_thread(load_router)),
+    )
+    try:
+        await asyncio.wait_for(steps, WARMUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Warm-up did not finish in {WARMUP_TIMEOUT:.0f}s, starting anyway")
+    ready.set()
+    if READY_FILE:
+        Path(READY_FILE).touch()
+    logger.info(f"Bot ready in {(time.monotonic() - started) * 1000:.0f} ms")
@@ -0,0 +1,387 @@
+"""Многопроцессный режим бота: супервизор + N воркеров.
+
+Супервизор сам забирает обновления из ``getUpdates`` (сырые JSON, без
+pydantic) и раскладывает их по воркерам по согласованному хэшу от id чата
+(или пользователя, если чата нет). Все апдейты одного пользователя идут в
+один процесс и в порядке поступления — FSM не видит гонок между процессами.
+
+Воркеры — отдельные процессы со своим ``Bot``/``Dispatcher``; FSM-хранилище
+общее, если задан ``REDIS_URL`` (см. ``conf.py``). Упавший воркер
+перезапускается под тем же именем, ключи при этом не переезжают (апдейты,
+уже лежавшие в его очереди, теряются). ``SIGTTIN``/``SIGTTOU`` добавляют/убирают воркер — кольцо
+перестраивается, переезжает только ~1/N пользователей. Апдейты
+переезжающих пользователей супервизор придерживает, пока прежний
+владелец не дообработает то, что ему уже отдано: уходящий воркер — до
+выхода, при добавлении — до подтверждения барьера, положенного в
+очередь каждому воркеру. Один пользователь никогда не обрабатывается в
+двух процессах сразу.
+
+Как и ``skip_updates`` в однопроцессном режиме, апдейты, накопившиеся
+до запуска, пропускаются.
+
+Включается переменной ``BOT_WORKERS`` > 1.
+"""
+import asyncio
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import signal
+import time
+from contextlib import suppress
+from queue import Empty
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Виртуальных точек на воркер: чем больше, тем ровнее распределение
+VNODES = 128
+POLL_TIMEOUT = 25
+WATCH_INTERVAL = 1.0
+STOP_TIMEOUT = 30.0
+# Элемент очереди воркера: (BARRIER, token) — подтвердить, когда доработано всё до него
+BARRIER = 'barrier'
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Кольцо согласованного хэширования с виртуальными узлами."""
+
+    def __init__(self, replicas: int = VNODES):
+        self.replicas = replicas
+        self._nodes = set()
+        self._points = []
+        self._owners = []
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, node):
+        return node in self._nodes
+
+    def _rebuild(self):
+        ring = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in self._nodes for i in range(self.replicas)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+
+    def add(self, node: str):
+        self._nodes.add(node)
+        self._rebuild()
+
+    def remove(self, node: str):
+        self._nodes.discard(node)
+        self._rebuild()
+
+    def copy(self) -> 'HashRing':
+        ring = HashRing(self.replicas)
+        ring._nodes = set(self._nodes)
+        # _rebuild создаёт новые списки, делить старые безопасно
+        ring._points, ring._owners = self._points, self._owners
+        return ring
+
+    def get(self, key) -> str:
+        if not self._points:
+            raise LookupError("hash ring is empty")
+        idx = bisect.bisect(self._points, _hash(str(key))) % len(self._points)
+        return self._owners[idx]
+
+
+def update_key(update: dict):
+    """Ключ шардирования сырого апдейта: id чата, иначе id пользователя."""
+    for name, event in update.items():
+        if name == 'update_id' or not isinstance(event, dict):
+            continue
+        chat = event.get('chat') or (event.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+        user = event.get('from') or event.get('user')
+        if user:
+            return user['id']
+    return update.get('update_id', 0)
+
+
+async def _process(dp, bot, update: dict):
+    try:
+        await dp.feed_raw_update(bot, update)
+    except Exception as e:
+        logger.exception(f"Update {update.get('update_id')} failed: {e}")
+
+
+async def _confirm(pending, acks, name, token):
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    acks.put((name, token))
+
+
+async def _worker(name, queue, acks):
+    from conf import bot, dp
+    from main import setup_dispatcher
+    from services.batching import dispatcher
+    from services.locations import locations
+    from services.notifications import notifier
+    from services.warmup import warm_up
+
+    setup_dispatcher(dp)
+    # Очередь копится, пока воркер греется — читать её начинаем после прогрева
+    await warm_up(bot)
+    notifier.start(bot)
+    # Пакеты забираются через SKIP LOCKED, несколько воркеров не мешают друг другу
+    dispatcher.start(bot)
+    # Апдейты одного курьера всегда приходят в один воркер (ключ — чат)
+    locations.start()
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    logger.info(f"Worker {name} started")
+    try:
+        while True:
+            update = await loop.run_in_executor(None, queue.get)
+            if update is None:
+                break
+            if isinstance(update, tuple) and update[0] == BARRIER:
+                task = asyncio.create_task(_confirm(set(tasks), acks, name, update[1]))
+            else:
+                task = asyncio.create_task(_process(dp, bot, update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await locations.stop()
+        await dispatcher.stop()
+        await notifier.stop()
+        await bot.session.close()
+        logger.info(f"Worker {name} stopped")
+
+
+def worker_main(name, queue, acks):
+    logging.basicConfig(level=logging.INFO)
+    # Останавливает супервизор через очередь, сигналы терминала игнорируем
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    with suppress(KeyboardInterrupt):
+        asyncio.run(_worker(name, queue, acks))
+
+
+class Supervisor:
+    def __init__(self, workers: int, replicas: int = VNODES):
+        self.size = workers
+        self.ring = HashRing(replicas)
+        self._ctx = multiprocessing.get_context('spawn')
+        # name -> (процесс, очередь)
+        self._workers = {}
+        # Уходящие воркеры: name -> (процесс, очередь, кольцо до ухода, придержанные апдейты, срок)
+        self._draining = {}
+        # Добавления: token -> (кольцо до, кольцо после, придержанные апдейты,
+        # воркеры, ещё не подтвердившие барьер, срок)
+        self._joining = {}
+        self._acks = self._ctx.Queue()
+        self._seq = 0
+        self._stop = asyncio.Event()
+
+    def _spawn(self, name, queue):
+        process = self._ctx.Process(
+            target=worker_main, args=(name, queue, self._acks), name=f"bot-{name}", daemon=True
+        )
+        process.start()
+        self._workers[name] = (process, queue)
+
+    def add_worker(self, barrier: bool = True):
+        name = f"w{self._seq}"
+        self._seq += 1
+        before = self.ring.copy()
+        old = list(self._workers)
+        self._spawn(name, self._ctx.Queue())
+        self.ring.add(name)
+        if barrier and old:
+            # Переехавшие к новому воркеру ключи ждут, пока прежние владельцы
+            # доработают уже отданные им апдейты
+            for worker in old:
+                self._workers[worker][1].put((BARRIER, name))
+            self._joining[name] = (
+                before, self.ring.copy(), [], set(old), time.monotonic() + STOP_TIMEOUT
+            )
+        logger.info(f"Worker {name} joined, workers: {len(self.ring)}")
+
+    def remove_worker(self):
+        if len(self.ring) <= 1:
+            return
+        name = max(self._workers, key=lambda n: int(n[1:]))
+        before = self.ring.copy()
+        self.ring.remove(name)
+        process, queue = self._workers.pop(name)
+        # Воркер дообработает свою очередь и выйдет
+        queue.put(None)
+        self._draining[name] = (process, queue, before, [], time.monotonic() + STOP_TIMEOUT)
+        logger.info(f"Worker {name} leaving, workers: {len(self.ring)}")
+
+    def route(self, update: dict):
+        key = update_key(update)
+        for name, (_, _, before, held, _) in self._draining.items():
+            if before.get(key) == name:
+                # Ключ ещё в очереди уходящего воркера — ждём, пока он выйдет
+                held.append(update)
+                return
+        for before, after, held, _, _ in self._joining.values():
+            if before.get(key) != after.get(key):
+                held.append(update)
+                return
+        self._workers[self.ring.get(key)][1].put(update)
+
+    def _drained(self, name):
+        _, _, _, held, _ = self._draining.pop(name)
+        logger.info(f"Worker {name} left, passing on {len(held)} held updates")
+        for update in held:
+            self.route(update)
+
+    def _joined(self, token):
+        _, _, held, waiting, _ = self._joining.pop(token)
+        if waiting:
+            logger.warning(f"Workers {sorted(waiting)} did not confirm the barrier in time")
+        for update in held:
+            self.route(update)
+
+    def _check_joins(self):
+        while True:
+            try:
+                name, token = self._acks.get_nowait()
+            except Empty:
+                break
+            if token in self._joining:
+                self._joining[token][3].discard(name)
+        for token, (_, _, _, waiting, deadline) in list(self._joining.items()):
+            if not waiting or time.monotonic() > deadline:
+                self._joined(token)
+
+    def _check_workers(self):
+        for name, (process, queue) in list(self._workers.items()):
+            if not process.is_alive():
+                logger.error(f"Worker {name} died with code {process.exitcode}, restarting")
+                # Старую очередь не переиспользуем: процесс мог умереть с её блокировкой
+                queue.cancel_join_thread()
+                self._spawn(name, self._ctx.Queue())
+                # Барьер пропал вместе со старой очередью
+                for _, _, _, waiting, _ in self._joining.values():
+                    waiting.discard(name)
+        for name, (process, _, _, _, deadline) in list(self._draining.items()):
+            if process.is_alive() and time.monotonic() > deadline:
+                logger.warning(f"{process.name} did not drain in time, terminating")
+                process.terminate()
+                process.join(1.0)
+            if not process.is_alive():
+                self._drained(name)
+        self._check_joins()
+
+    async def _watch(self):
+        while not self._stop.is_set():
+            self._check_workers()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stop.wait(), WATCH_INTERVAL)
+
+    async def _poll(self, bot, allowed_updates):
+        url = bot.session.api.api_url(token=bot.token, method='getUpdates')
+        offset = None
+        # Как skip_updates: первый запрос с offset=-1 отдаёт только последний
+        # апдейт и подтверждает всё до него, начинаем со следующего
+        skipping = True
+        backoff = 1.0
+        timeout = aiohttp.ClientTimeout(total=POLL_TIMEOUT + 10)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while not self._stop.is_set():
+                if skipping:
+                    params = {'offset': -1, 'timeout': 0, 'allowed_updates': allowed_updates}
+                else:
+                    params = {'timeout': POLL_TIMEOUT, 'allowed_updates': allowed_updates}
+                    if offset is not None:
+                        params['offset'] = offset
+                try:
+                    async with session.post(url, json=params) as resp:
+                        payload = await resp.json(content_type=None)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning(f"getUpdates failed: {e}, retry in {backoff:.0f}s")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+                except ValueError as e:
+                    logger.error(f"getUpdates returned malformed JSON: {e}, retry in {backoff:.0f}s")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+                if not isinstance(payload, dict) or not payload.get('ok'):
+                    description = payload.get('description') if isinstance(payload, dict) else payload
+                    logger.error(f"getUpdates error: {description}")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+                backoff = 1.0
+                updates = payload.get('result') or []
+                if skipping:
+                    skipping = False
+                    if updates:
+                        offset = updates[-1]['update_id'] + 1
+                    continue
+                for update in updates:
+                    offset = update['update_id'] + 1
+                    try:
+                        self.route(update)
+                    except Exception as e:
+                        # Один битый апдейт не должен останавливать приём остальных
+                        logger.exception(f"Update {update.get('update_id')} routing failed: {e}")
+
+    def _poller_done(self, task):
+        if task.cancelled() or self._stop.is_set():
+            return
+        # Без поллера апдейты не принимаются — останавливаемся, а не висим молча
+        logger.critical("Update poller stopped unexpectedly, shutting down", exc_info=task.exception())
+        self._stop.set()
+
+    async def run(self, bot, allowed_updates):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stop.set)
+        loop.add_signal_handler(signal.SIGTTIN, self.add_worker)
+        loop.add_signal_handler(signal.SIGTTOU, self.remove_worker)
+
+        for _ in range(self.size):
+            self.add_worker(barrier=False)
+        watcher = asyncio.create_task(self._watch())
+        poller = asyncio.create_task(self._poll(bot, allowed_updates))
+        poller.add_done_callback(self._poller_done)
+        try:
+            await self._stop.wait()
+        finally:
+            poller.cancel()
+            with suppress(asyncio.CancelledError):
+                await poller
+            await watcher
+            await self.shutdown()
+
+    async def shutdown(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + STOP_TIMEOUT
+
+        async def join(process):
+            await loop.run_in_executor(None, process.join, max(0.0, deadline - loop.time()))
+            if process.is_alive():
+                logger.warning(f"{process.name} did not stop in time, terminating")
+                process.terminate()
+
+        # Сначала уходящие: придержанные для них апдейты отдаём новым владельцам
+        for name, (process, *_) in list(self._draining.items()):
+            await join(process)
+            self._drained(name)
+        while self._joining and loop.time() < deadline:
+            self._check_joins()
+            await asyncio.sleep(0.1)
+        for token in list(self._joining):
+            self._joined(token)
+        for process, queue in self._workers.values():
+            queue.put(None)
+        for process, _ in self._workers.values():
+            await join(process)
+        self._workers.clear()